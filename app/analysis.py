@@ -0,0 +1,209 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .benford import (MIN_EXACT_COUNT, P_VALUE_MODES, TESTS, DigitAccumulator, DigitPrefixIndex,
+                      bisection_analysis, count_chi2_warnings, plot_benford,
+                      sliding_window_scan, validate_benford_assumptions)
+from .metrics import StageTimer
+from .parsing import InputError, ProgressCallback, parse_path
+from .plots import PLOT_MODES, plot_id, plot_spec, plot_url
+
+MIN_NUMBERS = 300
+
+def _check_params(significance_level: float, plot: str = "png", tests: Sequence[str] = (),
+                  p_value: str = "asymptotic", sample_size: int = 0, early_stop: bool = False,
+                  group_by: Optional[List[str]] = None,
+                  thresholds: Optional[List[float]] = None, window_size: int = 0,
+                  window_stride: Optional[int] = None) -> None:
+    if not (0 < significance_level < 1):
+        raise ValueError("Significance level must be between 0 and 1")
+    min_window = 50 if p_value == "asymptotic" else MIN_EXACT_COUNT
+    if window_size and window_size < min_window:
+        raise ValueError(f"window_size must be at least {min_window} (0 turns the window scan off)")
+    if window_stride is not None and window_stride < 1:
+        raise ValueError("window_stride must be at least 1")
+    if sample_size < 0:
+        raise ValueError("sample_size must be positive (0 reads every number)")
+    if sample_size and early_stop:
+        raise ValueError("Choose either sample_size or early_stop")
+    if (sample_size or early_stop) and group_by:
+        raise ValueError("sample_size and early_stop cannot be combined with group_by")
+    if thresholds and min(thresholds) <= 0:
+        raise ValueError("thresholds must be positive amounts")
+    if plot not in PLOT_MODES:
+        raise ValueError(f"plot must be one of {', '.join(PLOT_MODES)}")
+    if p_value not in P_VALUE_MODES:
+        raise ValueError(f"p_value must be one of {', '.join(P_VALUE_MODES)}")
+    parse_tests(",".join(tests))
+
+def parse_tests(tests: Optional[str]) -> List[str]:
+    """Comma-separated test names, or "all", in TESTS order"""
+    if not tests:
+        return []
+    names = {name.strip() for name in tests.split(",") if name.strip()}
+    if "all" in names:
+        return list(TESTS)
+    unknown = names - set(TESTS)
+    if unknown:
+        raise ValueError(f"Unknown tests: {', '.join(sorted(unknown))} (choose from {', '.join(TESTS)})")
+    return [name for name in TESTS if name in names]
+
+def analyze_path(path: str, filename: str, **params) -> Dict:
+    """Full /analyze pipeline on a spooled upload.
+
+    Runs inside a pool worker, so it only takes picklable arguments and
+    reports failures as InputError (400) or ValueError (422).
+    """
+    return parse_and_analyze(path, filename, **params)[0]
+
+def parse_and_analyze(path: str, filename: str, progress: Optional[ProgressCallback] = None,
+                      timer: Optional[StageTimer] = None,
+                      **params) -> Tuple[Dict, DigitAccumulator]:
+    """Like analyze_path, but also hands back the parsed digits for caching"""
+    tests = params.get("tests", ())
+    alpha = params.get("significance_level", 0.05)
+    _check_params(alpha, params.get("plot", "png"), tests, params.get("p_value", "asymptotic"),
+                  params.get("sample_size", 0), params.get("early_stop", False),
+                  params.get("group_by"), params.get("thresholds"), params.get("window_size", 0),
+                  params.get("window_stride"))
+    timer = timer or StageTimer()
+    
+    # Parsing streams into a digit accumulator instead of a list of floats;
+    # the raw values are only kept when the second-order test needs them
+    with timer.stage("parse"):
+        acc = parse_path(path, filename, progress, keep_values="second_order" in tests,
+                         columns=params.get("columns"), group_by=params.get("group_by"),
+                         sample_size=params.get("sample_size", 0),
+                         early_stop=params.get("early_stop", False), alpha=alpha,
+                         duplicates=params.get("duplicates", False),
+                         round_numbers=params.get("round_numbers", False),
+                         thresholds=params.get("thresholds"))
+    return analyze_digits(acc, progress=progress, timer=timer, **params), acc
+
+def analyze_digits(acc: DigitAccumulator, significance_level: float = 0.05,
+                   max_depth: int = 3, window_size: int = 0,
+                   window_stride: Optional[int] = None, top_k: int = 5,
+                   plot: str = "png", tests: Sequence[str] = (),
+                   columns: Optional[List[str]] = None, group_by: Optional[List[str]] = None,
+                   p_value: str = "asymptotic", sample_size: int = 0, early_stop: bool = False,
+                   duplicates: bool = False, round_numbers: bool = False,
+                   thresholds: Optional[List[float]] = None,
+                   progress: Optional[ProgressCallback] = None,
+                   timer: Optional[StageTimer] = None) -> Dict:
+    """Everything after parsing: tests, plot, bisection and window scan.
+
+    `tests` adds the named tests from TESTS under response["tests"]; their
+    histograms were all filled while parsing. Per-group results are
+    reported under response["groups"] when acc has them.
+
+    p_value="auto" scores samples too small for the chi-square
+    approximation (the dataset, bisection segments, windows, groups)
+    against exact or simulated null distributions, down to MIN_EXACT_COUNT
+    numbers instead of MIN_NUMBERS.
+
+    `columns`, `group_by`, `sample_size`, `early_stop`, `duplicates`,
+    `round_numbers` and `thresholds` are parse options, already applied to
+    acc. The duplication test and the round-number report go under
+    response["duplicates"] and response["round_numbers"] when acc has them. When acc holds a sample, its
+    description goes under response["sampling"] and region indices are
+    mapped back to positions in the full input. Regions and windows also
+    get the rows, columns or pages they span under "source" when acc
+    knows where its numbers came from.
+
+    Plots are not drawn here unless plot="inline": the response points to
+    /plots/{plot_id}, which renders plot_spec(acc) on first request.
+    """
+    def _stage(name: str) -> None:
+        if progress:
+            progress(name, 0, 0, "")
+    
+    timer = timer or StageTimer()
+    _check_params(significance_level, plot, tests, p_value, sample_size, early_stop, group_by,
+                  thresholds, window_size, window_stride)
+    min_numbers = MIN_NUMBERS if p_value == "asymptotic" else MIN_EXACT_COUNT
+    if acc.count < min_numbers:
+        raise InputError(
+            f"Insufficient data (minimum {min_numbers} numbers required for reliable analysis)"
+        )
+    
+    # Full dataset analysis
+    _stage("digit_extraction")
+    with timer.stage("benford_test"):
+        # Early stopping spent part of significance_level on its looks; status gets the rest
+        level = (acc.sampling or {}).get("level", significance_level)
+        result = acc.result(level, p_value)
+        if p_value == "asymptotic":
+            validate_benford_assumptions(result['expected'])
+        suite = acc.test_suite(tests, significance_level, p_value) if tests else None
+    
+    # Prepare response
+    response = {
+        "status": "anomalous" if result['anomalous'] else "normal",
+        "stats": {
+            "chi2_p": result["p_chi"],
+            #"cvm_p": result["p_cvm"]
+        },
+    }
+    if acc.sampling is not None:
+        response["sampling"] = acc.sampling
+    if suite is not None:
+        response["tests"] = suite
+    if plot == "inline":
+        _stage("plotting")
+        with timer.stage("plot"):
+            response["plot"] = plot_benford(result['observed'], result['expected'], result['bins'])
+    elif plot != "none":
+        spec = plot_spec(acc)
+        response["plot_id"] = plot_id(spec)
+        response["plot_url"] = plot_url(response["plot_id"], plot, spec)
+    
+    # One prefix index serves every bisection node and scan window
+    _stage("bisection")
+    with timer.stage("bisection"):
+        index = DigitPrefixIndex(acc.codes)
+        if result['anomalous']:
+            anomalies = bisection_analysis(None, max_depth, significance_level,
+                                           index=index, p_value=p_value)
+            response["anomalous_regions"] = anomalies
+    
+    if acc.groups is not None:
+        _stage("groups")
+        with timer.stage("groups"):
+            response["groups"] = acc.groups.test(significance_level, top_k, p_value=p_value)
+    
+    if acc.duplicates is not None or acc.amounts is not None:
+        _stage("amounts")
+        with timer.stage("amounts"):
+            if acc.duplicates is not None:
+                response["duplicates"] = acc.duplicates.test(top_k)
+            if acc.amounts is not None:
+                response["round_numbers"] = acc.amounts.test(significance_level, top_k)
+    
+    if window_size:
+        _stage("window_scan")
+        with timer.stage("window_scan"):
+            response["anomalous_windows"] = sliding_window_scan(
+                index, window_size, window_stride, top_k, significance_level, p_value)
+    
+    regions = response.get("anomalous_regions", []) + response.get("anomalous_windows", [])
+    if acc.source is not None:
+        for region in regions:
+            region["source"] = acc.source.locate(region["start_index"], region["end_index"])
+    if acc.positions is not None:
+        # Regions were found in the sample; report where they lie in the input
+        for region in regions:
+            region["start_index"] = int(acc.positions[region["start_index"]])
+            region["end_index"] = int(acc.positions[region["end_index"]])
+    
+    return response
+
+def run_instrumented(fn: Callable, *args, **kwargs) -> Tuple[Any, Dict]:
+    """Call an analysis entry point in a worker and report on how it went.
+
+    Returns fn's result and {"timings": ms per stage, "chi2_warnings": n}.
+    Chi-square warnings are counted rather than printed, per call, so
+    threads analyzing at once (BENFORD_WORKERS=0) keep separate counts.
+    """
+    timer = StageTimer()
+    with count_chi2_warnings() as chi2_warnings:
+        result = fn(*args, timer=timer, **kwargs)
+    return result, {"timings": timer.timings, "chi2_warnings": chi2_warnings[0]}
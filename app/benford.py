@@ -1,74 +1,217 @@
+import functools
+import json
+import math
+import os
 import re
+import tempfile
+from collections import OrderedDict
 import numpy as np
-from scipy.stats import chisquare, cramervonmises
-from typing import List, Dict, Optional, Tuple
-import matplotlib.pyplot as plt
+# scipy.special only: the chi-square and normal tails it provides are what
+# scipy.stats calls, without most of a second spent importing scipy.stats.
+# scipy.stats, scipy.optimize and matplotlib are imported where a feature needs them.
+from scipy.special import chdtr, chdtrc, chdtri, gammaln, ndtri
+from typing import List, Dict, Iterable, Iterator, Optional, Sequence, Tuple, Union
 import base64
+from contextlib import contextmanager
+from contextvars import ContextVar
 from io import BytesIO
+import threading
 import warnings
 
-def extract_numbers(text: str) -> List[float]:
-    """Extract numbers while filtering non-data entries"""
-    # Remove lines with metadata keywords (case-insensitive)
-    filtered_lines = []
-    keywords = r'(page|date|year|id|no|report|annual)'  # Added 'annual'
-    for line in text.split('\n'):
-        if re.search(keywords, line, re.IGNORECASE):
-            continue
-        filtered_lines.append(line)
-    filtered_text = '\n'.join(filtered_lines)
-    
-    # Find numbers (simplified regex)
-    numbers = re.findall(
-        r"[-+]?\d{1,3}(?:,\d{3})*(?:\.\d+)?|"  # Comma-separated
-        r"[-+]?\d*\.\d+|"                      # Decimals
-        r"[-+]?\d+",                           # Integers
-        filtered_text
-    )
-    
-    # Clean and filter numbers
-    valid_numbers = []
-    for num in numbers:
+_KEYWORDS = r'(?:page|date|year|id|no|report|annual)'  # Added 'annual'
+_NUMBER = (
+    r"(?=[-+.\d])[-+]?(?:"             # Cheap first-character check
+    r"\d{1,3}(?:,\d{3})*(?:\.\d+)?|"   # Comma-separated
+    r"\d*\.\d+|"                       # Decimals
+    r"\d+)"                            # Integers
+)
+# One scan: a line containing a metadata keyword (case-insensitive) is consumed
+# whole by the first branch and yields '', everything else yields number tokens.
+# The lookahead only tries the keyword alternation at its possible first letters.
+_SKIP_LINE = rf"^[^\n]*?(?=[pdyinra]){_KEYWORDS}[^\n]*"
+_TOKENS = {
+    str: re.compile(rf"(?im){_SKIP_LINE}|({_NUMBER})"),
+    bytes: re.compile(rf"(?im){_SKIP_LINE}|({_NUMBER})".encode()),
+}
+
+def _filter_tokens(tokens: List) -> np.ndarray:
+    """Convert number tokens and drop years, fractions and small integers"""
+    tokens = np.array(tokens)
+    empty, comma = (b'', b',') if tokens.dtype.kind == 'S' else ('', ',')
+    tokens = tokens[tokens != empty]
+    if tokens.size == 0:
+        return np.empty(0, dtype=np.float64)
+    cleaned = np.char.replace(tokens, comma, empty)
+    n = cleaned.astype(np.float64)
+    
+    size = np.abs(n)
+    is_integer = np.mod(n, 1) == 0
+    # Enhanced year detection
+    is_year = is_integer & (np.char.str_len(cleaned) == 4) & (size >= 1000) & (size <= 9999)
+    drop = is_year | (size < 1) | (is_integer & (size >= 1) & (size <= 50))
+    return n[~drop]
+
+def iter_numbers(text: Union[str, bytes], chunk_size: int = 8 * 1024**2) -> Iterator[np.ndarray]:
+    """Yield extract_numbers results for newline-aligned chunks of `text`.
+
+    `text` may be a str, bytes or any buffer such as an mmap; buffers are
+    scanned in place (pos/endpos) and never decoded to str.
+    """
+    for _, numbers in iter_number_spans(text, chunk_size):
+        yield numbers
+
+def iter_number_spans(text: Union[str, bytes], chunk_size: int = 8 * 1024**2,
+                      start: int = 0) -> Iterator[Tuple[int, np.ndarray]]:
+    """iter_numbers from offset `start`, with the offset each chunk ends at"""
+    pattern = _TOKENS[str if isinstance(text, str) else bytes]
+    newline = '\n' if isinstance(text, str) else b'\n'
+    end = len(text)
+    while start < end:
+        stop = min(start + chunk_size, end)
+        if stop < end:
+            cut = text.rfind(newline, start, stop)
+            stop = cut + 1 if cut >= start else (text.find(newline, stop) + 1 or end)
+        yield stop, _filter_tokens(pattern.findall(text, start, stop))
+        start = stop
+
+def extract_numbers(text: Union[str, bytes]) -> np.ndarray:
+    """Extract numbers while filtering non-data entries (str, bytes or mmap)"""
+    chunks = list(iter_numbers(text))
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=np.float64)
+
+def _mantissa(numbers) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Scale |x| into [1, 10) with log10/floor arithmetic.
+
+    Returns (mantissa, exponent, valid); zeros, NaN and inf are not valid.
+    """
+    x = np.abs(np.asarray(numbers, dtype=np.float64).ravel())
+    valid = np.isfinite(x) & (x > 0)
+    safe = np.where(valid, x, 1.0)
+    exp = np.floor(np.log10(safe)).astype(np.int64)
+
+    # Multiply by exact powers of ten where possible (0.3 / 0.1 != 3.0),
+    # in two steps so subnormals don't overflow the scale factor
+    neg = np.clip(-exp, 0, None)
+    mant = safe / np.power(10.0, np.clip(exp, 0, None))
+    mant = mant * np.power(10.0, np.minimum(neg, 300)) * np.power(10.0, neg - np.minimum(neg, 300))
+
+    # Snap representation error (2.9999999999999996) to the digits str() prints
+    mant = np.round(mant, 12)
+
+    # log10 can land one decade off near powers of ten
+    high = mant >= 10
+    mant[high] /= 10
+    exp[high] += 1
+    low = mant < 1
+    mant[low] *= 10
+    exp[low] -= 1
+    return mant, exp, valid
+
+def extract_digits(numbers, decimals: int = 0) -> Dict[str, np.ndarray]:
+    """Vectorized digit codes for every test position in one pass.
+
+    Returns int8 arrays under the keys
+    'first' (1-9), 'second' (0-9), 'first_two' (10-99) and 'last_two' (0-99).
+    Values without a digit at that position are coded -1.
+    """
+    mant, _, valid = _mantissa(numbers)
+    first_two = np.floor(np.round(mant * 10, 11)).astype(np.int8)
+
+    return {
+        "first": np.where(valid, first_two // 10, -1).astype(np.int8),
+        "second": np.where(valid, first_two % 10, -1).astype(np.int8),
+        "first_two": np.where(valid, first_two, -1).astype(np.int8),
+        "last_two": last_two_digits(numbers, decimals),
+    }
+
+def first_digits(numbers) -> np.ndarray:
+    """First significant digit of each value (-1 where undefined)"""
+    mant, _, valid = _mantissa(numbers)
+    return np.where(valid, np.floor(mant), -1).astype(np.int8)
+
+def second_digits(numbers) -> np.ndarray:
+    """Second significant digit of each value (-1 where undefined)"""
+    mant, _, valid = _mantissa(numbers)
+    return np.where(valid, np.floor(np.round(mant * 10, 11)) % 10, -1).astype(np.int8)
+
+def first_two_digits(numbers) -> np.ndarray:
+    """First two significant digits (10-99) of each value (-1 where undefined)"""
+    mant, _, valid = _mantissa(numbers)
+    return np.where(valid, np.floor(np.round(mant * 10, 11)), -1).astype(np.int8)
+
+def last_two_digits(numbers, decimals: int = 0) -> np.ndarray:
+    """Last two digits (0-99) after scaling by 10**decimals.
+
+    Only values with at least two digits (scaled >= 10) are coded.
+    """
+    x = np.abs(np.asarray(numbers, dtype=np.float64).ravel()) * 10.0 ** decimals
+    finite = np.isfinite(x)
+    scaled = np.floor(np.round(np.where(finite, x, 0.0), 6))
+    return np.where(finite & (scaled >= 10), scaled % 100, -1).astype(np.int8)
+
+DIGIT_EXTRACTORS = {1: first_digits, 2: second_digits}
+
+def digit_counts(codes: np.ndarray, bins: List[int]) -> List[int]:
+    """Count digit codes per bin with a single bincount"""
+    codes = np.asarray(codes)
+    counts = np.bincount(codes[codes >= 0], minlength=max(bins) + 1)
+    return [int(counts[d]) for d in bins]
+
+def _scalar_mantissa(x: float) -> Optional[float]:
+    """_mantissa of one float with math instead of array calls, or None where undefined.
+
+    Same arithmetic step for step, including np.round's rint(x * 1e12) / 1e12
+    (Python's round(x, 12) can snap the other way), so both agree exactly.
+    """
+    x = abs(x)
+    if not 0 < x < math.inf:  # NaN fails both comparisons
+        return None
+    exp = math.floor(math.log10(x))
+    neg = max(-exp, 0)
+    mant = x / 10.0 ** max(exp, 0)
+    mant = mant * 10.0 ** min(neg, 300) * 10.0 ** (neg - min(neg, 300))
+    mant = round(mant * 1e12) / 1e12
+    if mant >= 10:
+        mant /= 10
+    elif mant < 1:
+        mant *= 10
+    return mant
+
+def _number_mantissa(number: Union[int, float]) -> Optional[float]:
+    """_scalar_mantissa of a Python int or float, including ints past float range"""
+    try:
+        return _scalar_mantissa(float(number))
+    except OverflowError:
+        # Too big for a float, but the leading digits are exact in the decimal string
         try:
-            cleaned_num = num.replace(',', '')
-            n = float(cleaned_num)
-            
-            # Enhanced year detection
-            is_year = (
-                n.is_integer() and 
-                len(cleaned_num) == 4 and 
-                1000 <= abs(n) <= 9999  # Broad year range
-            )
-            
-            if (
-                is_year or
-                (abs(n) < 1) or
-                (n.is_integer() and 1 <= abs(n) <= 50)
-            ):
-                continue
-            valid_numbers.append(n)
-        except ValueError:
-            continue
-    return valid_numbers
+            digits = str(abs(number))
+        except ValueError:  # past sys.get_int_max_str_digits()
+            return None
+        return float(f"{digits[0]}.{digits[1:13]}")
 
 def get_first_digit(number: float) -> Optional[int]:
     """Correctly extracts first non-zero digit"""
+    if isinstance(number, (int, float)):
+        # Scalar fast path: no array round trip per call
+        mant = _number_mantissa(number)
+        return int(mant) if mant is not None else None
     try:
-        # Remove all leading zeros and decimals
-        stripped = re.sub(r'^[0\.]*', '', str(abs(number)))
-        # Remove any remaining leading zeros (e.g., '00456' → '456')
-        stripped = stripped.lstrip('0')
-        return int(stripped[0]) if stripped else None
-    except:
+        code = first_digits(number)[0]
+    except (TypeError, ValueError, OverflowError):
         return None
+    return int(code) if code >= 0 else None
 
 def get_second_digit(number: float) -> Optional[int]:
     """Extract second digit"""
+    if isinstance(number, (int, float)):
+        mant = _number_mantissa(number)
+        # np.round(mant * 10, 11) as second_digits computes it
+        return math.floor(round(mant * 10 * 1e11) / 1e11) % 10 if mant is not None else None
     try:
-        stripped = re.sub(r'^[0\.]+', '', str(abs(number)))
-        return int(stripped[1]) if len(stripped) > 1 else None
-    except:
+        code = second_digits(number)[0]
+    except (TypeError, ValueError, OverflowError):
         return None
+    return int(code) if code >= 0 else None
 
 def benford_expected_distribution(digit_pos: int = 1) -> Tuple[List[float], List[int]]:
     if digit_pos == 1:
@@ -81,85 +224,1152 @@ def benford_expected_distribution(digit_pos: int = 1) -> Tuple[List[float], List
                  for d in digits]
     return probs, digits
 
-def benford_test(numbers: List[float], digit_pos: int = 1, 
-                alpha: float = 0.05) -> Dict:
-    expected_probs, bins = benford_expected_distribution(digit_pos)
-    
-    # Digit extraction and frequency calculation (unchanged)
-    digit_func = get_first_digit if digit_pos == 1 else get_second_digit
-    digits = [d for d in (digit_func(n) for n in numbers) 
-             if d is not None and d in bins]
+CHI2_WARNING = "Chi-square assumptions violated - expected counts <5"
+# Set by count_chi2_warnings(); a ContextVar, so concurrent calls in threads
+# of one process each count their own instead of sharing the warnings filter
+_chi2_warnings: "ContextVar[Optional[List[int]]]" = ContextVar("chi2_warnings", default=None)
+
+@contextmanager
+def count_chi2_warnings() -> Iterator[List[int]]:
+    """Count chi-square assumption warnings instead of issuing them.
+
+    Yields a one-element list holding the count so far.
+    """
+    counter = [0]
+    token = _chi2_warnings.set(counter)
+    try:
+        yield counter
+    finally:
+        _chi2_warnings.reset(token)
+
+def _warn_chi2() -> None:
+    counter = _chi2_warnings.get()
+    if counter is None:
+        warnings.warn(CHI2_WARNING)
+    else:
+        counter[0] += 1
+
+def benford_test(numbers: Union[List[float], np.ndarray], digit_pos: int = 1, 
+                alpha: float = 0.05, p_value: str = "asymptotic") -> Dict:
+    _, bins = benford_expected_distribution(digit_pos)
     
-    observed = [digits.count(d) for d in bins]
-    expected = [p * len(digits) for p in expected_probs]
+    # Vectorized digit extraction and a single bincount over all bins
+    codes = DIGIT_EXTRACTORS[1 if digit_pos == 1 else 2](numbers)
+    return benford_test_counts(digit_counts(codes, bins), digit_pos, alpha, p_value)
+
+def benford_test_counts(observed: List[int], digit_pos: int = 1,
+                       alpha: float = 0.05, p_value: str = "asymptotic") -> Dict:
+    """Chi-square test on an already binned digit histogram.
+
+    With p_value="auto", small samples get their p-value from the null
+    tables (and a "p_method") instead of the chi-square warning.
+    """
+    expected_probs, bins = benford_expected_distribution(digit_pos)
+    observed = [int(o) for o in observed]
+    expected = [p * sum(observed) for p in expected_probs]
     
-    if any(e < 5 for e in expected):
-        warnings.warn("Chi-square assumptions violated - expected counts <5")
+    if p_value == "asymptotic" and any(e < 5 for e in expected):
+        _warn_chi2()
     
     # Chi-squared test only
-    chi2, p_chi = chisquare(observed, expected, ddof=0)
-    
-    return {
+    chi2 = ((np.asarray(observed, dtype=np.float64) - expected) ** 2 / expected).sum()
+    p_chi = chdtrc(len(observed) - 1, chi2)
+    result = {
         "observed": observed,
         "expected": expected,
         "p_chi": float(p_chi),
-        "anomalous": p_chi < alpha,
+        "anomalous": bool(p_chi < alpha),
         "bins": bins
     }
+    if p_value != "asymptotic":
+        test = "first" if digit_pos == 1 else "second"
+        p, small = chi2_p_values(test, [sum(observed)], [chi2], p_value)
+        result["p_chi"] = float(p[0])
+        result["anomalous"] = bool(p[0] < alpha)
+        result["p_method"] = _p_method(test, sum(observed), small[0])
+    return result
+
+def homogeneity_test(observed: List[int], reference: List[int], alpha: float = 0.05) -> Dict:
+    """Chi-square test that two digit histograms come from the same distribution.
+
+    Compares a new batch with the history it is added to, rather than with
+    Benford's expectation. Bins empty in both are left out.
+    """
+    table = np.array([observed, reference], dtype=np.int64)
+    table = table[:, table.sum(axis=0) > 0]
+    if table.shape[1] < 2 or (table.sum(axis=1) == 0).any():
+        return {"chi2": None, "p_chi": None, "anomalous": None}
+    from scipy.stats import chi2_contingency
+    chi2, p_chi, _, expected = chi2_contingency(table, correction=False)
+    if (expected < 5).any():
+        _warn_chi2()
+    return {"chi2": float(chi2), "p_chi": float(p_chi), "anomalous": bool(p_chi < alpha)}
+
+# Nigrini's test battery. Every histogram is filled in the same pass over
+# the numbers; second_order also needs the values themselves (sorted).
+TESTS = ("first", "second", "first_two", "last_two", "summation", "second_order")
+
+# MAD upper bounds for close / acceptable / marginal conformity (Nigrini, 2012)
+MAD_CONFORMITY = {
+    "first": (0.006, 0.012, 0.015),
+    "second": (0.008, 0.010, 0.012),
+    "first_two": (0.0012, 0.0018, 0.0022),
+    "second_order": (0.0012, 0.0018, 0.0022),
+}
+
+@functools.lru_cache(maxsize=None)
+def expected_distribution(test: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(bins, expected proportions) of a test in TESTS, computed once"""
+    if test == "first":
+        bins = np.arange(1, 10)
+    elif test == "second":
+        bins = np.arange(0, 10)
+        first_two = np.arange(10, 100).reshape(9, 10)
+        probs = np.log10(1 + 1 / first_two).sum(axis=0)
+        return bins, probs
+    elif test in ("first_two", "second_order"):
+        bins = np.arange(10, 100)
+    elif test == "last_two":
+        return np.arange(100), np.full(100, 0.01)
+    elif test == "summation":
+        # Equal sums per first-two-digit bucket
+        return np.arange(10, 100), np.full(90, 1 / 90)
+    else:
+        raise ValueError(f"Unknown test: {test}")
+    return bins, np.log10(1 + 1 / bins)
+
+def _mad_conformity(test: str, mad: float) -> Optional[str]:
+    if test not in MAD_CONFORMITY:
+        return None
+    for label, bound in zip(("close", "acceptable", "marginal"), MAD_CONFORMITY[test]):
+        if mad <= bound:
+            return label
+    return "nonconformity"
+
+# Small-sample p-values. Below 5 expected per bin the chi-square
+# approximation does not hold; p_value="auto" then compares the statistic
+# with its null distribution at that exact n, enumerated when the
+# multinomial has few enough outcomes and simulated otherwise.
+P_VALUE_MODES = ("asymptotic", "auto")
+MIN_EXACT_COUNT = 10            # smallest sample (segment, group, window) tested in auto mode
+NULL_DRAWS = 20_000             # Monte-Carlo samples per table
+EXACT_MAX_OUTCOMES = 250_000    # enumerate the multinomial up to this many outcomes
+
+def _compositions(n: int, k: int) -> np.ndarray:
+    """Every way to put n items into k bins, one row each"""
+    rows = np.zeros((1, 0), dtype=np.int64)
+    left = np.array([n])
+    for _ in range(k - 1):
+        reps = left + 1
+        parent = np.repeat(np.arange(len(rows)), reps)
+        take = np.arange(reps.sum()) - np.repeat(np.cumsum(reps) - reps, reps)
+        rows = np.column_stack([rows[parent], take])
+        left = left[parent] - take
+    return np.column_stack([rows, left])
+
+def _chi2_statistic(observed: np.ndarray, probs: np.ndarray) -> np.ndarray:
+    """Pearson statistic of every row of counts"""
+    n = observed.sum(axis=-1)
+    return (observed ** 2 / probs).sum(axis=-1) / np.maximum(n, 1) - n
+
+def null_method(test: str, n: int) -> str:
+    _, probs = expected_distribution(test)
+    return "exact" if math.comb(n + len(probs) - 1, n) <= EXACT_MAX_OUTCOMES else "simulated"
+
+def build_null_table(test: str, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Null distribution of the chi-square statistic for n numbers.
+
+    Returns the distinct statistic values, ascending, and P(T >= value) for
+    each, plus a trailing entry for statistics past the last value. The
+    simulated tail is (draws at or above + 1) / (draws + 1), so it never
+    reports 0; draws are seeded by (test, n), so tables are reproducible.
+    """
+    _, probs = expected_distribution(test)
+    if null_method(test, n) == "exact":
+        counts = _compositions(n, len(probs))
+        weights = np.exp(gammaln(n + 1) - gammaln(counts + 1).sum(axis=1)
+                         + (counts * np.log(probs)).sum(axis=1))
+        floor = 0.0
+    else:
+        rng = np.random.default_rng((n, TESTS.index(test)))
+        counts = rng.multinomial(n, probs / probs.sum(), size=NULL_DRAWS)
+        weights = np.full(NULL_DRAWS, 1 / (NULL_DRAWS + 1))
+        floor = 1 / (NULL_DRAWS + 1)
+    values, inverse = np.unique(np.round(_chi2_statistic(counts, probs), 9), return_inverse=True)
+    mass = np.bincount(inverse, weights=weights, minlength=len(values))
+    tail = np.minimum(np.cumsum(mass[::-1])[::-1] + floor, 1.0)
+    return values, np.append(tail, floor)
+
+class NullTables:
+    """Null distribution tables per (test, n), built once and reused.
+
+    A bounded in-memory LRU in front of an optional on-disk tier of .npz
+    files, shared by worker processes like the PDF page cache. With tables
+    in hand, scoring thousands of small samples is a binary search each.
+    """
+    def __init__(self, directory: Optional[str] = None, max_tables: int = 4096):
+        self.directory = directory
+        self.max_tables = max_tables
+        self._memory: "OrderedDict[Tuple[str, int], Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    
+    def _path(self, test: str, n: int) -> str:
+        return os.path.join(self.directory, f"{test}-{n}-{NULL_DRAWS}.npz")
+    
+    def get(self, test: str, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        key = (test, n)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        path = self._path(test, n) if self.directory else None
+        if path and os.path.exists(path):
+            with np.load(path) as stored:
+                table = (stored["values"], stored["tail"])
+        else:
+            table = build_null_table(test, n)
+            if path:
+                # Write then rename so a concurrent reader never sees half a file;
+                # mkstemp keeps threads of one process off each other's temp file
+                fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        np.savez(f, values=table[0], tail=table[1])
+                    os.replace(tmp, path)
+                except BaseException:
+                    os.unlink(tmp)
+                    raise
+        with self._lock:
+            self._memory[key] = table
+            while len(self._memory) > self.max_tables:
+                self._memory.popitem(last=False)
+        return table
+    
+    def precompute(self, test: str = "first", max_n: Optional[int] = None) -> None:
+        """Build every table auto mode can ask for, up to the chi-square limit by default"""
+        _, probs = expected_distribution(test)
+        max_n = max_n or int(np.ceil(5 / probs.min())) - 1
+        for n in range(1, max_n + 1):
+            self.get(test, n)
+    
+    def p_values(self, test: str, totals: np.ndarray, chi2: np.ndarray) -> np.ndarray:
+        """Upper-tail p-value of each statistic at its sample size"""
+        totals = np.asarray(totals, dtype=np.int64)
+        chi2 = np.asarray(chi2, dtype=np.float64)
+        p = np.ones(len(totals))
+        for n in np.unique(totals[totals > 0]):
+            rows = totals == n
+            values, tail = self.get(test, int(n))
+            # Tolerance so a statistic equal to a table value counts as reaching it
+            at = np.searchsorted(values, chi2[rows] - 1e-7 * np.maximum(chi2[rows], 1))
+            p[rows] = tail[at]
+            # Past every simulated draw the table only bounds p by 1 / (draws + 1);
+            # the chi-square tail keeps such extremes ranked (and able to pass Bonferroni)
+            beyond = at == len(values)
+            if beyond.any():
+                p[np.flatnonzero(rows)[beyond]] = np.minimum(
+                    tail[-1], chdtrc(len(expected_distribution(test)[1]) - 1, chi2[rows][beyond]))
+        return p
+
+_null_tables: Optional[NullTables] = None
+
+def get_null_tables() -> NullTables:
+    """Process-wide tables; BENFORD_NULL_CACHE_DIR="" keeps them memory-only"""
+    global _null_tables
+    if _null_tables is None:
+        directory = os.environ.get("BENFORD_NULL_CACHE_DIR",
+                                   os.path.join(tempfile.gettempdir(), "benford-null-cache"))
+        _null_tables = NullTables(directory or None)
+    return _null_tables
+
+def chi2_p_values(test: str, totals, chi2, p_value: str = "asymptotic") -> Tuple[np.ndarray, np.ndarray]:
+    """p-values of chi-square statistics, and which came from the null tables.
+
+    "asymptotic" uses the chi-square distribution throughout; "auto" looks
+    up the null tables wherever an expected count is below 5.
+    """
+    _, probs = expected_distribution(test)
+    totals = np.asarray(totals, dtype=np.int64)
+    chi2 = np.asarray(chi2, dtype=np.float64)
+    p = chdtrc(len(probs) - 1, chi2)
+    small = (totals * probs.min() < 5) if p_value == "auto" else np.zeros(len(totals), dtype=bool)
+    if small.any():
+        p[small] = get_null_tables().p_values(test, totals[small], chi2[small])
+    return p, small
+
+def _p_method(test: str, n: int, small: bool) -> str:
+    return null_method(test, n) if small else "chi2"
+
+def test_statistics(test: str, observed: np.ndarray, alpha: float = 0.05,
+                    p_value: str = "asymptotic") -> Dict:
+    """Chi-square, MAD and per-bin Z statistics of one test's histogram.
+
+    `observed` is indexed by bin value (as from np.bincount). The summation
+    test bins amounts rather than counts, so it gets MAD only. With
+    p_value="auto", small samples are scored against the null tables.
+    """
+    bins, probs = expected_distribution(test)
+    counts = test != "summation"
+    observed = np.asarray(observed, dtype=np.int64 if counts else np.float64)[bins]
+    n = observed.sum()
+    result = {"n": int(n) if counts else float(n), "bins": bins.tolist(),
+              "observed": observed.tolist(), "expected": (probs * n).tolist(),
+              "chi2": None, "p_chi": None, "mad": None, "conformity": None,
+              "z": None, "significant_bins": None, "anomalous": None}
+    if n == 0:
+        return result
+    
+    actual = observed / n
+    result["mad"] = float(np.mean(np.abs(actual - probs)))
+    result["conformity"] = _mad_conformity(test, result["mad"])
+    if not counts:
+        return result
+    
+    expected = probs * n
+    if p_value == "asymptotic" and np.any(expected < 5):
+        _warn_chi2()
+    chi2 = float(np.sum((observed - expected) ** 2 / expected))
+    p, small = chi2_p_values(test, [n], [chi2], p_value)
+    result["chi2"] = chi2
+    result["p_chi"] = float(p[0])
+    result["anomalous"] = bool(result["p_chi"] < alpha)
+    if p_value != "asymptotic":
+        result["p_method"] = _p_method(test, int(n), small[0])
+    
+    # Z with continuity correction, applied only while it is smaller than the gap
+    gap = np.abs(actual - probs)
+    correction = np.where(1 / (2 * n) < gap, 1 / (2 * n), 0.0)
+    z = (gap - correction) / np.sqrt(probs * (1 - probs) / n)
+    result["z"] = z.round(4).tolist()
+    result["significant_bins"] = bins[z > ndtri(1 - alpha / 2)].tolist()
+    return result
+
+def second_order_counts(values: np.ndarray) -> np.ndarray:
+    """First-two-digit histogram of the gaps between sorted values"""
+    gaps = np.diff(np.sort(np.asarray(values, dtype=np.float64)))
+    codes = first_two_digits(gaps[gaps > 0])
+    return np.bincount(codes[codes >= 0], minlength=100)
+
+# Smallest group size where every expected first-digit count reaches 5
+MIN_GROUP_COUNT = int(np.ceil(5 / np.log10(1 + 1/9)))
+
+class GroupedDigitCounts:
+    """First-digit histograms of many groups (vendors, columns, ...) at once.
+
+    add_codes() counts every (group id, digit) pair of a chunk with a single
+    bincount, so the cost per chunk does not grow with the number of groups.
+    labels[i] is the tuple of key values of group i, one per entry of names.
+    """
+    def __init__(self, names: List[str]):
+        self.names = list(names)
+        self.labels: List[tuple] = []
+        self.counts = np.zeros((0, 10), dtype=np.int64)
+    
+    def add_codes(self, group_ids: np.ndarray, codes: np.ndarray, n_groups: int) -> None:
+        if n_groups > len(self.counts):
+            # Grow geometrically; rows past n_groups stay zero
+            grown = np.zeros((max(n_groups, 2 * len(self.counts)), 10), dtype=np.int64)
+            grown[:len(self.counts)] = self.counts
+            self.counts = grown
+        valid = codes >= 0
+        pairs = np.asarray(group_ids, dtype=np.int64)[valid] * 10 + codes[valid]
+        self.counts[:n_groups] += np.bincount(pairs, minlength=n_groups * 10).reshape(n_groups, 10)
+    
+    def test(self, alpha: float = 0.05, top_k: int = 5, min_count: Optional[int] = None,
+             p_value: str = "asymptotic") -> Dict:
+        """Chi-square test of every group, ranked, with Bonferroni correction.
+
+        Groups smaller than min_count are counted but not tested; by default
+        that is MIN_GROUP_COUNT, or MIN_EXACT_COUNT when p_value="auto"
+        scores small groups against the null tables. The top_k groups by
+        p-value (then MAD) are returned.
+        """
+        if min_count is None:
+            min_count = MIN_GROUP_COUNT if p_value == "asymptotic" else MIN_EXACT_COUNT
+        probs = np.log10(1 + 1 / np.arange(1, 10))
+        observed = self.counts[:len(self.labels), 1:10]
+        n = observed.sum(axis=1)
+        tested = np.flatnonzero(n >= min_count)
+        m = len(tested)
+        
+        observed, n = observed[tested], n[tested]
+        expected = n[:, None] * probs
+        chi2 = ((observed - expected) ** 2 / expected).sum(axis=1)
+        p, small = chi2_p_values("first", n, chi2, p_value)
+        p_adjusted = np.minimum(p * m, 1.0)
+        mad = np.abs(observed / n[:, None] - probs).mean(axis=1)
+        
+        top = []
+        for i in np.lexsort((-mad, p))[:top_k]:
+            top.append({
+                "group": dict(zip(self.names, self.labels[tested[i]])),
+                "n": int(n[i]),
+                "chi2": float(chi2[i]),
+                "p_chi": float(p[i]),
+                "p_adjusted": float(p_adjusted[i]),
+                "mad": float(mad[i]),
+                "anomalous": bool(p_adjusted[i] < alpha),
+            })
+            if p_value != "asymptotic":
+                top[-1]["p_method"] = _p_method("first", int(n[i]), small[i])
+        return {
+            "group_by": self.names,
+            "groups": len(self.labels),
+            "tested": m,
+            "min_count": min_count,
+            "anomalous": int((p_adjusted < alpha).sum()),
+            "top": top,
+        }
+
+DUPLICATE_EXACT_MAX = 1 << 20     # distinct amounts counted exactly before switching to the sketch
+DUPLICATE_SKETCH_SIZE = 4096      # counters kept by the sketch
+_DUPLICATE_BATCH = 1 << 16        # chunk-level distinct amounts buffered between merges
+
+class DuplicateCounter:
+    """Frequencies of exact amounts, for the number-duplication test.
+
+    Each chunk is counted with np.unique and merged in bulk. Counts are
+    exact while at most `exact_max` distinct amounts have been seen. Past
+    that the counts become a Misra-Gries summary of `sketch_size` counters:
+    after every merge all counts drop by the (sketch_size + 1)-th largest
+    and the non-positive ones are evicted. Every amount whose share exceeds
+    1 / (sketch_size + 1) is kept, each count low by at most `error`.
+    """
+    def __init__(self, exact_max: int = DUPLICATE_EXACT_MAX,
+                 sketch_size: int = DUPLICATE_SKETCH_SIZE):
+        self.exact_max = exact_max
+        self.sketch_size = sketch_size
+        self.exact = True
+        self.total = 0
+        self.error = 0
+        self._values = np.empty(0, dtype=np.float64)
+        self._counts = np.empty(0, dtype=np.int64)
+        self._pending: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._pending_size = 0
+    
+    def add(self, numbers: np.ndarray) -> None:
+        numbers = np.asarray(numbers, dtype=np.float64)
+        numbers = numbers[np.isfinite(numbers) & (numbers != 0)]
+        if not len(numbers):
+            return
+        self.total += len(numbers)
+        values, counts = np.unique(numbers, return_counts=True)
+        self._pending.append((values, counts))
+        self._pending_size += len(values)
+        if self._pending_size >= max(len(self._values), _DUPLICATE_BATCH):
+            self._merge()
+    
+    def _merge(self) -> None:
+        if not self._pending:
+            return
+        values = np.concatenate([self._values] + [v for v, _ in self._pending])
+        counts = np.concatenate([self._counts] + [c for _, c in self._pending])
+        self._pending, self._pending_size = [], 0
+        values, inverse = np.unique(values, return_inverse=True)
+        counts = np.bincount(inverse, weights=counts).astype(np.int64)
+        if len(values) > self.exact_max:
+            self.exact = False
+        if not self.exact and len(values) > self.sketch_size:
+            cut = np.partition(counts, len(counts) - self.sketch_size - 1)[len(counts) - self.sketch_size - 1]
+            counts -= cut
+            self.error += int(cut)
+            keep = counts > 0
+            values, counts = values[keep], counts[keep]
+        self._values, self._counts = values, counts
+    
+    @property
+    def nbytes(self) -> int:
+        return self._values.nbytes + self._counts.nbytes + sum(
+            v.nbytes + c.nbytes for v, c in self._pending)
+    
+    def state(self) -> Dict[str, np.ndarray]:
+        self._merge()
+        return {"duplicate_values": self._values, "duplicate_counts": self._counts,
+                "duplicate_meta": np.array([self.exact_max, self.sketch_size, int(self.exact),
+                                            self.total, self.error], dtype=np.int64)}
+    
+    @classmethod
+    def from_state(cls, state: Dict[str, np.ndarray]) -> "DuplicateCounter":
+        exact_max, sketch_size, exact, total, error = np.asarray(state["duplicate_meta"]).tolist()
+        counter = cls(exact_max, sketch_size)
+        counter.exact, counter.total, counter.error = bool(exact), total, error
+        counter._values = np.array(state["duplicate_values"])
+        counter._counts = np.array(state["duplicate_counts"])
+        return counter
+    
+    def test(self, top_k: int = 5) -> Dict:
+        """The top_k most repeated amounts, by count.
+
+        `numbers` and shares cover the finite non-zero amounts. Exact counts
+        also give how many distinct amounts there are and how many repeat;
+        sketch counts are lower bounds, short by at most `max_error`.
+        """
+        self._merge()
+        order = np.lexsort((self._values, -self._counts))[:top_k]
+        order = order[self._counts[order] > (1 if self.exact else 0)]
+        report = {"method": "exact" if self.exact else "misra_gries", "numbers": self.total}
+        if self.exact:
+            report["distinct"] = len(self._values)
+            report["repeated"] = int((self._counts > 1).sum())
+        else:
+            report["max_error"] = self.error
+        report["top"] = [{"value": float(self._values[i]), "count": int(self._counts[i]),
+                          "share": float(self._counts[i] / self.total)} for i in order]
+        return report
+
+ROUND_MULTIPLES = (10, 100, 1000)
+# Approval-style limits checked by default: 1, 2 and 5 times 100 ... 10,000,000
+DEFAULT_THRESHOLDS = tuple(m * 10.0 ** k for k in range(2, 8) for m in (1, 2, 5))
+THRESHOLD_BAND = 0.05             # compare the 5% just below a threshold with the 5% above
+MIN_THRESHOLD_COUNT = 20          # amounts near a threshold needed to test it
+
+class AmountProfile:
+    """Round-number and threshold-proximity counts, filled with the digit histograms.
+
+    Round numbers: for each multiple m in ROUND_MULTIPLES, how many amounts
+    of at least m are whole multiples of m. If the trailing digits of whole
+    amounts are uniform, 1/m of the whole amounts >= m are.
+
+    Thresholds: amounts within `band` below each threshold against as far
+    above it. Under Benford's law amounts are log-uniform locally, so a
+    share ln(1/(1-band)) / (ln(1/(1-band)) + ln(1+band)) of them, just over
+    1/2, fall below. Bunching under a limit shows up as an excess there.
+    Only thresholds whose band lies within the range of the amounts seen
+    are tested, so the edges of the data are not taken for bunching.
+    """
+    def __init__(self, thresholds: Sequence[float] = DEFAULT_THRESHOLDS,
+                 band: float = THRESHOLD_BAND):
+        self.thresholds = np.unique(np.asarray(thresholds, dtype=np.float64))
+        self.band = band
+        # Per multiple: amounts >= m, whole ones among them, multiples of m
+        self.round = np.zeros((len(ROUND_MULTIPLES), 3), dtype=np.int64)
+        # Per threshold: amounts in [t(1-band), t) and in [t, t(1+band))
+        self.near = np.zeros((len(self.thresholds), 2), dtype=np.int64)
+        self.range = [np.inf, 0.0]  # smallest and largest amount seen
+        self._edges = np.unique(np.concatenate(
+            [self.thresholds * (1 - band), self.thresholds, self.thresholds * (1 + band)]))
+    
+    def add(self, numbers: np.ndarray) -> None:
+        x = np.abs(np.asarray(numbers, dtype=np.float64))
+        x = x[np.isfinite(x) & (x > 0)]
+        if not len(x):
+            return
+        self.range = [min(self.range[0], float(x.min())), max(self.range[1], float(x.max()))]
+        whole = x[(x == np.floor(x)) & (x < 2.0**63)].astype(np.int64)
+        for i, m in enumerate(ROUND_MULTIPLES):
+            large = whole[whole >= m]
+            self.round[i] += [np.count_nonzero(x >= m), len(large), np.count_nonzero(large % m == 0)]
+        # One binary search per amount over all threshold edges
+        bins = np.bincount(np.searchsorted(self._edges, x, side='right'), minlength=len(self._edges) + 1)
+        below = np.concatenate([[0], np.cumsum(bins)])  # below[i]: amounts under edge i - 1
+        edge = lambda values: np.searchsorted(self._edges, values) + 1
+        low, mid, high = (below[edge(self.thresholds * f)] for f in (1 - self.band, 1, 1 + self.band))
+        self.near += np.stack([mid - low, high - mid], axis=1)
+    
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"round_counts": self.round, "threshold_counts": self.near,
+                "thresholds": self.thresholds, "threshold_band": np.array(self.band),
+                "amount_range": np.array(self.range)}
+    
+    @classmethod
+    def from_state(cls, state: Dict[str, np.ndarray]) -> "AmountProfile":
+        profile = cls(np.array(state["thresholds"]), float(state["threshold_band"]))
+        profile.round = np.array(state["round_counts"])
+        profile.near = np.array(state["threshold_counts"])
+        profile.range = np.asarray(state["amount_range"]).tolist()
+        return profile
+    
+    def test(self, alpha: float = 0.05, top_k: int = 5) -> Dict:
+        """One-sided binomial tests for too many round amounts and for amounts
+        bunched under a threshold, Bonferroni-corrected within each report.
+        Thresholds with fewer than MIN_THRESHOLD_COUNT amounts nearby, or
+        at the edge of the data, are not tested; the top_k tested ones by
+        p-value are returned.
+        """
+        from scipy.stats import binom
+        multiples = []
+        for m, (n, whole, hits) in zip(ROUND_MULTIPLES, self.round.tolist()):
+            p = float(binom.sf(hits - 1, whole, 1 / m)) if whole else 1.0
+            multiples.append({"multiple": m, "n": n, "whole": whole, "observed": hits,
+                              "expected": whole / m, "p": p,
+                              "anomalous": bool(p * len(ROUND_MULTIPLES) < alpha)})
+        
+        share = np.log(1 / (1 - self.band))
+        share /= share + np.log(1 + self.band)
+        below, above = self.near[:, 0], self.near[:, 1]
+        n = below + above
+        inside = ((self.thresholds * (1 - self.band) >= self.range[0])
+                  & (self.thresholds * (1 + self.band) <= self.range[1]))
+        tested = np.flatnonzero(inside & (n >= MIN_THRESHOLD_COUNT))
+        p = binom.sf(below[tested] - 1, n[tested], share)
+        p_adjusted = np.minimum(p * len(tested), 1.0)
+        thresholds = []
+        for i in np.argsort(p, kind='stable')[:top_k]:
+            j = tested[i]
+            thresholds.append({"threshold": float(self.thresholds[j]), "below": int(below[j]),
+                               "above": int(above[j]), "expected_below": float(n[j] * share),
+                               "p": float(p[i]), "p_adjusted": float(p_adjusted[i]),
+                               "anomalous": bool(p_adjusted[i] < alpha)})
+        return {"multiples": multiples, "band": self.band, "tested": len(tested),
+                "thresholds": thresholds}
+
+# Sequential mode: first look at this many numbers, then whenever the count doubles
+SEQUENTIAL_MIN_COUNT = 10_000
+# Stop as normal once the full-input test would reject with at most this probability
+FUTILITY_POWER = 0.2
+
+def _noncentrality_upper(chi2: float, df: int, alpha: float) -> float:
+    """Upper 1 - alpha confidence bound on the chi-square noncentrality"""
+    from scipy.optimize import brentq
+    from scipy.stats import ncx2
+    if chdtr(df, chi2) <= alpha:
+        return 0.0
+    high = max(chi2, 1.0)
+    while ncx2.cdf(chi2, df, high) > alpha:
+        high *= 2
+    return brentq(lambda nc: ncx2.cdf(chi2, df, nc) - alpha, 0.0, high)
+
+class SequentialTest:
+    """Decides when reading more input can no longer change `anomalous`.
+
+    Looks happen from SEQUENTIAL_MIN_COUNT numbers on, each time the count
+    has doubled, and look k rejects at alpha / 2**(k + 1). Those levels sum
+    to less than alpha / 2; the test of whatever was read in the end gets
+    the other half, `final_level`, so stopping early as anomalous or not
+    keeps the false-alarm rate below alpha. Input stops as normal when, even for
+    the largest deviation consistent with the data so far (an upper bound on
+    the noncentrality at the same spent level, so all looks' bounds hold
+    together with 1 - alpha confidence), scaled to the expected total, the
+    full-data test would reject with probability below FUTILITY_POWER.
+    """
+    def __init__(self, alpha: float = 0.05, min_count: int = SEQUENTIAL_MIN_COUNT):
+        self.alpha = alpha
+        self.final_level = alpha / 2
+        self.looks = 0
+        self.level: Optional[float] = None
+        self.decision: Optional[str] = None
+        self._next_look = min_count
+    
+    def update(self, counts: np.ndarray, expected_total: Optional[float] = None) -> Optional[str]:
+        """Feed cumulative first-digit counts; returns "anomalous" or "normal" once decided"""
+        observed = np.asarray(counts)[1:10]
+        n = int(observed.sum())
+        if self.decision or n < self._next_look:
+            return self.decision
+        self.looks += 1
+        self._next_look = 2 * n
+        self.level = self.alpha / 2 ** (self.looks + 1)
+        _, probs = expected_distribution("first")
+        chi2 = float(_chi2_statistic(observed, probs))
+        df = len(probs) - 1
+        if chdtrc(df, chi2) < self.level:
+            self.decision = "anomalous"
+        elif expected_total and expected_total > n:
+            from scipy.stats import ncx2
+            noncentrality = _noncentrality_upper(chi2, df, self.level) * expected_total / n
+            critical = chdtri(df, self.final_level)
+            if ncx2.sf(critical, df, noncentrality) < FUTILITY_POWER:
+                self.decision = "normal"
+        return self.decision
+    
+    def statement(self, read: int, total: Optional[float] = None) -> str:
+        """Confidence statement; `total` is the expected input size when reading stopped early"""
+        if total is None:
+            return (f"Read all {read:,} numbers; the status is the full-data test at "
+                    f"{self.final_level:g}, the half of {self.alpha:g} not spent on looks.")
+        of = f" of about {int(total):,}"
+        if self.decision == "anomalous":
+            return (f"Stopped after {read:,}{of} numbers: the first-digit test rejected at "
+                    f"{self.level:.3g}, the level of look {self.looks} when half of {self.alpha:g} "
+                    f"is spent over all looks, so the input is anomalous at significance {self.alpha:g}.")
+        return (f"Stopped after {read:,}{of} numbers: with {1 - self.alpha:.0%} confidence the "
+                f"deviation from Benford's law is small enough that a test of the full input "
+                f"would reject with probability below {FUTILITY_POWER:.0%}.")
+
+def proportion_margin(counts: np.ndarray, population: int, alpha: float = 0.05) -> float:
+    """Largest first-digit proportion margin of a uniform sample.
+
+    Simultaneous over the 9 digits (Bonferroni), with the finite-population
+    correction for sampling without replacement.
+    """
+    observed = np.asarray(counts)[1:10]
+    n = observed.sum()
+    if n == 0 or n >= population:
+        return 0.0
+    share = observed / n
+    correction = (population - n) / max(population - 1, 1)
+    return float(-ndtri(alpha / 18) * np.sqrt((share * (1 - share)).max() / n * correction))
+
+class SourceMap:
+    """Where each accumulated value came from, parallel to the digit codes.
+
+    Table cells keep their data row (int32, 0-based without the header, as
+    in pandas' iloc) and an index into `columns` (uint8 up to 256 columns).
+    PDF values keep their 1-based page as runs of (first value, page), so a
+    page costs 12 bytes however many numbers it holds.
+    """
+    ARRAYS = ("rows", "columns", "pages")
+
+    def __init__(self, columns: Sequence[str] = ()):
+        self.columns = list(columns)
+        self.count = 0
+        self._rows: List[np.ndarray] = []
+        self._column_ids: List[np.ndarray] = []
+        self._page_starts: List[int] = []
+        self._pages: List[int] = []
+
+    def add(self, n: int, source: Dict) -> None:
+        """Source of the next n values: per-value "rows" and "columns" (with
+        the column "names"), or per-value "pages"
+        """
+        if "names" in source:
+            self.columns = list(source["names"])
+        if "rows" in source:
+            dtype = np.uint8 if len(self.columns) <= 256 else np.uint16
+            self._rows.append(np.asarray(source["rows"], dtype=np.int32))
+            self._column_ids.append(np.asarray(source["columns"], dtype=dtype))
+        if "pages" in source and n:
+            pages = np.asarray(source["pages"])
+            for start in np.concatenate([[0], np.flatnonzero(np.diff(pages)) + 1]):
+                if not self._pages or self._pages[-1] != pages[start]:
+                    self._page_starts.append(self.count + int(start))
+                    self._pages.append(int(pages[start]))
+        self.count += n
+
+    @property
+    def rows(self) -> np.ndarray:
+        if len(self._rows) != 1:
+            self._rows = [np.concatenate(self._rows) if self._rows else np.empty(0, dtype=np.int32)]
+        return self._rows[0]
+
+    @property
+    def column_ids(self) -> np.ndarray:
+        if len(self._column_ids) != 1:
+            self._column_ids = [np.concatenate(self._column_ids) if self._column_ids
+                                else np.empty(0, dtype=np.uint8)]
+        return self._column_ids[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows.nbytes + self.column_ids.nbytes + 12 * len(self._pages)
+
+    def locate(self, start: int, end: int) -> Dict:
+        """First and last row and page, and the columns, of values start..end"""
+        where = {}
+        if len(self.rows):
+            where["rows"] = [int(self.rows[start]), int(self.rows[end])]
+            present = np.bincount(self.column_ids[start:end + 1], minlength=len(self.columns))
+            where["columns"] = [self.columns[i] for i in np.flatnonzero(present)]
+        if self._pages:
+            runs = np.searchsorted(self._page_starts, [start, end], side='right') - 1
+            where["pages"] = [self._pages[i] for i in runs]
+        return where
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"source_rows": self.rows, "source_columns": self.column_ids,
+                "source_names": np.array(json.dumps(self.columns)),
+                "source_page_starts": np.array(self._page_starts, dtype=np.int64),
+                "source_pages": np.array(self._pages, dtype=np.int32)}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, np.ndarray], count: int) -> "SourceMap":
+        source = cls(json.loads(str(state["source_names"])))
+        source.count = count
+        source._rows = [np.array(state["source_rows"])]
+        source._column_ids = [np.array(state["source_columns"])]
+        source._page_starts = np.asarray(state["source_page_starts"]).tolist()
+        source._pages = np.asarray(state["source_pages"]).tolist()
+        return source
+
+class DigitAccumulator:
+    """Incremental digit histograms for chunked input.
+
+    Only digit counts are needed for the full-dataset tests; the int8 first
+    digit code of every value (1 byte instead of a boxed float) is kept for
+    bisection. keep_values also keeps the numbers, for the second-order test,
+    and `groups` collects per-group counts when update() gets group ids.
+    When only a sample of the input was added, `sampling` describes it and
+    `positions` holds each value's index in the full input. `source` maps
+    values back to rows, columns and pages when update() gets their source.
+    Set `duplicates` or `amounts` to count repeated amounts or round and
+    near-threshold amounts in the same pass.
+    """
+    def __init__(self, keep_codes: bool = True, keep_values: bool = False,
+                 groups: Optional[GroupedDigitCounts] = None):
+        self.keep_codes = keep_codes
+        self.keep_values = keep_values
+        self.groups = groups
+        self.counts = np.zeros(10, dtype=np.int64)
+        self.count = 0
+        # Histograms of the other tests, indexed by bin value; second digits
+        # are the column sums of the first-two-digit histogram
+        self.histograms: Optional[Dict[str, np.ndarray]] = {
+            "first_two": np.zeros(100, dtype=np.int64),
+            "last_two": np.zeros(100, dtype=np.int64),
+            "summation": np.zeros(100, dtype=np.float64),
+        }
+        self._chunks: List[np.ndarray] = []
+        self._values: List[np.ndarray] = []
+        self.sampling: Optional[Dict] = None
+        self.positions: Optional[np.ndarray] = None
+        self.source: Optional[SourceMap] = None
+        self.duplicates: Optional[DuplicateCounter] = None
+        self.amounts: Optional[AmountProfile] = None
+    
+    @classmethod
+    def from_codes(cls, codes: np.ndarray) -> "DigitAccumulator":
+        """Rebuild a first-digit-only accumulator from stored digit codes"""
+        acc = cls()
+        acc.histograms = None
+        acc._add_codes(np.asarray(codes, dtype=np.int8))
+        return acc
+    
+    @classmethod
+    def from_state(cls, state: Dict[str, np.ndarray]) -> "DigitAccumulator":
+        """Inverse of state()"""
+        acc = cls.from_codes(state["codes"])
+        if "summation" in state:
+            acc.histograms = {name: np.array(state[name]) for name in
+                              ("first_two", "last_two", "summation")}
+        if "values" in state:
+            acc.keep_values = True
+            acc._values = [np.array(state["values"])]
+        if "group_counts" in state:
+            # Labels are stored as JSON to keep the .npz free of pickled objects
+            names, labels = json.loads(str(state["group_labels"]))
+            acc.groups = GroupedDigitCounts(names)
+            acc.groups.labels = [tuple(label) for label in labels]
+            acc.groups.counts = np.array(state["group_counts"])
+        if "sampling" in state:
+            acc.sampling = json.loads(str(state["sampling"]))
+        if "positions" in state:
+            acc.positions = np.array(state["positions"])
+        if "source_rows" in state:
+            acc.source = SourceMap.from_state(state, acc.count)
+        if "duplicate_meta" in state:
+            acc.duplicates = DuplicateCounter.from_state(state)
+        if "round_counts" in state:
+            acc.amounts = AmountProfile.from_state(state)
+        return acc
+    
+    def state(self) -> Dict[str, np.ndarray]:
+        """Arrays that fully describe the accumulator, e.g. for np.savez"""
+        state = {"codes": self.codes, **(self.histograms or {})}
+        if self.keep_values:
+            state["values"] = self.values
+        if self.groups is not None:
+            state["group_counts"] = self.groups.counts[:len(self.groups.labels)]
+            state["group_labels"] = np.array(json.dumps([self.groups.names, self.groups.labels]))
+        if self.sampling is not None:
+            state["sampling"] = np.array(json.dumps(self.sampling))
+        if self.positions is not None:
+            state["positions"] = self.positions
+        if self.source is not None:
+            state.update(self.source.state())
+        for extra in (self.duplicates, self.amounts):
+            if extra is not None:
+                state.update(extra.state())
+        return state
+    
+    def update(self, numbers: Union[List[float], np.ndarray],
+               group_ids: Optional[np.ndarray] = None, n_groups: int = 0,
+               source: Optional[Dict] = None) -> None:
+        """Add a chunk; group_ids gives the group (< n_groups) of each number.
+
+        `source` locates the numbers, in the form SourceMap.add takes.
+        """
+        numbers = np.asarray(numbers, dtype=np.float64).ravel()
+        if source:
+            if self.source is None:
+                self.source = SourceMap()
+            self.source.add(len(numbers), source)
+        digits = extract_digits(numbers)
+        self._add_codes(digits["first"])
+        if group_ids is not None:
+            self.groups.add_codes(group_ids, digits["first"], n_groups)
+        if self.histograms is not None:
+            for name in ("first_two", "last_two"):
+                codes = digits[name]
+                self.histograms[name] += np.bincount(codes[codes >= 0], minlength=len(self.histograms[name]))
+            valid = digits["first_two"] >= 0
+            self.histograms["summation"] += np.bincount(
+                digits["first_two"][valid], weights=np.abs(numbers[valid]), minlength=100)
+        if self.keep_values and len(numbers):
+            self._values.append(numbers)
+        if self.duplicates is not None:
+            self.duplicates.add(numbers)
+        if self.amounts is not None:
+            self.amounts.add(numbers)
+    
+    def _add_codes(self, codes: np.ndarray) -> None:
+        self.counts += np.bincount(codes[codes >= 0], minlength=10)
+        self.count += len(codes)
+        if self.keep_codes and len(codes):
+            self._chunks.append(codes)
+    
+    @property
+    def codes(self) -> np.ndarray:
+        if len(self._chunks) != 1:
+            self._chunks = [np.concatenate(self._chunks) if self._chunks
+                            else np.empty(0, dtype=np.int8)]
+        return self._chunks[0]
+    
+    @property
+    def values(self) -> np.ndarray:
+        if len(self._values) != 1:
+            self._values = [np.concatenate(self._values) if self._values
+                            else np.empty(0, dtype=np.float64)]
+        return self._values[0]
+    
+    @property
+    def nbytes(self) -> int:
+        size = self.codes.nbytes + (self.values.nbytes if self.keep_values else 0)
+        size += self.positions.nbytes if self.positions is not None else 0
+        size += self.source.nbytes if self.source is not None else 0
+        size += self.duplicates.nbytes if self.duplicates is not None else 0
+        return size + (self.groups.counts.nbytes if self.groups is not None else 0)
+    
+    def supports(self, tests: Iterable[str]) -> bool:
+        """Whether the kept state is enough to run these tests"""
+        tests = set(tests)
+        if tests - {"first"} and self.histograms is None:
+            return False
+        return "second_order" not in tests or self.keep_values
+    
+    def result(self, alpha: float = 0.05, p_value: str = "asymptotic") -> Dict:
+        _, bins = benford_expected_distribution(1)
+        return benford_test_counts(self.counts[bins], 1, alpha, p_value)
+    
+    def test_suite(self, tests: Iterable[str] = TESTS, alpha: float = 0.05,
+                   p_value: str = "asymptotic") -> Dict[str, Dict]:
+        """test_statistics for each requested test, from the histograms"""
+        if not self.supports(tests):
+            raise ValueError("Digit data was stored without what these tests need")
+        results = {}
+        for test in tests:
+            if test == "first":
+                observed = self.counts
+            elif test == "second":
+                observed = self.histograms["first_two"][10:].reshape(9, 10).sum(axis=0)
+            elif test == "second_order":
+                observed = second_order_counts(self.values)
+            else:
+                observed = self.histograms[test]
+            results[test] = test_statistics(test, observed, alpha, p_value)
+        return results
+
+def benford_test_suite(numbers: Union[List[float], np.ndarray], tests: Iterable[str] = TESTS,
+                       alpha: float = 0.05, p_value: str = "asymptotic") -> Dict[str, Dict]:
+    """Run several tests on the numbers with a single digit extraction"""
+    acc = DigitAccumulator(keep_codes=False, keep_values="second_order" in tests)
+    acc.update(numbers)
+    return acc.test_suite(tests, alpha, p_value)
+
+class _PlotTemplate:
+    """Figure, axes and bars built once per bin layout and reused.
+
+    Rendering only updates the bar heights, so a plot costs one savefig
+    instead of a full figure setup. Uses the object-oriented Agg API rather
+    than pyplot's global state; the lock serializes threads sharing a template.
+    """
+    def __init__(self, bins: List[int]):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        self.figure = Figure(figsize=(10, 6))
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.lock = threading.Lock()
+        indices = np.arange(len(bins))
+        width = 0.35
+        zeros = np.zeros(len(bins))
+        
+        self.observed = self.ax.bar(indices, zeros, width, label='Observed', alpha=0.7)
+        self.expected = self.ax.bar(indices + width, zeros, width, label='Expected', alpha=0.7)
+        
+        self.ax.set_xticks(indices + width/2, bins)
+        self.ax.set_xlabel('Digit' if len(bins) == 9 else 'Second Digit')
+        self.ax.set_ylabel('Frequency')
+        self.ax.set_title("Benford's Law Compliance")
+        self.ax.legend()
+    
+    def render(self, observed: List[int], expected: List[float], fmt: str = 'png') -> bytes:
+        with self.lock:
+            for bars, heights in ((self.observed, observed), (self.expected, expected)):
+                for bar, height in zip(bars, heights):
+                    bar.set_height(height)
+            self.ax.relim()
+            self.ax.autoscale_view()
+            buf = BytesIO()
+            self.figure.savefig(buf, format=fmt, bbox_inches='tight')
+            return buf.getvalue()
+
+_plot_templates: Dict[Tuple[int, ...], _PlotTemplate] = {}
+
+def render_benford_plot(observed: List[int], expected: List[float],
+                        bins: List[int], fmt: str = 'png') -> bytes:
+    """Observed vs expected bar chart as PNG or SVG bytes"""
+    key = tuple(int(b) for b in bins)
+    if key not in _plot_templates:
+        _plot_templates[key] = _PlotTemplate(list(key))
+    return _plot_templates[key].render(observed, expected, fmt)
 
 def plot_benford(observed: List[int], expected: List[float], 
                 bins: List[int]) -> str:
-    """Improved visualization"""
-    plt.figure(figsize=(10, 6))
-    indices = np.arange(len(bins))
-    width = 0.35
-    
-    plt.bar(indices, observed, width, label='Observed', alpha=0.7)
-    plt.bar(indices + width, expected, width, label='Expected', alpha=0.7)
-    
-    plt.xticks(indices + width/2, bins)
-    plt.xlabel('Digit' if len(bins) == 9 else 'Second Digit')
-    plt.ylabel('Frequency')
-    plt.title("Benford's Law Compliance")
-    plt.legend()
-    
-    buf = BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight')
-    plt.close()
-    return base64.b64encode(buf.getvalue()).decode('utf-8')
-
-def bisection_analysis(numbers: List[float], max_depth: int = 3, 
-                      alpha: float = 0.05) -> List[Dict]:
-    """Bonferroni-corrected analysis"""
+    """Improved visualization, as a base64 PNG"""
+    png = render_benford_plot(observed, expected, bins, 'png')
+    return base64.b64encode(png).decode('utf-8')
+
+class DigitPrefixIndex:
+    """Cumulative first-digit counts so any [start, end) range is a subtraction.
+
+    Row i of the matrix holds the counts of digits 1-9 in codes[:i * block].
+    block=1 is the plain (n+1) x 9 matrix; larger blocks keep a checkpoint
+    every `block` values (36 / block bytes per value) and count the at most
+    2 * (block - 1) codes between checkpoints directly.
+    """
+    def __init__(self, codes: np.ndarray, block: int = 64):
+        self.codes = np.asarray(codes, dtype=np.int8)
+        self.block = block
+        n = len(self.codes)
+        n_blocks = -(-n // block)
+        dtype = np.int32 if n < 2**31 else np.int64
+        
+        padded = np.full(n_blocks * block, -1, dtype=np.int8)
+        padded[:n] = self.codes
+        padded = padded.reshape(n_blocks, block)
+        self._prefix = np.zeros((n_blocks + 1, 9), dtype=dtype)
+        for d in range(1, 10):
+            np.cumsum((padded == d).sum(axis=1), out=self._prefix[1:, d - 1])
+    
+    @classmethod
+    def from_prefix(cls, codes: np.ndarray, prefix: np.ndarray, block: int) -> "DigitPrefixIndex":
+        """Wrap checkpoints kept elsewhere (e.g. on disk) instead of recounting the codes"""
+        index = cls.__new__(cls)
+        index.codes, index.block, index._prefix = codes, block, prefix
+        return index
+    
+    @classmethod
+    def from_numbers(cls, numbers: Union[List[float], np.ndarray], block: int = 64) -> "DigitPrefixIndex":
+        return cls(first_digits(numbers), block)
+    
+    def __len__(self) -> int:
+        return len(self.codes)
+    
+    def _cumulative(self, pos: np.ndarray) -> np.ndarray:
+        """Digit counts of codes[:pos] for every position in `pos`"""
+        base = pos // self.block
+        out = self._prefix[base].astype(np.int64)
+        if self.block > 1 and len(self.codes):
+            offsets = np.arange(self.block - 1)
+            start = base * self.block
+            idx = np.minimum(start[:, None] + offsets, len(self.codes) - 1)
+            tail = np.where(offsets < (pos - start)[:, None], self.codes[idx], -1)
+            for d in range(1, 10):
+                out[:, d - 1] += (tail == d).sum(axis=1)
+        return out
+    
+    def range_counts(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """(m, 9) digit counts for the ranges [starts[i], ends[i])"""
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        return self._cumulative(ends) - self._cumulative(starts)
+    
+    def counts(self, start: int, end: int) -> List[int]:
+        return self.range_counts([start], [end])[0].tolist()
+    
+    def test(self, start: int, end: int, alpha: float = 0.05,
+             p_value: str = "asymptotic") -> Dict:
+        """benford_test on codes[start:end] without touching the data"""
+        return benford_test_counts(self.counts(start, end), 1, alpha, p_value)
+
+def bisection_analysis(numbers: Union[List[float], np.ndarray, None], max_depth: int = 3, 
+                      alpha: float = 0.05, index: Optional[DigitPrefixIndex] = None,
+                      p_value: str = "asymptotic") -> List[Dict]:
+    """Bonferroni-corrected analysis
+
+    Pass a prebuilt `index` to skip digit extraction; every node is then
+    tested from two prefix-sum lookups. p_value="auto" keeps splitting down
+    to MIN_EXACT_COUNT numbers, scoring small segments with the null tables.
+    """
     anomalies = []
     test_count = 2 ** (max_depth + 1) - 1  # Total possible tests
     adjusted_alpha = alpha / test_count
+    min_size = 50 if p_value == "asymptotic" else MIN_EXACT_COUNT
+    
+    if index is None:
+        index = DigitPrefixIndex.from_numbers(numbers)
     
-    def _bisect(subset: List[float], indices: List[int], depth: int):
-        if depth > max_depth or len(subset) < 50:
+    def _bisect(start: int, end: int, depth: int):
+        if depth > max_depth or end - start < min_size:
             return
         
         try:
-            result = benford_test(subset, alpha=adjusted_alpha)
+            result = index.test(start, end, alpha=adjusted_alpha, p_value=p_value)
             if result['anomalous']:
                 anomalies.append({
-                    "start_index": indices[0],
-                    "end_index": indices[-1],
+                    "start_index": start,
+                    "end_index": end - 1,
                     "p_chi": result["p_chi"],
                     #"p_cvm": result["p_cvm"],
                     "depth": depth
                 })
+                if "p_method" in result:
+                    anomalies[-1]["p_method"] = result["p_method"]
                 
                 # Split and recurse
-                mid = len(subset) // 2
-                _bisect(subset[:mid], indices[:mid], depth + 1)
-                _bisect(subset[mid:], indices[mid:], depth + 1)
+                mid = start + (end - start) // 2
+                _bisect(start, mid, depth + 1)
+                _bisect(mid, end, depth + 1)
         except ValueError as e:
             warnings.warn(f"Skipping bisection: {str(e)}")
     
-    _bisect(numbers, list(range(len(numbers))), 1)
+    _bisect(0, len(index), 1)
     return sorted(anomalies, key=lambda x: x['p_chi'])[:5]
 
+def sliding_window_scan(index: DigitPrefixIndex, window: int, stride: Optional[int] = None,
+                        top_k: int = 5, alpha: float = 0.05,
+                        p_value: str = "asymptotic") -> List[Dict]:
+    """Test every fixed-size window and report the top-k anomalous ones.
+
+    All windows are scored at once from the prefix index. Significance is
+    Bonferroni-corrected over the number of windows, and overlapping windows
+    are suppressed in favour of the most significant one. p_value="auto"
+    allows windows down to MIN_EXACT_COUNT, scored with the null tables.
+    """
+    stride = stride or max(window // 2, 1)
+    if stride < 1:
+        raise ValueError("window_stride must be at least 1")
+    if window < (50 if p_value == "asymptotic" else MIN_EXACT_COUNT) or window > len(index):
+        return []
+    
+    starts = np.arange(0, len(index) - window + 1, stride)
+    observed = index.range_counts(starts, starts + window)
+    totals = observed.sum(axis=1)
+    probs, _ = benford_expected_distribution(1)
+    expected = totals[:, None] * np.asarray(probs)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        chi2 = np.where(totals > 0, ((observed - expected) ** 2 / expected).sum(axis=1), 0.0)
+    p_values, small = chi2_p_values("first", totals, chi2, p_value)
+    adjusted_alpha = alpha / len(starts)
+    
+    windows = []
+    for i in np.argsort(p_values, kind='stable'):
+        if p_values[i] >= adjusted_alpha or len(windows) >= top_k:
+            break
+        start = int(starts[i])
+        if any(abs(start - w["start_index"]) < window for w in windows):
+            continue
+        windows.append({
+            "start_index": start,
+            "end_index": start + window - 1,
+            "p_chi": float(p_values[i]),
+        })
+        if p_value != "asymptotic":
+            windows[-1]["p_method"] = _p_method("first", int(totals[i]), small[i])
+    return windows
+
 def validate_benford_assumptions(expected: List[float]) -> None:
     """Check chi-square requirements"""
     if any(e < 5 for e in expected):
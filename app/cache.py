@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+from .benford import DigitAccumulator
+
+class LRUCache:
+    """Bounded least-recently-used mapping, sized by entries or by bytes.
+
+    Locked, since /analyze reaches the parsed tier from threadpool threads.
+    """
+    def __init__(self, max_size: int, sizeof: Callable[[Any], int] = lambda value: 1):
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.size = 0
+        self._items: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            if key in self._items:
+                self.size -= self.sizeof(self._items.pop(key))
+            if self.sizeof(value) > self.max_size:
+                return
+            self._items[key] = value
+            self.size += self.sizeof(value)
+            while self.size > self.max_size:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= self.sizeof(evicted)
+
+class ResultCache:
+    """Content-addressed cache for /analyze.
+
+    Uploads are keyed by the SHA-256 of their bytes (plus the file type, which
+    decides how they are parsed). Two things are cached per upload:
+      parsed     the digit codes and histograms, so new parameters skip parsing
+      responses  the final JSON, keyed by the analysis parameters
+    Plots are keyed by their own content id: the small spec a response
+    points to, and the rendered bytes per format once /plots asked for them.
+    All live in bounded in-memory LRUs, with an optional directory tier that
+    survives restarts and is shared between service processes. The directory
+    tier is bounded too: past max_disk_bytes, the least recently read or
+    written files are deleted.
+    """
+    def __init__(self, max_parsed_bytes: int = 256 * 1024**2, max_responses: int = 1024,
+                 directory: Optional[str] = None, max_plot_bytes: int = 64 * 1024**2,
+                 max_disk_bytes: int = 1024**3):
+        self.parsed = LRUCache(max_parsed_bytes, sizeof=lambda acc: acc.nbytes)
+        self.responses = LRUCache(max_responses)
+        # Specs are a few dozen bytes; keep more of them than responses that point to them
+        self.plot_specs = LRUCache(max_responses * 16)
+        self.plots = LRUCache(max_plot_bytes, sizeof=len)
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.stats = {"parsed_hits": 0, "parsed_misses": 0,
+                      "response_hits": 0, "response_misses": 0,
+                      "plot_hits": 0, "plot_misses": 0}
+        self._lock = threading.Lock()
+        self._written = 0
+        if directory:
+            for tier in ("parsed", "responses", "plots"):
+                os.makedirs(os.path.join(directory, tier), exist_ok=True)
+            self.trim()
+
+    @classmethod
+    def from_env(cls) -> "ResultCache":
+        env = os.environ.get
+        return cls(max_parsed_bytes=int(env("BENFORD_CACHE_MAX_BYTES", 256 * 1024**2)),
+                   max_responses=int(env("BENFORD_CACHE_MAX_RESPONSES", 1024)),
+                   directory=env("BENFORD_CACHE_DIR") or None,
+                   max_plot_bytes=int(env("BENFORD_CACHE_MAX_PLOT_BYTES", 64 * 1024**2)),
+                   max_disk_bytes=int(env("BENFORD_CACHE_DISK_BYTES", 1024**3)))
+
+    @staticmethod
+    def upload_key(digest: str, filename: str) -> str:
+        return f"{digest}-{os.path.splitext(filename)[1].lower().lstrip('.')}"
+
+    @staticmethod
+    def parsed_key(upload_key: str, params: Dict) -> str:
+        """Parsed digits depend on the upload, on which columns/groups were read
+        and on which amount counts were kept.
+
+        Sampling depends on the significance level too (where to stop, the
+        stated margin).
+        """
+        options = {name: params.get(name)
+                   for name in ("columns", "group_by", "sample_size", "early_stop",
+                                "duplicates", "round_numbers", "thresholds")
+                   if params.get(name)}
+        if params.get("sample_size") or params.get("early_stop"):
+            options["significance_level"] = params.get("significance_level")
+        return ResultCache.params_key(upload_key, options) if options else upload_key
+
+    @staticmethod
+    def params_key(upload_key: str, params: Dict) -> str:
+        encoded = json.dumps(params, sort_keys=True).encode()
+        return f"{upload_key}-{hashlib.sha256(encoded).hexdigest()[:16]}"
+
+    def _disk_path(self, tier: str, key: str, ext: str) -> str:
+        return os.path.join(self.directory, tier, f"{key}.{ext}")
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _read(self, path: str, read: Callable) -> Optional[Any]:
+        """read(file) of a disk-tier entry, or None when there is none"""
+        try:
+            with open(path, 'rb') as f:
+                value = read(f)
+        except FileNotFoundError:  # absent, or trimmed by another process meanwhile
+            return None
+        # Reading an entry counts as using it, for trim()
+        os.utime(path)
+        return value
+
+    def _write(self, path: str, write: Callable) -> None:
+        # Write then rename so a concurrent reader never sees half a file;
+        # mkstemp keeps threads of one process off each other's temp file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+                size = f.tell()
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        # Rescanning the directory on every write would cost more than the
+        # writes; trim once a sixteenth of the budget has been written
+        with self._lock:
+            self._written += size
+            due = self._written > self.max_disk_bytes / 16
+            if due:
+                self._written = 0
+        if due:
+            self.trim()
+
+    def trim(self) -> None:
+        """Delete the least recently used disk-tier files until they fit max_disk_bytes"""
+        if not self.directory:
+            return
+        files = []
+        for tier in ("parsed", "responses", "plots"):
+            with os.scandir(os.path.join(self.directory, tier)) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".tmp"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def get_parsed(self, key: str) -> Optional[DigitAccumulator]:
+        acc = self.parsed.get(key)
+        if acc is None and self.directory:
+            def _load(f):
+                with np.load(f) as state:
+                    return DigitAccumulator.from_state(state)
+            acc = self._read(self._disk_path("parsed", key, "npz"), _load)
+            if acc is not None:
+                self.parsed.put(key, acc)
+        self._count("parsed_hits" if acc is not None else "parsed_misses")
+        return acc
+
+    def put_parsed(self, key: str, acc: DigitAccumulator) -> None:
+        self.parsed.put(key, acc)
+        if self.directory:
+            self._write(self._disk_path("parsed", key, "npz"), lambda f: np.savez(f, **acc.state()))
+
+    def get_response(self, key: str) -> Optional[Dict]:
+        response = self.responses.get(key)
+        if response is None and self.directory:
+            response = self._read(self._disk_path("responses", key, "json"), json.load)
+            if response is not None:
+                self.responses.put(key, response)
+        self._count("response_hits" if response is not None else "response_misses")
+        return response
+
+    def put_response(self, key: str, response: Dict) -> None:
+        self.responses.put(key, response)
+        if self.directory:
+            self._write(self._disk_path("responses", key, "json"),
+                        lambda f: f.write(json.dumps(response).encode()))
+
+    def get_plot_spec(self, plot_id: str) -> Optional[Dict]:
+        spec = self.plot_specs.get(plot_id)
+        if spec is None and self.directory:
+            spec = self._read(self._disk_path("plots", plot_id, "json"), json.load)
+            if spec is not None:
+                self.plot_specs.put(plot_id, spec)
+        return spec
+
+    def put_plot_spec(self, plot_id: str, spec: Dict) -> None:
+        self.plot_specs.put(plot_id, spec)
+        if self.directory:
+            self._write(self._disk_path("plots", plot_id, "json"),
+                        lambda f: f.write(json.dumps(spec).encode()))
+
+    def get_plot(self, plot_id: str, fmt: str) -> Optional[bytes]:
+        key = f"{plot_id}.{fmt}"
+        image = self.plots.get(key)
+        if image is None and self.directory:
+            image = self._read(self._disk_path("plots", plot_id, fmt), lambda f: f.read())
+            if image is not None:
+                self.plots.put(key, image)
+        self._count("plot_hits" if image is not None else "plot_misses")
+        return image
+
+    def put_plot(self, plot_id: str, fmt: str, image: bytes) -> None:
+        self.plots.put(f"{plot_id}.{fmt}", image)
+        if self.directory:
+            self._write(self._disk_path("plots", plot_id, fmt), lambda f: f.write(image))
+
+    def info(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+        return {
+            **stats,
+            "parsed_entries": len(self.parsed),
+            "parsed_bytes": self.parsed.size,
+            "response_entries": len(self.responses),
+            "plot_entries": len(self.plots),
+            "plot_bytes": self.plots.size,
+            "disk": self.directory is not None,
+        }
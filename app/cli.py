@@ -0,0 +1,231 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from .analysis import _check_params, analyze_path, parse_tests, run_instrumented
+from .benford import P_VALUE_MODES
+from .parsing import EXTENSIONS, InputError
+from .pdf_pages import document_hash
+
+TASKS_PER_WORKER = 4  # files queued per worker, so results stream while the walk goes on
+
+_done: Set[str] = set()
+
+def iter_paths(targets: Iterable[str]) -> Iterator[str]:
+    """Files named directly, found under directories or matched by globs.
+
+    Directories and globs only contribute files with a supported extension;
+    files named directly are always analyzed (and fail if unsupported or
+    missing). Globs that match nothing are reported on stderr.
+    """
+    for target in targets:
+        if os.path.isdir(target):
+            for root, dirs, files in os.walk(target):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(EXTENSIONS):
+                        yield os.path.join(root, name)
+        elif os.path.exists(target) or not glob.has_magic(target):
+            yield target
+        else:
+            matched = False
+            for path in sorted(glob.glob(target, recursive=True)):
+                if os.path.isfile(path) and path.lower().endswith(EXTENSIONS):
+                    matched = True
+                    yield path
+            if not matched:
+                print(f"No supported files match {target}", file=sys.stderr)
+
+def resume_output(output: str) -> Set[str]:
+    """Hashes of files with a result (or a deterministic error) in a previous output.
+
+    A last line left half-written by an interrupted run is cut off, so
+    appended records start on a line of their own. Other lines that are not
+    a JSON record are skipped, and their files analyzed again.
+    """
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, 'r+b') as f:
+        complete = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            complete += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:  # includes JSONDecodeError and UnicodeDecodeError
+                continue
+            if not isinstance(record, dict):
+                continue
+            if record.get("sha256") and record.get("status") != 500:
+                done.add(record["sha256"])
+        f.truncate(complete)
+    return done
+
+def _init_worker(done: Set[str]) -> None:
+    global _done
+    _done = done
+    # Files are already spread over the workers; don't fan each PDF out again
+    os.environ.setdefault("BENFORD_PDF_WORKERS", "1")
+
+def analyze_file(path: str, params: Dict, timings: bool = False) -> Optional[Dict]:
+    """One output record, or None when the file's hash already has one"""
+    try:
+        digest = document_hash(path)
+    except OSError as e:
+        # Unreadable files (missing, broken symlinks, permissions) fail alone, not the batch
+        return {"path": path, "sha256": None, "status": 400, "error": f"Cannot read file: {e}"}
+    if digest in _done:
+        return None
+    record = {"path": path, "sha256": digest}
+    try:
+        result, report = run_instrumented(analyze_path, path, os.path.basename(path).lower(), **params)
+    except InputError as e:
+        return {**record, "status": 400, "error": str(e)}
+    except ValueError as e:
+        return {**record, "status": 422, "error": str(e)}
+    except Exception as e:
+        return {**record, "status": 500, "error": f"Analysis failed: {str(e)}"}
+    record.update(status=200, result=result)
+    if timings:
+        record["timings"] = report["timings"]
+    return record
+
+def run(paths: Iterable[str], params: Dict, workers: int, done: Set[str] = frozenset(),
+        timings: bool = False) -> Iterator[Dict]:
+    """Analyze files across `workers` processes and yield records as they finish.
+
+    workers=0 analyzes in this process. Skipped files yield nothing.
+    """
+    if workers == 0:
+        _init_worker(set(done))
+        for path in paths:
+            record = analyze_file(path, params, timings)
+            if record is not None:
+                yield record
+        return
+
+    def new_pool() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(set(done),))
+
+    pool = new_pool()
+    try:
+        pending: Dict[Future, str] = {}
+        paths = iter(paths)
+        while True:
+            for path in paths:
+                try:
+                    future = pool.submit(analyze_file, path, params, timings)
+                except BrokenProcessPool:
+                    # A worker died (killed, out of memory); go on with a fresh pool
+                    pool.shutdown(wait=False)
+                    pool = new_pool()
+                    future = pool.submit(analyze_file, path, params, timings)
+                pending[future] = path
+                if len(pending) >= workers * TASKS_PER_WORKER:
+                    break
+            if not pending:
+                return
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path = pending.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:
+                    # Everything in flight when a worker dies fails with it; --resume retries them
+                    record = {"path": path, "sha256": None, "status": 500, "error": f"Analysis failed: {e}"}
+                if record is not None:
+                    yield record
+    finally:
+        pool.shutdown()
+
+def _names(value: str) -> List[str]:
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m app",
+        description="Analyze files offline with the /analyze pipeline, one JSON result per line.")
+    parser.add_argument("targets", nargs="+", help="files, directories (walked recursively) or globs")
+    parser.add_argument("-o", "--output", help="JSONL file to write (default: stdout)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes; 0 analyzes in this process (default: CPU count)")
+    parser.add_argument("--resume", action="store_true",
+                        help="append to --output, skipping files whose hash already has a result")
+    parser.add_argument("--timings", action="store_true", help="add per-stage timings to each record")
+
+    analysis = parser.add_argument_group("analysis options (as for /analyze)")
+    analysis.add_argument("--significance-level", type=float, default=0.05)
+    analysis.add_argument("--max-depth", type=int, default=3)
+    analysis.add_argument("--window-size", type=int, default=0)
+    analysis.add_argument("--window-stride", type=int)
+    analysis.add_argument("--top-k", type=int, default=5)
+    analysis.add_argument("--tests", default="", help="comma-separated tests, or all")
+    analysis.add_argument("--columns", type=_names, default=[])
+    analysis.add_argument("--group-by", type=_names, default=[])
+    analysis.add_argument("--p-value", choices=P_VALUE_MODES, default="asymptotic")
+    analysis.add_argument("--sample-size", type=int, default=0)
+    analysis.add_argument("--early-stop", action="store_true")
+    analysis.add_argument("--duplicates", action="store_true")
+    analysis.add_argument("--round-numbers", action="store_true")
+    analysis.add_argument("--thresholds", type=lambda value: [float(v) for v in _names(value)],
+                          default=[])
+    analysis.add_argument("--plot", action="store_true", help="embed a base64 PNG in each result")
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.resume and not args.output:
+        parser.error("--resume needs --output")
+    if args.workers < 0:
+        parser.error("--workers must be 0 or more")
+    params = {
+        "significance_level": args.significance_level,
+        "max_depth": args.max_depth,
+        "window_size": args.window_size,
+        "window_stride": args.window_stride,
+        "top_k": args.top_k,
+        "plot": "inline" if args.plot else "none",
+        "columns": args.columns,
+        "group_by": args.group_by,
+        "p_value": args.p_value,
+        "sample_size": args.sample_size,
+        "early_stop": args.early_stop,
+        "duplicates": args.duplicates,
+        "round_numbers": args.round_numbers,
+        "thresholds": args.thresholds,
+    }
+    try:
+        params["tests"] = parse_tests(args.tests)
+        _check_params(args.significance_level, params["plot"], params["tests"], args.p_value,
+                      args.sample_size, args.early_stop, args.group_by, args.thresholds,
+                      args.window_size, args.window_stride)
+    except ValueError as e:
+        parser.error(str(e))
+
+    done = resume_output(args.output) if args.resume else set()
+    out = open(args.output, 'a' if args.resume else 'w') if args.output else sys.stdout
+    start = time.perf_counter()
+    counts = {"analyzed": 0, "failed": 0}
+    try:
+        for record in run(iter_paths(args.targets), params, args.workers, done, args.timings):
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            counts["analyzed" if record["status"] == 200 else "failed"] += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        kept = f" ({len(done)} results kept from the previous run)" if done else ""
+        print(f"{counts['analyzed']} analyzed, {counts['failed']} failed in "
+              f"{time.perf_counter() - start:.1f}s{kept}", file=sys.stderr)
+    return 1 if counts["failed"] and not counts["analyzed"] else 0
@@ -0,0 +1,159 @@
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from .benford import DigitPrefixIndex, benford_test_counts, homogeneity_test
+from .jobs import _read_json, _write_json
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are then serialized per process only
+    fcntl = None
+
+DATASET_NAME = re.compile(r'[A-Za-z0-9][A-Za-z0-9_.-]{0,127}')
+PREFIX_BLOCK = 64  # codes per stored DigitPrefixIndex checkpoint
+
+class DatasetStore:
+    """Named, append-only digit state for monitoring a growing ledger.
+
+    Every dataset directory holds the sufficient statistics of all numbers
+    appended so far:
+      codes.i8      first-digit code of every number, in append order
+      prefix.i64    DigitPrefixIndex checkpoints, 9 counts per 64 codes
+      dataset.json  digit counts, number count and the index range of each batch
+    An append writes only the batch's codes and checkpoints, so it costs
+    O(batch) however long the history is. dataset.json is written last and
+    is authoritative; bytes past its count, left by an interrupted append,
+    are cut off by the next one.
+
+      BENFORD_DATASETS_DIR  state directory (default: $TMPDIR/benford-datasets)
+    """
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.environ.get(
+            "BENFORD_DATASETS_DIR", os.path.join(tempfile.gettempdir(), "benford-datasets"))
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def dataset_dir(self, name: str) -> str:
+        if not DATASET_NAME.fullmatch(name):
+            raise KeyError(name)
+        return os.path.join(self.directory, name)
+
+    def names(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory)
+                      if DATASET_NAME.fullmatch(name) and self.get(name) is not None)
+
+    def get(self, name: str) -> Optional[Dict]:
+        if not DATASET_NAME.fullmatch(name):
+            return None
+        return _read_json(os.path.join(self.dataset_dir(name), "dataset.json"))
+
+    def delete(self, name: str) -> None:
+        with self._lock(name):
+            shutil.rmtree(self.dataset_dir(name), ignore_errors=True)
+
+    @contextmanager
+    def _lock(self, name: str) -> Iterator[None]:
+        """Serialize writers to one dataset, across threads and (with fcntl) processes"""
+        with self._guard:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            os.makedirs(self.dataset_dir(name), exist_ok=True)
+            with open(os.path.join(self.dataset_dir(name), ".lock"), 'w') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                yield
+
+    def index(self, name: str, state: Dict) -> DigitPrefixIndex:
+        """Prefix index over the stored codes, memory-mapped rather than rebuilt"""
+        count = state["count"]
+        dataset_dir = self.dataset_dir(name)
+        if count == 0:
+            return DigitPrefixIndex(np.empty(0, dtype=np.int8), PREFIX_BLOCK)
+        codes = np.memmap(os.path.join(dataset_dir, "codes.i8"), dtype=np.int8,
+                          mode='r', shape=(count,))
+        rows = count // PREFIX_BLOCK + 1
+        prefix = np.memmap(os.path.join(dataset_dir, "prefix.i64"), dtype=np.int64,
+                           mode='r', shape=(rows, 9))
+        return DigitPrefixIndex.from_prefix(codes, prefix, PREFIX_BLOCK)
+
+    def append(self, name: str, codes: np.ndarray, alpha: float = 0.05,
+               p_value: str = "asymptotic") -> Dict:
+        """Add a batch of first-digit codes; creates the dataset on first use.
+
+        Returns benford_test_counts of the whole history and, for the batch
+        (as a start_index/end_index region like bisection_analysis reports),
+        its own test and a homogeneity test against the history before it.
+        """
+        codes = np.asarray(codes, dtype=np.int8)
+        with self._lock(name):
+            dataset_dir = self.dataset_dir(name)
+            now = time.time()
+            state = self.get(name) or {"name": name, "count": 0, "counts": [0] * 10,
+                                       "batches": [], "created": now}
+            start = state["count"]
+            self._append_codes(dataset_dir, start, codes)
+
+            history = np.asarray(state["counts"], dtype=np.int64)
+            batch = np.bincount(codes[codes >= 0], minlength=10)
+            state["counts"] = (history + batch).tolist()
+            state["count"] = start + len(codes)
+            region = {"start_index": start, "end_index": state["count"] - 1,
+                      "count": int(len(codes)), "appended": now}
+            state["batches"].append(region)
+            state["updated"] = now
+            _write_json(os.path.join(dataset_dir, "dataset.json"), state)
+
+        return {
+            "dataset": name,
+            "count": state["count"],
+            "result": benford_test_counts(state["counts"][1:], 1, alpha, p_value),
+            "batch": {
+                **region,
+                "result": benford_test_counts(batch[1:], 1, alpha, p_value),
+                "vs_history": homogeneity_test(batch[1:], history[1:], alpha) if start else None,
+            },
+        }
+
+    @staticmethod
+    def _append_codes(dataset_dir: str, start: int, codes: np.ndarray) -> None:
+        """Write the batch's codes and the checkpoints of the blocks it completes"""
+        codes_path = os.path.join(dataset_dir, "codes.i8")
+        prefix_path = os.path.join(dataset_dir, "prefix.i64")
+        row_bytes = 9 * 8
+        rows = start // PREFIX_BLOCK + 1
+        for path in (codes_path, prefix_path):
+            if not os.path.exists(path):
+                open(path, 'wb').close()
+        with open(codes_path, 'r+b') as f_codes, open(prefix_path, 'r+b') as f_prefix:
+            # Drop whatever an interrupted append left past the committed state
+            f_codes.truncate(start)
+            f_prefix.truncate(rows * row_bytes)
+            if start == 0:
+                f_prefix.seek(0)
+                f_prefix.write(np.zeros(9, dtype=np.int64).tobytes())
+
+            f_prefix.seek((rows - 1) * row_bytes)
+            last = np.frombuffer(f_prefix.read(row_bytes), dtype=np.int64)
+            block_start = (rows - 1) * PREFIX_BLOCK
+            f_codes.seek(block_start)
+            pending = np.concatenate([np.frombuffer(f_codes.read(start - block_start), dtype=np.int8),
+                                      codes])
+
+            f_codes.seek(start)
+            f_codes.write(codes.tobytes())
+            full = len(pending) // PREFIX_BLOCK
+            if full:
+                blocks = pending[:full * PREFIX_BLOCK].reshape(full, PREFIX_BLOCK)
+                counts = np.stack([(blocks == d).sum(axis=1) for d in range(1, 10)], axis=1)
+                f_prefix.seek(rows * row_bytes)
+                f_prefix.write((last + np.cumsum(counts, axis=0)).astype(np.int64).tobytes())
@@ -0,0 +1,123 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from .warmup import parse_features, warm_up
+
+class PoolSaturated(Exception):
+    """Raised when every worker is busy and the queue is full"""
+    def __init__(self, retry_after: int):
+        super().__init__("Analysis queue is full")
+        self.retry_after = retry_after
+
+class WorkerDied(PoolSaturated):
+    """Raised when a worker exited mid-job (crash, OOM kill); the pool is respawned"""
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after)
+        self.args = ("Analysis worker died",)
+
+def _started() -> None:
+    pass
+
+def _init_worker(features: List[str], pdf_workers: int) -> None:
+    # Requests are already spread over the workers; each one's PDF page pool
+    # gets its share of the CPUs rather than all of them
+    os.environ.setdefault("BENFORD_PDF_WORKERS", str(pdf_workers))
+    warm_up(features)
+
+class AnalysisExecutor:
+    """Bounded process pool for CPU-bound analysis jobs.
+
+    Configured from the environment unless given explicitly:
+      BENFORD_WORKERS      worker processes (0 runs jobs in a thread, default: CPU count)
+      BENFORD_MAX_QUEUE    jobs allowed to wait for a worker (default: 2 * workers)
+      BENFORD_JOB_TIMEOUT  seconds before a request gives up on its job (default: 120)
+      BENFORD_RETRY_AFTER  Retry-After hint when saturated (default: 5)
+      BENFORD_WARMUP       features every worker imports when it starts (default: none)
+    """
+    def __init__(self, workers: Optional[int] = None, max_queue: Optional[int] = None,
+                 timeout: Optional[float] = None, retry_after: Optional[int] = None,
+                 warmup: Optional[List[str]] = None):
+        env = os.environ.get
+        self.workers = workers if workers is not None else int(env("BENFORD_WORKERS", os.cpu_count() or 1))
+        self.max_queue = max_queue if max_queue is not None else int(env("BENFORD_MAX_QUEUE", 2 * max(self.workers, 1)))
+        self.timeout = timeout if timeout is not None else float(env("BENFORD_JOB_TIMEOUT", 120))
+        self.retry_after = retry_after if retry_after is not None else int(env("BENFORD_RETRY_AFTER", 5))
+        self.warmup = warmup if warmup is not None else parse_features(env("BENFORD_WARMUP"))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+    @property
+    def saturated(self) -> bool:
+        return self._pending >= max(self.workers, 1) + self.max_queue
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a threaded server process can deadlock the child
+            self._pool = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.warmup, max((os.cpu_count() or 1) // self.workers, 1)))
+        return self._pool
+
+    def start(self) -> None:
+        """Spawn every worker now rather than on the first jobs, warming each one up"""
+        if self.workers == 0:
+            return
+        pool = self._get_pool()
+        # Workers are spawned on demand; one no-op per worker brings them all up
+        for _ in range(self.workers):
+            pool.submit(_started)
+
+    def _release(self) -> None:
+        self._pending -= 1
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run fn in the pool, raising PoolSaturated or asyncio.TimeoutError"""
+        return await self.run_call(functools.partial(fn, *args, **kwargs), self.timeout)
+
+    async def run_call(self, call: Callable, timeout: Optional[float]):
+        """Run a picklable zero-argument call with an explicit timeout (None: no limit)"""
+        if self.saturated:
+            raise PoolSaturated(self.retry_after)
+
+        if self.workers == 0:
+            self._pending += 1
+            try:
+                return await asyncio.wait_for(run_in_threadpool(call), timeout)
+            finally:
+                self._release()
+
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        try:
+            future = pool.submit(call)
+        except BrokenProcessPool:
+            self._discard(pool)
+            raise WorkerDied(self.retry_after)
+        self._pending += 1
+        # A timed-out job that already started keeps its worker busy, so the
+        # slot is only released once the process is actually done with it
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except BrokenProcessPool:
+            # One dead worker fails every job in the pool; the next call respawns it
+            self._discard(pool)
+            raise WorkerDied(self.retry_after)
+
+    def _discard(self, pool: ProcessPoolExecutor) -> None:
+        if self._pool is pool:
+            self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
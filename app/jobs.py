@@ -0,0 +1,279 @@
+import asyncio
+import json
+import os
+import re
+import shutil
+import socket
+import tempfile
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+# runner(upload_path, job_state, progress_path) -> response
+JobRunner = Callable[[str, Dict, str], Awaitable[Dict]]
+
+FINISHED = ("done", "failed")
+JOB_ID = re.compile(r'[0-9a-f]{32}')
+
+def _write_json(path: str, data: Dict) -> None:
+    # Write then rename so readers in other processes never see half a file;
+    # mkstemp keeps threads of one process off each other's temp file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+class FileProgress:
+    """Progress callback that a worker process writes to the job directory.
+
+    Writes are throttled to one per `interval` seconds, except on a stage change.
+    """
+    def __init__(self, path: str, interval: float = 0.5):
+        self.path = path
+        self.interval = interval
+        self._stage = None
+        self._last = 0.0
+
+    def __call__(self, stage: str, done: int = 0, total: int = 0, unit: str = "") -> None:
+        now = time.time()
+        if stage == self._stage and now - self._last < self.interval:
+            return
+        self._stage, self._last = stage, now
+        _write_json(self.path, {"stage": stage, "done": done, "total": total, "unit": unit})
+
+class JobManager:
+    """Queued /analyze jobs with state persisted on disk.
+
+    Every job owns a directory holding its upload, job.json (status), the
+    progress.json its worker writes, and result.json once finished. Jobs that
+    were queued or running when the process stopped are requeued on start().
+    The upload is deleted as soon as a job finishes; the rest of a finished
+    job's directory goes once it is older than the TTL.
+
+    Several server processes can share the directory. Each unfinished job
+    records its owner and a lease the owner keeps renewing; another process
+    only takes a job over once its lease has run out, and a claim file per
+    takeover makes sure just one process does.
+
+      BENFORD_JOBS_DIR         state directory (default: $TMPDIR/benford-jobs)
+      BENFORD_JOB_CONCURRENCY  jobs analyzed at once (default: 2)
+      BENFORD_JOB_TTL          seconds a finished job's result is kept, 0 for ever (default: 86400)
+      BENFORD_JOB_LEASE        seconds an owner's claim on its unfinished jobs lasts without
+                               renewal (default: 60)
+    """
+    def __init__(self, runner: JobRunner, directory: Optional[str] = None,
+                 concurrency: Optional[int] = None, ttl: Optional[float] = None,
+                 lease: Optional[float] = None):
+        env = os.environ.get
+        self.runner = runner
+        self.directory = directory or env("BENFORD_JOBS_DIR",
+                                          os.path.join(tempfile.gettempdir(), "benford-jobs"))
+        self.concurrency = concurrency if concurrency is not None else int(env("BENFORD_JOB_CONCURRENCY", 2))
+        self.ttl = ttl if ttl is not None else float(env("BENFORD_JOB_TTL", 86400))
+        self.lease = lease if lease is not None else float(env("BENFORD_JOB_LEASE", 60))
+        # Pids repeat across restarts (pid 1 in a container), so add a random part
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._owned: Set[str] = set()
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._consumers: List[asyncio.Task] = []
+
+    def job_dir(self, job_id: str) -> str:
+        if not JOB_ID.fullmatch(job_id):
+            raise KeyError(job_id)
+        return os.path.join(self.directory, job_id)
+
+    def upload_path(self, job_id: str, filename: str) -> str:
+        return os.path.join(self.job_dir(job_id), "upload" + os.path.splitext(filename)[1])
+
+    def new_job_id(self) -> str:
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.job_dir(job_id))
+        return job_id
+
+    async def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self.sweep()
+        # A queue binds to the loop that first waits on it, and a restart can bring a new loop;
+        # stop() released this process's jobs, so adopt() finds them again
+        self._queue = asyncio.Queue()
+        self._enqueue(self.adopt())
+        self._consumers = [asyncio.create_task(self._consume())
+                           for _ in range(max(self.concurrency, 1))]
+        self._consumers.append(asyncio.create_task(self._heartbeat()))
+        if self.ttl > 0:
+            self._consumers.append(asyncio.create_task(self._expire()))
+
+    async def stop(self) -> None:
+        for task in self._consumers:
+            task.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        self._consumers = []
+        # Hand unfinished jobs over now rather than when their leases run out
+        for job_id in list(self._owned):
+            if self._owns(job_id):
+                self._update(job_id, lease=0)
+        self._owned.clear()
+
+    def submit(self, job_id: str, filename: str, digest: str, params: Dict) -> Dict:
+        """Register a job whose upload is already at upload_path()"""
+        now = time.time()
+        state = {"job_id": job_id, "filename": filename, "sha256": digest, "params": params,
+                 "status": "queued", "error": None, "created": now, "updated": now,
+                 "owner": self.owner, "claim": 0, "lease": now + self.lease}
+        _write_json(os.path.join(self.job_dir(job_id), "job.json"), state)
+        self._enqueue([job_id])
+        return state
+
+    def _enqueue(self, job_ids: List[str]) -> None:
+        for job_id in job_ids:
+            self._owned.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    def _owns(self, job_id: str) -> bool:
+        state = _read_json(os.path.join(self.job_dir(job_id), "job.json"))
+        return state is not None and state.get("owner") == self.owner
+
+    def adopt(self) -> List[str]:
+        """Claim the unfinished jobs whose owner's lease ran out (it stopped or crashed)"""
+        adopted = []
+        now = time.time()
+        for job_id in sorted(os.listdir(self.directory)):
+            if not JOB_ID.fullmatch(job_id):
+                continue
+            state = _read_json(os.path.join(self.directory, job_id, "job.json"))
+            if state is None or state["status"] in FINISHED or state.get("lease", 0) > now:
+                continue
+            # Only the process that creates claim-<n> takes the job over
+            claim = state.get("claim", 0) + 1
+            try:
+                os.close(os.open(os.path.join(self.directory, job_id, f"claim-{claim}"),
+                                 os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except (FileExistsError, FileNotFoundError):
+                continue
+            self._update(job_id, status="queued", owner=self.owner, claim=claim,
+                         lease=time.time() + self.lease)
+            adopted.append(job_id)
+        return adopted
+
+    async def _heartbeat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            now = time.time()
+            for job_id in list(self._owned):
+                if self._owns(job_id):
+                    self._update(job_id, lease=now + self.lease)
+                else:
+                    self._owned.discard(job_id)  # taken over while this process stalled
+            self._enqueue(await loop.run_in_executor(None, self.adopt))
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Job state merged with the latest progress from its worker"""
+        if not JOB_ID.fullmatch(job_id):
+            return None
+        job_dir = self.job_dir(job_id)
+        state = _read_json(os.path.join(job_dir, "job.json"))
+        if state is None:
+            return None
+        state["progress"] = _read_json(os.path.join(job_dir, "progress.json"))
+        return state
+
+    def result(self, job_id: str) -> Optional[Dict]:
+        if not JOB_ID.fullmatch(job_id):
+            return None
+        return _read_json(os.path.join(self.job_dir(job_id), "result.json"))
+
+    def _update(self, job_id: str, **changes) -> None:
+        path = os.path.join(self.job_dir(job_id), "job.json")
+        state = _read_json(path)
+        if state is None:
+            return  # deleted meanwhile
+        state.update(changes, updated=time.time())
+        _write_json(path, state)
+
+    def sweep(self) -> None:
+        """Delete finished jobs older than the TTL, and directories of jobs never submitted"""
+        now = time.time()
+        for job_id in os.listdir(self.directory):
+            if not JOB_ID.fullmatch(job_id):
+                continue
+            state = _read_json(os.path.join(self.directory, job_id, "job.json"))
+            if state is None:
+                # A submit that failed while spooling; give one in flight time to finish
+                try:
+                    stale = now - os.path.getmtime(os.path.join(self.directory, job_id)) > 3600
+                except FileNotFoundError:
+                    continue
+            else:
+                stale = (self.ttl > 0 and state["status"] in FINISHED
+                         and now - state["updated"] > self.ttl)
+            if stale:
+                self.delete(job_id)
+
+    async def _expire(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(min(self.ttl, 3600))
+            await loop.run_in_executor(None, self.sweep)
+
+    async def _consume(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        state = self.get(job_id)
+        if state is None or not self._owns(job_id):
+            self._owned.discard(job_id)
+            return
+        job_dir = self.job_dir(job_id)
+        self._update(job_id, status="running")
+        try:
+            response = await self.runner(self.upload_path(job_id, state["filename"]), state,
+                                         os.path.join(job_dir, "progress.json"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self._finish(job_id):
+                status_code = getattr(e, "status_code", 500)
+                detail = getattr(e, "detail", str(e))
+                self._update(job_id, status="failed",
+                             error={"status_code": status_code, "detail": detail})
+                self._remove_upload(job_id, state["filename"])
+            return
+        if not self._finish(job_id):
+            return
+        _write_json(os.path.join(job_dir, "result.json"), response)
+        _write_json(os.path.join(job_dir, "progress.json"),
+                    {"stage": "done", "done": 0, "total": 0, "unit": ""})
+        self._update(job_id, status="done")
+        self._remove_upload(job_id, state["filename"])
+
+    def _finish(self, job_id: str) -> bool:
+        """Stop renewing the job's lease; False if another process took it over meanwhile"""
+        self._owned.discard(job_id)
+        return self._owns(job_id)
+
+    def _remove_upload(self, job_id: str, filename: str) -> None:
+        # A finished job is never rerun, so only its result is worth keeping
+        try:
+            os.unlink(self.upload_path(job_id, filename))
+        except FileNotFoundError:
+            pass
+
+    def delete(self, job_id: str) -> None:
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
@@ -1,93 +1,448 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
-import pandas as pd
-import pdfplumber
-from typing import List
-from io import BytesIO
-from .benford import *
-
-app = FastAPI()
-
-async def parse_file(file: UploadFile) -> List[float]:
-    """Parse files with improved error handling"""
-    content = await file.read()
-    
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, UploadFile, File, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List, Optional, Tuple
+from .analysis import (_check_params, analyze_digits, parse_and_analyze, parse_tests,
+                       run_instrumented)
+from .benford import P_VALUE_MODES, benford_test_counts, bisection_analysis, get_null_tables
+from .cache import ResultCache
+from .datasets import DatasetStore
+from .executor import AnalysisExecutor, PoolSaturated
+from .jobs import FINISHED, FileProgress, JobManager
+from . import metrics
+from .parsing import EXTENSIONS, InputError, parse_path
+from .plots import MEDIA_TYPES, PLOT_MODES, plot_spec, render_plot, spec_from_counts
+from .uploads import UploadLimits
+from .warmup import warm_up
+
+executor = AnalysisExecutor()
+cache = ResultCache.from_env()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await jobs.start()
+    # First-digit null tables for p_value=auto; workers read them from disk
+    threading.Thread(target=get_null_tables().precompute, daemon=True).start()
+    if executor.warmup:
+        # Dataset tests, and every job when BENFORD_WORKERS=0, run in this process
+        threading.Thread(target=warm_up, args=(executor.warmup,), daemon=True).start()
+        executor.start()
+    yield
+    await jobs.stop()
+    executor.shutdown()
+
+def _busy(scope) -> Optional[int]:
+    # The form is parsed and spooled before the endpoint runs, so a full pool
+    # has to turn /analyze uploads away here, before their body is read
+    if scope["path"] == "/analyze" and executor.saturated:
+        return executor.retry_after
+    return None
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(UploadLimits, busy=_busy)
+
+def _spool_to_disk(file: UploadFile, path: Optional[str] = None,
+                   block_size: int = 1024**2) -> Tuple[str, str]:
+    """Copy the upload to a named file a worker process can open.
+
+    Writes to `path`, or a new temp file, and returns the path and the
+    SHA-256 of the content, computed on the way. Blocks go through one
+    reused buffer, so memory stays at block_size whatever the upload size.
+    """
+    suffix = os.path.splitext(file.filename or "")[1]
+    digest = hashlib.sha256()
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    with (open(path, 'wb') if path else
+          tempfile.NamedTemporaryFile(suffix=suffix, delete=False)) as out:
+        file.file.seek(0)
+        while n := file.file.readinto(buffer):
+            digest.update(view[:n])
+            out.write(view[:n])
+    return out.name, digest.hexdigest()
+
+def _name_list(names: Optional[str]) -> List[str]:
+    return [name.strip() for name in (names or "").split(",") if name.strip()]
+
+def analysis_params(
+    significance_level: float = 0.05,
+    max_depth: int = 3,
+    window_size: int = 0,
+    window_stride: Optional[int] = None,
+    top_k: int = 5,
+    plot: str = "png",
+    tests: Optional[str] = None,
+    columns: Optional[str] = None,
+    group_by: Optional[str] = None,
+    p_value: str = "asymptotic",
+    sample_size: int = 0,
+    early_stop: bool = False,
+    duplicates: bool = False,
+    round_numbers: bool = False,
+    thresholds: Optional[str] = None
+) -> Dict:
+    """Query parameters shared by /analyze and /jobs"""
+    if not (0 < significance_level < 1):
+        raise HTTPException(422, "Significance level must be between 0 and 1")
+    if plot not in PLOT_MODES:
+        raise HTTPException(422, f"plot must be one of {', '.join(PLOT_MODES)}")
+    if p_value not in P_VALUE_MODES:
+        raise HTTPException(422, f"p_value must be one of {', '.join(P_VALUE_MODES)}")
+    if sample_size < 0:
+        raise HTTPException(422, "sample_size must be positive (0 reads every number)")
+    if sample_size and early_stop:
+        raise HTTPException(422, "Choose either sample_size or early_stop")
+    if (sample_size or early_stop) and group_by:
+        raise HTTPException(422, "sample_size and early_stop cannot be combined with group_by")
+    try:
+        test_names = parse_tests(tests)
+    except ValueError as e:
+        raise HTTPException(422, str(e))
     try:
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(content))
-            # Focus on columns with "amount", "value", "total" in name
-            data_cols = [col for col in df.columns 
-                        if re.search(r'amount|value|total', col, re.IGNORECASE)]
-            df = df[data_cols].select_dtypes(include='number')
-        elif file.filename.endswith(('.xls', '.xlsx')):
-            df = pd.read_excel(BytesIO(content))
-            data_cols = [col for col in df.columns 
-                        if re.search(r'amount|value|total', col, re.IGNORECASE)]
-            df = df[data_cols].select_dtypes(include='number')
-        elif file.filename.endswith('.pdf'):
-            with pdfplumber.open(BytesIO(content)) as pdf:
-                text = []
-                for page in pdf.pages:
-                    # Exclude header (top 10% of page) and footer (bottom 10%)
-                    header_cutoff = page.height * 0.10
-                    footer_cutoff = page.height * 0.90
-                    cropped = page.crop((0, header_cutoff, page.width, footer_cutoff))
-                    text.append(cropped.extract_text())
-                text = "\n".join(text)
-                return extract_numbers(text)
-        elif file.filename.endswith('.txt'):
-            text = content.decode('utf-8')
-            return extract_numbers(text)
-        else:
-            raise ValueError("Unsupported file type")
-            
-        return df.stack().dropna().astype(float).tolist()
+        limits = [float(limit) for limit in _name_list(thresholds)]
+    except ValueError:
+        raise HTTPException(422, "thresholds must be comma-separated amounts")
+    if limits and min(limits) <= 0:
+        raise HTTPException(422, "thresholds must be positive amounts")
+    try:
+        _check_params(significance_level, plot, test_names, p_value, sample_size, early_stop,
+                      _name_list(group_by), limits, window_size, window_stride)
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+    return {
+        "significance_level": significance_level,
+        "max_depth": max_depth,
+        "window_size": window_size,
+        "window_stride": window_stride,
+        "top_k": top_k,
+        "plot": plot,
+        "tests": test_names,
+        "columns": _name_list(columns),
+        "group_by": _name_list(group_by),
+        "p_value": p_value,
+        "sample_size": sample_size,
+        "early_stop": early_stop,
+        "duplicates": duplicates,
+        "round_numbers": round_numbers,
+        "thresholds": limits,
+    }
+
+async def _analyze(path: str, filename: str, digest: str, params: Dict,
+                   use_cache: bool = True, progress: Optional[FileProgress] = None,
+                   timeout: Optional[float] = None, report: Optional[Dict] = None) -> Dict:
+    """Shared /analyze and /jobs pipeline; raises HTTPException on failure.
     
+    timeout=None lets the job run to completion. `report`, if given, is filled
+    with the worker's stage timings (ms) and how the cache answered.
+    """
+    report = report if report is not None else {}
+    report.setdefault("timings", {})
+    # Metric label: the filename is the client's, so anything unsupported is "other"
+    extension = os.path.splitext(filename)[1].lower()
+    file_type = extension.lstrip('.') if extension in EXTENSIONS else "other"
+    start = time.perf_counter()
+    status = 500
+    
+    async def _call(fn, *args, **kwargs):
+        result, worker = await executor.run_call(
+            functools.partial(run_instrumented, fn, *args, **kwargs, **params), timeout)
+        report["timings"].update(worker["timings"])
+        if worker["chi2_warnings"]:
+            metrics.CHI2_WARNINGS.inc(amount=worker["chi2_warnings"])
+        return result
+    
+    def _lookup(tier: str, value):
+        metrics.CACHE_LOOKUPS.inc(tier, "hit" if value is not None else "miss")
+        return value
+    
+    async def _keep_plot(response: Dict, acc) -> None:
+        # Remember what /plots needs to draw the plot this response points to
+        if "plot_id" in response:
+            await run_in_threadpool(cache.put_plot_spec, response["plot_id"], plot_spec(acc))
+    
+    try:
+        metrics.INPUT_BYTES.observe(os.path.getsize(path), file_type)
+        if not use_cache:
+            report["cache"] = "bypass"
+            response, acc = await _call(parse_and_analyze, path, filename, progress=progress)
+            metrics.NUMBERS_EXTRACTED.observe(acc.count, file_type)
+            await _keep_plot(response, acc)
+            status = 200
+            return response
+        
+        upload_key = ResultCache.upload_key(digest, filename)
+        parsed_key = ResultCache.parsed_key(upload_key, params)
+        response_key = ResultCache.params_key(upload_key, params)
+        # Every cache call may read or write the disk tier, so none runs on the event loop
+        response = _lookup("response", await run_in_threadpool(cache.get_response, response_key))
+        report["cache"] = "hit"
+        if response is None:
+            acc = _lookup("parsed", await run_in_threadpool(cache.get_parsed, parsed_key))
+            if acc is not None and not acc.supports(params.get("tests", ())):
+                acc = None  # parsed without the values the second-order test needs
+            if acc is not None:
+                report["cache"] = "parsed"
+                response = await _call(analyze_digits, acc, progress=progress)
+            else:
+                report["cache"] = "miss"
+                response, acc = await _call(parse_and_analyze, path, filename, progress=progress)
+                metrics.NUMBERS_EXTRACTED.observe(acc.count, file_type)
+                await run_in_threadpool(cache.put_parsed, parsed_key, acc)
+            await _keep_plot(response, acc)
+            await run_in_threadpool(cache.put_response, response_key, response)
+        status = 200
+        return response
+        
+    except PoolSaturated as e:
+        status = 503
+        raise HTTPException(503, "Server busy, retry later",
+                            headers={"Retry-After": str(e.retry_after)})
+    except asyncio.TimeoutError:
+        status = 504
+        raise HTTPException(504, "Analysis timed out")
+    except InputError as e:
+        status = 400
+        raise HTTPException(400, str(e))
+    except ValueError as e:
+        status = 422
+        raise HTTPException(422, str(e))
     except Exception as e:
-        raise HTTPException(400, f"Parsing error: {str(e)}")
+        raise HTTPException(500, f"Analysis failed: {str(e)}")
+    finally:
+        elapsed = time.perf_counter() - start
+        report["timings"]["total"] = elapsed * 1000
+        for stage, ms in report["timings"].items():
+            if stage != "total":
+                metrics.STAGE_SECONDS.observe(ms / 1000, stage)
+        metrics.REQUEST_SECONDS.observe(elapsed, file_type)
+        metrics.REQUESTS.inc(file_type, str(status))
+
+async def _run_job(path: str, state: Dict, progress_path: str) -> Dict:
+    """Jobs wait for pool capacity instead of failing with 503"""
+    timeout = os.environ.get("BENFORD_ASYNC_JOB_TIMEOUT")
+    while True:
+        try:
+            return await _analyze(path, state["filename"], state["sha256"], state["params"],
+                                  progress=FileProgress(progress_path),
+                                  timeout=float(timeout) if timeout else None)
+        except HTTPException as e:
+            if e.status_code != 503:
+                raise
+            await asyncio.sleep(executor.retry_after)
+
+jobs = JobManager(_run_job)
+datasets = DatasetStore()
 
 @app.post("/analyze")
 async def analyze_file(
     file: UploadFile = File(...),
+    params: Dict = Depends(analysis_params),
+    use_cache: bool = True,
+    timings: bool = False
+):
+    start = time.perf_counter()
+    path, digest = await run_in_threadpool(_spool_to_disk, file)
+    spool_ms = (time.perf_counter() - start) * 1000
+    report = {"timings": {"spool": spool_ms}}
+    try:
+        response = await _analyze(path, file.filename, digest, params, use_cache,
+                                  timeout=executor.timeout, report=report)
+    finally:
+        os.unlink(path)
+    
+    report["timings"]["total"] += spool_ms
+    if timings:
+        # Cached responses are shared, so add the field to a copy
+        response = {**response, "timings": report["timings"]}
+    return JSONResponse(response, headers={
+        "Server-Timing": metrics.server_timing(report["timings"], cache=report["cache"])})
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    file: UploadFile = File(...),
+    params: Dict = Depends(analysis_params)
+):
+    job_id = jobs.new_job_id()
+    try:
+        _, digest = await run_in_threadpool(
+            _spool_to_disk, file, jobs.upload_path(job_id, file.filename))
+        state = jobs.submit(job_id, file.filename, digest, params)
+    except BaseException:
+        jobs.delete(job_id)
+        raise
+    return JSONResponse(state, status_code=202, headers={"Location": f"/jobs/{job_id}"})
+
+def _get_job(job_id: str) -> Dict:
+    state = jobs.get(job_id)
+    if state is None:
+        raise HTTPException(404, "Job not found")
+    return state
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    return _get_job(job_id)
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, interval: float = 0.5):
+    """Server-sent events with the job state whenever it changes"""
+    _get_job(job_id)
+    
+    async def _stream():
+        last = None
+        while True:
+            state = jobs.get(job_id)
+            if state is None:
+                return
+            if state != last:
+                yield f"data: {json.dumps(state)}\n\n"
+                last = state
+            if state["status"] in FINISHED:
+                return
+            await asyncio.sleep(interval)
+    
+    return StreamingResponse(_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    state = _get_job(job_id)
+    if state["status"] == "failed":
+        raise HTTPException(state["error"]["status_code"], state["error"]["detail"])
+    if state["status"] != "done":
+        return JSONResponse({"status": state["status"], "progress": state["progress"]},
+                            status_code=202)
+    return JSONResponse(jobs.result(job_id))
+
+@app.delete("/jobs/{job_id}")
+async def delete_job(job_id: str):
+    state = _get_job(job_id)
+    if state["status"] not in FINISHED:
+        raise HTTPException(409, "Job is still queued or running")
+    jobs.delete(job_id)
+    return {"job_id": job_id, "deleted": True}
+
+def _dataset_options(significance_level: float, p_value: str) -> None:
+    if not (0 < significance_level < 1):
+        raise HTTPException(422, "Significance level must be between 0 and 1")
+    if p_value not in P_VALUE_MODES:
+        raise HTTPException(422, f"p_value must be one of {', '.join(P_VALUE_MODES)}")
+
+@app.post("/datasets/{name}/append")
+async def append_to_dataset(
+    name: str,
+    file: UploadFile = File(...),
+    columns: Optional[str] = None,
     significance_level: float = 0.05,
-    max_depth: int = 3
+    p_value: str = "asymptotic"
 ):
+    """Add a batch of numbers to a named dataset (created on first append).
+
+    Only the batch is parsed; the history is represented by its stored
+    digit counts, so the cost does not grow with the dataset.
+    """
+    _dataset_options(significance_level, p_value)
     try:
-        if not (0 < significance_level < 1):
-            raise ValueError("Significance level must be between 0 and 1")
-            
-        numbers = await parse_file(file)
-        if len(numbers) < 300:
-            raise HTTPException(
-                400, 
-                "Insufficient data (minimum 300 numbers required for reliable analysis)"
-            )
-        
-        # Full dataset analysis
-        result = benford_test(numbers, alpha=significance_level)
-        validate_benford_assumptions(result['expected'])
-        
-        # Prepare response
-        response = {
-            "status": "anomalous" if result['anomalous'] else "normal",
-            "stats": {
-                "chi2_p": result["p_chi"],
-                #"cvm_p": result["p_cvm"]
-            },
-            "plot": plot_benford(result['observed'], result['expected'], result['bins'])
-        }
-        
-        if result['anomalous']:
-            anomalies = bisection_analysis(numbers, max_depth, significance_level)
-            response["anomalous_regions"] = anomalies
-            
-        return JSONResponse(response)
-        
-    except ValueError as e:
-        raise HTTPException(422, str(e))
-    except Exception as e:
-        raise HTTPException(500, f"Analysis failed: {str(e)}")
+        datasets.dataset_dir(name)
+    except KeyError:
+        raise HTTPException(422, "Dataset names are letters, digits, '.', '_' and '-'")
+    path, _ = await run_in_threadpool(_spool_to_disk, file)
+    try:
+        acc = await executor.run(parse_path, path, file.filename,
+                                 columns=_name_list(columns) or None)
+    except PoolSaturated as e:
+        raise HTTPException(503, "Server busy, retry later",
+                            headers={"Retry-After": str(e.retry_after)})
+    except asyncio.TimeoutError:
+        raise HTTPException(504, "Parsing timed out")
+    except InputError as e:
+        raise HTTPException(400, str(e))
+    finally:
+        os.unlink(path)
+    if acc.count == 0:
+        raise HTTPException(400, "No numbers found in the batch")
+    return await run_in_threadpool(datasets.append, name, acc.codes, significance_level, p_value)
+
+def _get_dataset(name: str) -> Dict:
+    state = datasets.get(name)
+    if state is None:
+        raise HTTPException(404, "Dataset not found")
+    return state
+
+@app.get("/datasets")
+async def list_datasets():
+    return {"datasets": datasets.names()}
+
+@app.get("/datasets/{name}")
+async def dataset_status(name: str, significance_level: float = 0.05, max_depth: int = 3,
+                         p_value: str = "asymptotic"):
+    """Test of everything appended so far, with bisection over the stored index"""
+    _dataset_options(significance_level, p_value)
+    state = _get_dataset(name)
+    
+    def _analyze_history() -> Dict:
+        result = benford_test_counts(state["counts"][1:], 1, significance_level, p_value)
+        response = {**state, "result": result}
+        if result["anomalous"]:
+            response["anomalous_regions"] = bisection_analysis(
+                None, max_depth, significance_level,
+                index=datasets.index(name, state), p_value=p_value)
+        return response
+    
+    return await run_in_threadpool(_analyze_history)
+
+@app.delete("/datasets/{name}")
+async def delete_dataset(name: str):
+    _get_dataset(name)
+    await run_in_threadpool(datasets.delete, name)
+    return {"dataset": name, "deleted": True}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return cache.info()
+
+@app.get("/plots/{plot_id}")
+async def get_plot(plot_id: str, format: str = "png", counts: Optional[str] = None):
+    """Render a plot referenced by an /analyze response, once per format.
+
+    The stored spec is only a shortcut: plot_url also carries the digit
+    counts, checked against plot_id, for processes that never saw the spec.
+    """
+    if format not in MEDIA_TYPES:
+        raise HTTPException(422, f"format must be one of {', '.join(MEDIA_TYPES)}")
+    image = await run_in_threadpool(cache.get_plot, plot_id, format)
+    if image is None:
+        spec = await run_in_threadpool(cache.get_plot_spec, plot_id)
+        if spec is None and counts is not None:
+            spec = spec_from_counts(plot_id, counts)
+        if spec is None:
+            raise HTTPException(404, "Plot not found")
+        try:
+            # Rendering goes through the pool like analysis, off the event loop
+            image = await executor.run(render_plot, spec, format)
+        except PoolSaturated as e:
+            raise HTTPException(503, "Server busy, retry later",
+                                headers={"Retry-After": str(e.retry_after)})
+        except asyncio.TimeoutError:
+            raise HTTPException(504, "Plot rendering timed out")
+        await run_in_threadpool(cache.put_plot, plot_id, format, image)
+    # Ids are content addresses, so a plot never changes
+    return Response(image, media_type=MEDIA_TYPES[format],
+                    headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render_metrics(),
+                             media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,112 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+# Prometheus text exposition without a client-library dependency. Metrics are
+# per service process, like the caches.
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    """Label value escaping required by the text format"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {value:g}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float],
+                 labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = sorted(buckets)
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, Tuple[List[int], float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            counts, total = self._values.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[labels] = (counts, total + value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + [float("inf")], counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZES = tuple(10.0 ** e for e in range(2, 11))
+
+STAGE_SECONDS = Histogram("benford_stage_duration_seconds",
+                          "Time spent in each analysis stage", SECONDS, ["stage"])
+REQUEST_SECONDS = Histogram("benford_request_duration_seconds",
+                            "End-to-end analysis time including queueing", SECONDS, ["file_type"])
+INPUT_BYTES = Histogram("benford_input_bytes", "Size of analyzed uploads", SIZES, ["file_type"])
+NUMBERS_EXTRACTED = Histogram("benford_numbers_extracted",
+                              "Numbers parsed from each upload", SIZES, ["file_type"])
+REQUESTS = Counter("benford_requests_total", "Analyses by file type and HTTP status",
+                   ["file_type", "status"])
+CACHE_LOOKUPS = Counter("benford_cache_lookups_total", "Result cache lookups",
+                        ["tier", "result"])
+CHI2_WARNINGS = Counter("benford_chi2_assumption_warnings_total",
+                        "Chi-square tests run with expected counts below 5")
+
+REGISTRY = [STAGE_SECONDS, REQUEST_SECONDS, INPUT_BYTES, NUMBERS_EXTRACTED,
+            REQUESTS, CACHE_LOOKUPS, CHI2_WARNINGS]
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+class StageTimer:
+    """Collects wall-clock milliseconds per named stage.
+
+    Plain dict state, so a worker process can send `timings` back to the server.
+    """
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+def server_timing(timings: Dict[str, float], **descriptions: str) -> str:
+    """Format a Server-Timing header value"""
+    entries = [f"{name};dur={ms:.1f}" for name, ms in timings.items()]
+    entries += [f'{name};desc="{desc}"' for name, desc in descriptions.items()]
+    return ", ".join(entries)
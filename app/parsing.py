@@ -0,0 +1,845 @@
+import importlib.util
+import mmap
+import os
+import re
+from typing import TYPE_CHECKING, BinaryIO, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from .benford import (DEFAULT_THRESHOLDS, iter_number_spans, proportion_margin, AmountProfile,
+                      DigitAccumulator, DuplicateCounter, GroupedDigitCounts, SequentialTest)
+from .pdf_pages import iter_pdf_numbers
+
+# pandas, openpyxl and pyarrow are imported by the readers that use them, so
+# text and PDF uploads never load them. pyarrow is optional; without it the
+# pandas C parser reads CSVs.
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+class InputError(Exception):
+    """Upload that cannot be analyzed (reported as HTTP 400)"""
+
+# progress(stage, done, total, unit); total is 0 when unknown
+ProgressCallback = Callable[[str, int, int, str], None]
+
+# Focus on columns with "amount", "value", "total" in name
+DATA_COLUMNS = re.compile(r'amount|value|total', re.IGNORECASE)
+
+CHUNK_ROWS = 100_000        # CSV/Excel rows per chunk
+CHUNK_BYTES = 8 * 1024**2   # TXT bytes per read
+SAMPLE_ROWS = 1_000         # rows used to decide which data columns are numeric
+
+# group_by pseudo-key: the source column of each value
+GROUP_BY_COLUMN = "_column"
+TABULAR = ('.csv', '.xlsx', '.xls')
+COLUMNAR = ('.parquet', '.feather', '.arrow')
+# Uploads with named columns, which `columns` and `group_by` refer to
+TABLES = TABULAR + COLUMNAR
+# Every upload type parse_path reads
+EXTENSIONS = TABLES + ('.pdf', '.txt')
+
+def _row_major(block: np.ndarray) -> np.ndarray:
+    """Flatten a rows x columns block in df.stack() order, dropping missing cells"""
+    values = np.asarray(block, dtype=np.float64).ravel()
+    return values[~np.isnan(values)]
+
+CSV_DELIMITERS = (',', ';', '\t', '|')
+# Amount strings: digits grouped by '.', ',', "'" or spaces, with an optional
+# currency (a symbol or up to three letters) and sign, e.g. "€1.234,56",
+# "1,234.56 USD", "(1 234,56)", "12,50-". RE2-compatible, so pyarrow-backed
+# strings are matched without a round trip through Python objects.
+_SPACE = "\\s\u00a0\u202f"
+_CURRENCY = rf"(?:[A-Za-z]{{1,3}}\.?|[^\w{_SPACE}.,()+\-−'])?"
+AMOUNT = (rf"[{_SPACE}]*[(+\-−]?[{_SPACE}]*{_CURRENCY}[{_SPACE}]*[+\-−]?[{_SPACE}]*"
+          rf"\d[\d.,'{_SPACE}]*{_CURRENCY}[{_SPACE}]*[)\-−]?[{_SPACE}]*")
+NEGATIVE = r"[(\-−]"
+
+# Data column -> None if it holds numbers, else the decimal separator of its amount strings
+ColumnFormats = Dict[str, Optional[str]]
+
+def _strings(values: "pd.Series") -> "pd.Series":
+    import pandas as pd
+    return values.astype(pd.StringDtype("pyarrow" if HAS_PYARROW else "python"))
+
+def detect_decimal(values: "pd.Series") -> Optional[str]:
+    """Decimal separator ('.' or ',') of a sample of amount strings.
+
+    Cells vote where they settle it: of two different separators the last
+    is the decimal one, a repeated separator groups thousands, and a lone
+    one not followed by exactly three digits is decimal. Ties go to '.'.
+    Returns None unless most non-empty cells are amounts.
+    """
+    values = _strings(values.dropna())
+    values = values[values.str.strip() != ""]
+    if values.empty or values.str.fullmatch(AMOUNT).mean() <= 0.5:
+        return None
+    marks = values.str.replace(r"[^\d.,]", "", regex=True)
+    dots, commas = marks.str.count(r"\."), marks.str.count(",")
+    last_dot, last_comma = marks.str.rfind("."), marks.str.rfind(",")
+    tail = marks.str.len() - np.maximum(last_dot, last_comma) - 1
+    comma = (((dots > 0) & (last_comma > last_dot)) | ((commas == 0) & (dots > 1))
+             | ((dots == 0) & (commas == 1) & (tail != 3)))
+    dot = (((commas > 0) & (last_dot > last_comma)) | ((dots == 0) & (commas > 1))
+           | ((commas == 0) & (dots == 1) & (tail != 3)))
+    return ',' if comma.sum() > dot.sum() else '.'
+
+def clean_amounts(values: "pd.Series", decimal: str = '.') -> np.ndarray:
+    """Amount strings as float64, in bulk; cells that are not amounts become NaN.
+
+    Everything but digits and the decimal separator is dropped, so currency,
+    thousands separators and spaces go in one pass; parentheses or a minus
+    sign make the amount negative.
+    """
+    values = _strings(values)
+    negative = values.str.contains(NEGATIVE).fillna(False).to_numpy(dtype=bool)
+    digits = values.str.replace(rf"[^\d{re.escape(decimal)}]", "", regex=True)
+    if decimal != '.':
+        digits = digits.str.replace(decimal, '.', regex=False)
+    valid = values.str.fullmatch(AMOUNT) & digits.str.fullmatch(r"\d+(?:\.\d*)?")
+    numbers = digits.where(valid).astype("Float64").to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.where(negative, -numbers, numbers)
+
+def sniff_csv_delimiter(fileobj: BinaryIO) -> str:
+    """The CSV_DELIMITERS character most frequent in the header line, else ','"""
+    start = fileobj.tell()
+    line = fileobj.readline(CHUNK_BYTES).decode('utf-8', errors='replace')
+    fileobj.seek(start)
+    counts = {delimiter: line.count(delimiter) for delimiter in CSV_DELIMITERS}
+    best = max(counts, key=counts.get)
+    return best if counts[best] else ','
+
+def sniff_csv_formats(fileobj: BinaryIO, columns: Optional[List[str]] = None,
+                      delimiter: str = ',') -> ColumnFormats:
+    """Data columns and how to read them, from the header and a sample of rows.
+
+    Without `columns`, these are the amount/value/total columns that hold
+    numbers or amount strings (see detect_decimal); others are dropped. The
+    given `columns` are all kept, string ones as numbers unless the sample
+    shows amounts.
+    """
+    import pandas as pd
+    start = fileobj.tell()
+    header = pd.read_csv(fileobj, sep=delimiter, nrows=0).columns
+    fileobj.seek(start)
+    if columns:
+        _check_columns(header, columns)
+    data_cols = columns or [col for col in header if DATA_COLUMNS.search(str(col))]
+    if not data_cols:
+        return {}
+    sample = pd.read_csv(fileobj, sep=delimiter, usecols=data_cols, nrows=SAMPLE_ROWS)
+    fileobj.seek(start)
+    numeric = set(sample.select_dtypes(include='number').columns)
+    formats = {}
+    for col in data_cols:
+        decimal = None if col in numeric else detect_decimal(sample[col])
+        if col in numeric or decimal or columns:
+            formats[col] = decimal
+    return formats
+
+def sniff_csv_columns(fileobj: BinaryIO) -> List[str]:
+    """Pick the numeric data columns from the header and a sample of rows"""
+    return list(sniff_csv_formats(fileobj, delimiter=sniff_csv_delimiter(fileobj)))
+
+# Column names, first data row (0-based, header excluded) and rows x columns numbers
+CellBlock = Tuple[List[str], int, np.ndarray]
+
+def _cells(block: np.ndarray, first_row: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """_row_major values of a block, with the row and column index of each"""
+    block = np.asarray(block, dtype=np.float64)
+    rows, cols = np.nonzero(~np.isnan(block))
+    return block[rows, cols], rows + first_row, cols
+
+def _iter_arrow_csv(fileobj: BinaryIO, formats: ColumnFormats,
+                    delimiter: str = ',') -> Iterator[np.ndarray]:
+    """Typed, projected read with the multithreaded pyarrow CSV reader.
+
+    Like _iter_pandas_csv, yields a rows x columns block per chunk. Amount
+    string columns are read as strings and cleaned a chunk at a time.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    reader = pa_csv.open_csv(
+        fileobj,
+        read_options=pa_csv.ReadOptions(block_size=CHUNK_BYTES),
+        parse_options=pa_csv.ParseOptions(delimiter=delimiter),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=list(formats),
+            column_types={col: pa.string() if decimal else pa.float64()
+                          for col, decimal in formats.items()}),
+    )
+    for batch in reader:
+        yield np.column_stack([_arrow_floats(batch.column(col), decimal)
+                               for col, decimal in formats.items()])
+
+def _frame_floats(df: "pd.DataFrame", formats: ColumnFormats) -> np.ndarray:
+    """rows x columns numbers of a chunk: amount strings cleaned, other strings as NaN"""
+    import pandas as pd
+    if not any(formats.values()):
+        return df[list(formats)].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    return np.column_stack([
+        clean_amounts(df[col], decimal) if decimal
+        else pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64)
+        for col, decimal in formats.items()])
+
+def _iter_pandas_csv(fileobj: BinaryIO, formats: ColumnFormats, chunk_rows: int,
+                     typed: bool = True, skip_rows: int = 0,
+                     delimiter: str = ',') -> Iterator[np.ndarray]:
+    """Projected pandas read; typed=False coerces stray strings to NaN instead of failing"""
+    import pandas as pd
+    columns = list(formats)
+    dtype = {col: str if decimal else np.float64 for col, decimal in formats.items()
+             if decimal or typed}
+    for df in pd.read_csv(fileobj, sep=delimiter, usecols=columns, dtype=dtype,
+                          chunksize=chunk_rows):
+        if skip_rows >= len(df):
+            skip_rows -= len(df)
+            continue
+        df, skip_rows = df.iloc[skip_rows:], 0
+        yield _frame_floats(df, formats)
+
+def _check_columns(header: Sequence, wanted: Sequence[str]) -> None:
+    missing = [col for col in wanted if col not in set(map(str, header))]
+    if missing:
+        raise InputError(f"Columns not found: {', '.join(missing)}")
+
+def iter_csv_blocks(fileobj: BinaryIO, chunk_rows: int = CHUNK_ROWS,
+                    columns: Optional[List[str]] = None) -> Iterator[CellBlock]:
+    """Yield each CSV chunk as a CellBlock.
+
+    Only the amount/value/total columns (or the given `columns`) are read,
+    as float64, with pyarrow when it is installed. Columns whose sample
+    holds amount strings such as "€1.234,56" are read as strings and
+    cleaned with the decimal separator detected for that column. If a
+    later row holds a string in a numeric column, reading resumes after
+    the rows already yielded with a reader that drops such cells (instead
+    of the whole column). The delimiter is sniffed from the header line.
+    """
+    start = fileobj.tell()
+    delimiter = sniff_csv_delimiter(fileobj)
+    formats = sniff_csv_formats(fileobj, columns, delimiter)
+    if not formats:
+        return
+    columns = list(formats)
+    
+    rows_done = 0
+    try:
+        chunks = (_iter_arrow_csv(fileobj, formats, delimiter) if HAS_PYARROW
+                  else _iter_pandas_csv(fileobj, formats, chunk_rows, delimiter=delimiter))
+        for block in chunks:
+            yield columns, rows_done, block
+            rows_done += len(block)
+        return
+    except ValueError:  # includes pyarrow.ArrowInvalid
+        pass
+    
+    fileobj.seek(start)
+    for block in _iter_pandas_csv(fileobj, formats, chunk_rows, typed=False, skip_rows=rows_done,
+                                  delimiter=delimiter):
+        yield columns, rows_done, block
+        rows_done += len(block)
+
+def iter_csv_chunks(fileobj: BinaryIO, chunk_rows: int = CHUNK_ROWS,
+                    columns: Optional[List[str]] = None) -> Iterator[np.ndarray]:
+    """Yield the numbers of each CSV chunk in row-major (df.stack) order"""
+    for _, _, block in iter_csv_blocks(fileobj, chunk_rows, columns):
+        yield _row_major(block)
+
+def _excel_number(cell) -> float:
+    if isinstance(cell, (int, float)) and not isinstance(cell, bool):
+        return float(cell)
+    return np.nan
+
+def _xlsx_columns(header: Sequence, columns: Optional[List[str]]) -> List[int]:
+    """Indices of the given columns, or of the amount/value/total ones"""
+    if columns:
+        _check_columns([col for col in header if col is not None], columns)
+        return [[str(col) for col in header].index(name) for name in columns]
+    return [i for i, col in enumerate(header)
+            if col is not None and DATA_COLUMNS.search(str(col))]
+
+def iter_xlsx_blocks(fileobj: BinaryIO, chunk_rows: int = CHUNK_ROWS,
+                     columns: Optional[List[str]] = None) -> Iterator[CellBlock]:
+    """Stream the first sheet with openpyxl's read-only reader.
+
+    Only the amount/value/total columns (or the given `columns`) are
+    converted. As with CSV chunks, non-numeric cells are dropped rather than
+    the whole column.
+    """
+    import openpyxl
+    workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        indices = _xlsx_columns(header, columns)
+        if not indices:
+            return
+        names = [str(header[i]) for i in indices]
+        block, rows_done = [], 0
+        for row in rows:
+            block.append([_excel_number(row[i]) if i < len(row) else np.nan for i in indices])
+            if len(block) >= chunk_rows:
+                yield names, rows_done, np.array(block, dtype=np.float64)
+                rows_done += len(block)
+                block = []
+        if block:
+            yield names, rows_done, np.array(block, dtype=np.float64)
+    finally:
+        workbook.close()
+
+def iter_xlsx_chunks(fileobj: BinaryIO, chunk_rows: int = CHUNK_ROWS,
+                     columns: Optional[List[str]] = None) -> Iterator[np.ndarray]:
+    """Yield the numbers of each chunk of the first sheet in row-major order"""
+    for _, _, block in iter_xlsx_blocks(fileobj, chunk_rows, columns):
+        yield _row_major(block)
+
+def arrow_schema(fileobj: BinaryIO, filename: str) -> "pa.Schema":
+    """Schema of a Parquet or Arrow IPC (Feather v2, file or stream) upload"""
+    if not HAS_PYARROW:
+        raise InputError("Parquet, Feather and Arrow uploads need pyarrow")
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+    if filename.endswith('.parquet'):
+        return pq.read_schema(fileobj.name, memory_map=True)
+    source = pa.memory_map(fileobj.name)
+    return (ipc.open_file if _is_ipc_file(source) else ipc.open_stream)(source).schema
+
+def _is_ipc_file(source) -> bool:
+    # The random-access file format opens with a magic string; the stream format does not
+    magic = source.read(6)
+    source.seek(0)
+    return magic == b"ARROW1"
+
+def _arrow_columns(schema: "pa.Schema", columns: Optional[List[str]]) -> List[str]:
+    """The given columns, or the numeric amount/value/total ones"""
+    import pyarrow as pa
+    if columns:
+        _check_columns(schema.names, columns)
+        return columns
+    numeric = (pa.types.is_integer, pa.types.is_floating, pa.types.is_decimal)
+    return [field.name for field in schema
+            if DATA_COLUMNS.search(field.name) and any(is_type(field.type) for is_type in numeric)]
+
+def _iter_arrow_batches(fileobj: BinaryIO, filename: str, names: List[str],
+                        chunk_rows: int = CHUNK_ROWS) -> Iterator["pa.RecordBatch"]:
+    """Record batches of only the `names` columns, at most chunk_rows long.
+
+    Files are memory-mapped and read a row group (Parquet) or record batch
+    (IPC) at a time. Uncompressed IPC columns are views of the mapping, so
+    their pages are only touched once digits are extracted. fileobj's
+    position is kept at the share of the file read so far, which progress
+    and early stopping go by.
+    """
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+    size = os.fstat(fileobj.fileno()).st_size
+    if filename.endswith('.parquet'):
+        parquet = pq.ParquetFile(fileobj.name, memory_map=True)
+        total, rows_done = parquet.metadata.num_rows, 0
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=names):
+            rows_done += batch.num_rows
+            fileobj.seek(size * rows_done // max(total, 1))
+            yield batch
+        return
+
+    source = pa.memory_map(fileobj.name)
+    is_file = _is_ipc_file(source)
+    schema = (ipc.open_file if is_file else ipc.open_stream)(source).schema
+    source.seek(0)
+    # Projection before decoding: compressed Feather only decompresses these columns
+    options = ipc.IpcReadOptions(included_fields=[schema.get_field_index(name) for name in names])
+    if is_file:
+        reader = ipc.open_file(source, options=options)
+        count = reader.num_record_batches
+        batches = ((reader.get_batch(i), size * (i + 1) // count) for i in range(count))
+    else:
+        batches = ((batch, source.tell()) for batch in ipc.open_stream(source, options=options))
+    for batch, position in batches:
+        # Slices are views too; a writer's single huge batch still streams in chunks
+        for offset in range(0, batch.num_rows, chunk_rows):
+            yield batch.slice(offset, chunk_rows)
+        fileobj.seek(position)
+
+def _arrow_floats(column: "pa.Array", decimal: Optional[str] = None) -> np.ndarray:
+    """Numbers of an Arrow column as float64, nulls as NaN.
+
+    A float64 column without nulls is returned as a view of its buffer.
+    Strings are cleaned as amounts with the given decimal separator, or
+    else coerced like stray CSV strings, to NaN where not numeric.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    if pa.types.is_integer(column.type) or pa.types.is_floating(column.type) \
+            or pa.types.is_decimal(column.type):
+        if column.type != pa.float64():
+            column = pc.cast(column, pa.float64())
+        return column.to_numpy(zero_copy_only=False)
+    import pandas as pd
+    if decimal:
+        return clean_amounts(column.to_pandas(), decimal)
+    return pd.to_numeric(column.to_pandas(), errors='coerce').to_numpy(dtype=np.float64)
+
+# Like CellBlock, with one float64 array per column instead of a rows x columns block
+ColumnBlock = Tuple[List[str], int, List[np.ndarray]]
+
+def iter_arrow_blocks(fileobj: BinaryIO, filename: str, chunk_rows: int = CHUNK_ROWS,
+                      columns: Optional[List[str]] = None) -> Iterator[ColumnBlock]:
+    """Yield each chunk of a Parquet, Feather or Arrow upload as a ColumnBlock.
+
+    Only the numeric amount/value/total columns (or the given `columns`)
+    are read.
+    """
+    names = _arrow_columns(arrow_schema(fileobj, filename), columns)
+    if not names:
+        return
+    rows_done = 0
+    for batch in _iter_arrow_batches(fileobj, filename, names, chunk_rows):
+        yield names, rows_done, [_arrow_floats(batch.column(name)) for name in names]
+        rows_done += batch.num_rows
+
+def _column_cells(arrays: List[np.ndarray], first_row: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """_cells of a ColumnBlock; a single column without NaN is passed through uncopied"""
+    if len(arrays) == 1 and not np.isnan(arrays[0]).any():
+        rows = np.arange(first_row, first_row + len(arrays[0]))
+        return arrays[0], rows, np.zeros(len(rows), dtype=np.int64)
+    return _cells(np.column_stack(arrays), first_row)
+
+def iter_text_chunks(fileobj: BinaryIO, chunk_bytes: int = CHUNK_BYTES) -> Iterator[np.ndarray]:
+    """Yield the numbers of each text chunk, split on line boundaries.
+
+    The file is memory-mapped and tokenized in place, so the upload is
+    never read into bytes or decoded to str. fileobj's position follows
+    the chunks, for progress and early stopping.
+    """
+    if os.fstat(fileobj.fileno()).st_size == 0:
+        return
+    with mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ) as text:
+        for stop, numbers in iter_number_spans(text, chunk_bytes, fileobj.tell()):
+            fileobj.seek(stop)
+            yield numbers
+
+class Reservoir:
+    """Uniform sample of `size` numbers from a stream of chunks.
+
+    Every number draws a random key and the `size` smallest keys are kept
+    (bottom-k sampling, equivalent to sampling without replacement). Once
+    the reservoir is full, a chunk is first cut down to the keys below the
+    largest kept one, so most of a long stream is skipped in one comparison.
+    Per-number source arrays passed to add() are sampled along.
+    """
+    def __init__(self, size: int, seed: int = 0):
+        self.size = size
+        self.seen = 0
+        self._rng = np.random.default_rng(seed)
+        self._keys = np.empty(0)
+        self._arrays: Dict[str, np.ndarray] = {"values": np.empty(0),
+                                               "positions": np.empty(0, dtype=np.int64)}
+    
+    def add(self, values: np.ndarray, source: Optional[Dict[str, np.ndarray]] = None) -> None:
+        keys = self._rng.random(len(values))
+        arrays = {"values": values,
+                  "positions": np.arange(self.seen, self.seen + len(values)), **(source or {})}
+        self.seen += len(values)
+        if len(self._keys) >= self.size:
+            below = keys < self._keys.max()
+            keys = keys[below]
+            arrays = {name: array[below] for name, array in arrays.items()}
+        keys = np.concatenate([self._keys, keys])
+        arrays = {name: np.concatenate([self._arrays[name], array]) if name in self._arrays else array
+                  for name, array in arrays.items()}
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size - 1)[:self.size]
+            keys = keys[keep]
+            arrays = {name: array[keep] for name, array in arrays.items()}
+        self._keys, self._arrays = keys, arrays
+    
+    def sample(self) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """Sampled values, their positions in the stream and their sources, in stream order"""
+        order = np.argsort(self._arrays["positions"], kind='stable')
+        arrays = {name: array[order] for name, array in self._arrays.items()}
+        return arrays.pop("values"), arrays.pop("positions"), arrays
+
+# Key column factorized per chunk: (code of each row, distinct values)
+FactorizedKey = Tuple[np.ndarray, np.ndarray]
+
+class GroupCoder:
+    """Maps group keys to dense ids that stay stable across chunks.
+
+    Each chunk is factorized on its own, so only its distinct keys are
+    hashed (64-bit, pandas' hash_array) and binary-searched in the sorted
+    hashes of every key seen so far. Two keys whose hashes collide would
+    share a group; with n keys the odds are about n**2 / 2**65.
+    """
+    def __init__(self):
+        self._hashes = np.empty(0, dtype=np.uint64)  # sorted
+        self._ids = np.empty(0, dtype=np.int64)      # id of each hash
+        self._labels: List[tuple] = []
+    
+    def __len__(self) -> int:
+        return len(self._labels)
+    
+    def encode(self, keys: List[FactorizedKey]) -> np.ndarray:
+        """Group id of every row in the chunk"""
+        import pandas as pd
+        if len(keys) == 1:
+            codes, uniques = keys[0]
+            hashes = pd.util.hash_array(uniques, categorize=False)
+        else:
+            codes, uniques = pd.MultiIndex.from_arrays([values[c] for c, values in keys]).factorize()
+            hashes = pd.util.hash_pandas_object(uniques, index=False).to_numpy()
+        
+        pos = np.searchsorted(self._hashes, hashes)
+        found = pos < len(self._hashes)
+        found[found] = self._hashes[pos[found]] == hashes[found]
+        chunk_ids = np.empty(len(hashes), dtype=np.int64)
+        chunk_ids[found] = self._ids[pos[found]]
+        
+        new = np.flatnonzero(~found)
+        if len(new):
+            new_ids = np.arange(len(self._labels), len(self._labels) + len(new))
+            chunk_ids[new] = new_ids
+            self._labels.extend(uniques[new] if len(keys) > 1 else [(key,) for key in uniques[new]])
+            order = np.argsort(hashes[new])
+            self._hashes = np.insert(self._hashes, pos[new][order], hashes[new][order])
+            self._ids = np.insert(self._ids, pos[new][order], new_ids[order])
+        return chunk_ids[codes]
+    
+    def labels(self) -> List[tuple]:
+        """Key tuple of every id, in id order"""
+        return self._labels
+
+def group_columns(fileobj: BinaryIO, filename: str, columns: Optional[List[str]],
+                  keys: List[str]) -> List[str]:
+    """Data columns for grouped parsing: the given ones or the amount/value/total ones"""
+    if not filename.endswith(TABLES):
+        raise InputError("columns and group_by need a CSV, Excel, Parquet or Arrow upload")
+    if columns:
+        shared = [key for key in keys if key in columns]
+        if shared:
+            raise InputError(f"group_by columns cannot also be data columns: {', '.join(shared)}")
+        return columns
+    if filename.endswith('.csv'):
+        columns = sniff_csv_columns(fileobj)
+    elif filename.endswith(COLUMNAR):
+        columns = _arrow_columns(arrow_schema(fileobj, filename), None)
+    else:
+        if filename.endswith('.xlsx'):
+            import openpyxl
+            workbook = openpyxl.load_workbook(fileobj, read_only=True)
+            header = next(workbook.worksheets[0].iter_rows(values_only=True), None) or ()
+            workbook.close()
+        else:
+            import pandas as pd
+            header = pd.read_excel(fileobj, nrows=0).columns
+        fileobj.seek(0)
+        columns = [str(col) for col in header if col is not None and DATA_COLUMNS.search(str(col))]
+    return [col for col in columns if col not in keys]
+
+def _factorize(values) -> FactorizedKey:
+    """Factorize one key column, with missing keys as "" and every key as str"""
+    import pandas as pd
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object).fillna("").astype(str))
+    return codes, np.asarray(uniques, dtype=object)
+
+GroupChunk = Tuple[int, np.ndarray, List[FactorizedKey]]
+
+def _group_chunk(df: "pd.DataFrame", formats: ColumnFormats, keys: List[str]) -> GroupChunk:
+    return len(df), _frame_floats(df, formats), [_factorize(df[key]) for key in keys]
+
+def _iter_arrow_groups(fileobj: BinaryIO, formats: ColumnFormats, keys: List[str],
+                       delimiter: str = ',') -> Iterator[GroupChunk]:
+    """Typed pyarrow read; keys are dictionary-encoded by pyarrow"""
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    reader = pa_csv.open_csv(
+        fileobj,
+        read_options=pa_csv.ReadOptions(block_size=CHUNK_BYTES),
+        parse_options=pa_csv.ParseOptions(delimiter=delimiter),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=list(formats) + keys,
+            column_types={**{col: pa.string() if decimal else pa.float64()
+                             for col, decimal in formats.items()},
+                          **{key: pa.string() for key in keys}}),
+    )
+    for batch in reader:
+        yield _arrow_group_chunk(batch, formats, keys)
+
+def _arrow_group_chunk(batch: "pa.RecordBatch", formats: ColumnFormats, keys: List[str]) -> GroupChunk:
+    """Keys are dictionary-encoded by pyarrow, as str like _factorize's"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    block = np.column_stack([_arrow_floats(batch.column(col), decimal)
+                             for col, decimal in formats.items()])
+    factorized = []
+    for key in keys:
+        column = batch.column(key)
+        if not pa.types.is_string(column.type):
+            column = pc.cast(column, pa.string())
+        encoded = pc.fill_null(column, "").dictionary_encode()
+        factorized.append((encoded.indices.to_numpy(zero_copy_only=False),
+                           encoded.dictionary.to_numpy(zero_copy_only=False)))
+    return batch.num_rows, block, factorized
+
+def _iter_columnar_groups(fileobj: BinaryIO, filename: str, columns: List[str], keys: List[str],
+                          chunk_rows: int) -> Iterator[GroupChunk]:
+    _check_columns(arrow_schema(fileobj, filename).names, columns + keys)
+    for batch in _iter_arrow_batches(fileobj, filename, columns + keys, chunk_rows):
+        yield _arrow_group_chunk(batch, dict.fromkeys(columns), keys)
+
+def _iter_pandas_groups(fileobj: BinaryIO, formats: ColumnFormats, keys: List[str],
+                        chunk_rows: int, skip_rows: int = 0,
+                        delimiter: str = ',') -> Iterator[GroupChunk]:
+    import pandas as pd
+    dtype = {**{col: str for col, decimal in formats.items() if decimal},
+             **{key: object for key in keys}}
+    for df in pd.read_csv(fileobj, sep=delimiter, usecols=list(formats) + keys, dtype=dtype,
+                          chunksize=chunk_rows):
+        if skip_rows >= len(df):
+            skip_rows -= len(df)
+            continue
+        df, skip_rows = df.iloc[skip_rows:], 0
+        yield _group_chunk(df, formats, keys)
+
+def _iter_csv_groups(fileobj: BinaryIO, columns: List[str], keys: List[str],
+                     chunk_rows: int) -> Iterator[GroupChunk]:
+    """Grouped counterpart of iter_csv_chunks, with the same string handling"""
+    import pandas as pd
+    delimiter = sniff_csv_delimiter(fileobj)
+    _check_columns(pd.read_csv(fileobj, sep=delimiter, nrows=0).columns, columns + keys)
+    fileobj.seek(0)
+    formats = sniff_csv_formats(fileobj, columns, delimiter)
+    rows_done = 0
+    if HAS_PYARROW:
+        try:
+            for chunk in _iter_arrow_groups(fileobj, formats, keys, delimiter):
+                rows_done += chunk[0]
+                yield chunk
+            return
+        except ValueError:  # includes pyarrow.ArrowInvalid
+            fileobj.seek(0)
+    yield from _iter_pandas_groups(fileobj, formats, keys, chunk_rows, skip_rows=rows_done,
+                                   delimiter=delimiter)
+
+def _group_chunks(fileobj: BinaryIO, filename: str, columns: List[str], keys: List[str],
+                  chunk_rows: int) -> Iterator[GroupChunk]:
+    """(rows, rows x columns numbers, factorized keys) per chunk"""
+    if filename.endswith('.csv'):
+        yield from _iter_csv_groups(fileobj, columns, keys, chunk_rows)
+        return
+    if filename.endswith(COLUMNAR):
+        yield from _iter_columnar_groups(fileobj, filename, columns, keys, chunk_rows)
+        return
+    import pandas as pd
+    wanted, formats = columns + keys, dict.fromkeys(columns)
+    if filename.endswith('.xlsx'):
+        import openpyxl
+        workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            indices = _xlsx_columns(next(rows, None) or (), wanted)
+            block = []
+            for row in rows:
+                block.append([row[i] if i < len(row) else None for i in indices])
+                if len(block) >= chunk_rows:
+                    yield _group_chunk(pd.DataFrame(block, columns=wanted, dtype=object), formats, keys)
+                    block = []
+            if block:
+                yield _group_chunk(pd.DataFrame(block, columns=wanted, dtype=object), formats, keys)
+        finally:
+            workbook.close()
+    else:
+        df = pd.read_excel(fileobj, dtype={key: object for key in keys})
+        _check_columns(df.columns, wanted)
+        yield _group_chunk(df, formats, keys)
+
+def iter_group_chunks(fileobj: BinaryIO, filename: str, columns: List[str],
+                      group_by: List[str], coder: GroupCoder,
+                      chunk_rows: int = CHUNK_ROWS) -> Iterator[Tuple[np.ndarray, np.ndarray, int, Dict]]:
+    """Yield (numbers, group id of each number, groups so far, source) per chunk.
+
+    Numbers come in the same row-major order, and with the same source, as
+    iter_located_chunks. Groups
+    are keyed by the `group_by` columns, whose values `coder` turns into
+    ids; GROUP_BY_COLUMN splits each key further by source column, as
+    id = key id * len(columns) + column index.
+    """
+    keys = [key for key in group_by if key != GROUP_BY_COLUMN]
+    per_column = GROUP_BY_COLUMN in group_by
+    rows_done = 0
+    for rows, block, factorized in _group_chunks(fileobj, filename, columns, keys, chunk_rows):
+        if keys:
+            row_ids, n_keys = coder.encode(factorized), len(coder)
+        else:
+            row_ids, n_keys = np.zeros(rows, dtype=np.int64), 1
+        if per_column:
+            ids = row_ids[:, None] * len(columns) + np.arange(len(columns))
+        else:
+            ids = np.repeat(row_ids[:, None], len(columns), axis=1)
+        values, row_index, col_index = _cells(block, rows_done)
+        yield (values, ids[row_index - rows_done, col_index],
+               n_keys * (len(columns) if per_column else 1),
+               {"names": columns, "rows": row_index, "columns": col_index})
+        rows_done += rows
+
+# A chunk's numbers and their source, as SourceMap.add takes it: data rows,
+# column indices and names for table cells, pages for PDF, {} for text
+LocatedChunk = Tuple[np.ndarray, Dict]
+
+def _xls_block(fileobj: BinaryIO, columns: Optional[List[str]]) -> CellBlock:
+    import pandas as pd
+    usecols = columns or (lambda col: bool(DATA_COLUMNS.search(str(col))))
+    df = pd.read_excel(fileobj, usecols=usecols)
+    if not columns:
+        df = df.select_dtypes(include='number')
+    return ([str(col) for col in df.columns], 0,
+            df.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64))
+
+def iter_located_chunks(fileobj: BinaryIO, filename: str,
+                        progress: Optional[ProgressCallback] = None,
+                        columns: Optional[List[str]] = None) -> Iterator[LocatedChunk]:
+    """Dispatch on file type; everything but legacy .xls is streamed"""
+    if columns and not filename.endswith(TABLES):
+        raise InputError("columns and group_by need a CSV, Excel, Parquet or Arrow upload")
+    if filename.endswith(COLUMNAR):
+        for names, first_row, arrays in iter_arrow_blocks(fileobj, filename, columns=columns):
+            values, rows, cols = _column_cells(arrays, first_row)
+            yield values, {"names": names, "rows": rows, "columns": cols}
+    elif filename.endswith(TABULAR):
+        if filename.endswith('.csv'):
+            blocks = iter_csv_blocks(fileobj, columns=columns)
+        elif filename.endswith('.xlsx'):
+            blocks = iter_xlsx_blocks(fileobj, columns=columns)
+        else:
+            blocks = iter([_xls_block(fileobj, columns)])
+        for names, first_row, block in blocks:
+            values, rows, cols = _cells(block, first_row)
+            yield values, {"names": names, "rows": rows, "columns": cols}
+    elif filename.endswith('.pdf'):
+        # Pages are extracted in parallel by workers that reopen the file by path
+        for page, values in enumerate(iter_pdf_numbers(fileobj.name, progress=progress), 1):
+            yield values, {"pages": np.full(len(values), page, dtype=np.int32)}
+    elif filename.endswith('.txt'):
+        for values in iter_text_chunks(fileobj):
+            yield values, {}
+    else:
+        raise ValueError("Unsupported file type")
+
+def iter_number_chunks(fileobj: BinaryIO, filename: str,
+                       progress: Optional[ProgressCallback] = None,
+                       columns: Optional[List[str]] = None) -> Iterator[np.ndarray]:
+    """iter_located_chunks without the sources"""
+    for values, _ in iter_located_chunks(fileobj, filename, progress, columns):
+        yield values
+
+def parse_stream(fileobj: BinaryIO, filename: str,
+                 progress: Optional[ProgressCallback] = None,
+                 keep_values: bool = False, columns: Optional[List[str]] = None,
+                 group_by: Optional[List[str]] = None, sample_size: int = 0,
+                 early_stop: bool = False, alpha: float = 0.05, duplicates: bool = False,
+                 round_numbers: bool = False,
+                 thresholds: Optional[List[float]] = None) -> DigitAccumulator:
+    """Feed every parsed chunk into a digit accumulator.
+
+    With group_by, per-group digit counts are collected into acc.groups in
+    the same pass. sample_size keeps a uniform sample of that many numbers
+    instead of all of them; early_stop stops reading once SequentialTest
+    has decided at `alpha`. Either way acc.sampling reports what was read.
+    duplicates and round_numbers (or thresholds) fill acc.duplicates and
+    acc.amounts from the numbers that reach the accumulator.
+    """
+    acc = DigitAccumulator(keep_values=keep_values)
+    if duplicates:
+        acc.duplicates = DuplicateCounter()
+    if round_numbers or thresholds:
+        acc.amounts = AmountProfile(thresholds or DEFAULT_THRESHOLDS)
+    size = os.fstat(fileobj.fileno()).st_size
+    
+    def _progress() -> None:
+        # PDF progress is reported per page by the page extractor
+        if progress and not filename.endswith('.pdf'):
+            progress("parsing", min(fileobj.tell(), size), size, "bytes")
+    
+    if sample_size:
+        reservoir = Reservoir(sample_size)
+        names = None
+        for values, source in iter_located_chunks(fileobj, filename, progress, columns):
+            names = source.pop("names", names)
+            reservoir.add(values, source)
+            _progress()
+        values, acc.positions, source = reservoir.sample()
+        acc.update(values, source=dict(source, names=names) if names else source)
+        margin = proportion_margin(acc.counts, reservoir.seen, alpha)
+        acc.sampling = {
+            "mode": "reservoir", "numbers_read": reservoir.seen, "sample_size": len(values),
+            "margin": margin,
+            "confidence": (f"Uniform sample of {len(values):,} of {reservoir.seen:,} numbers: every "
+                           f"first-digit proportion is within {margin:.4f} of its full-input value "
+                           f"with {1 - alpha:.0%} confidence."),
+        }
+        return acc
+    
+    if early_stop:
+        sequential = SequentialTest(alpha)
+        # PDF pages are all extracted before the first chunk, so stopping saves nothing there
+        stoppable = not filename.endswith('.pdf')
+        stopped, expected_total = False, None
+        for values, source in iter_located_chunks(fileobj, filename, progress, columns):
+            acc.update(values, source=source)
+            _progress()
+            position = fileobj.tell()
+            if not (stoppable and 0 < position < size):
+                continue
+            # Bytes per number so far gives the expected total
+            expected_total = acc.count * size / position
+            if sequential.update(acc.counts, expected_total):
+                stopped = True
+                break
+        acc.sampling = {
+            "mode": "sequential", "numbers_read": acc.count,
+            "numbers_expected": int(expected_total) if stopped else acc.count,
+            "stopped_early": stopped, "looks": sequential.looks,
+            "level": sequential.final_level,
+            "confidence": sequential.statement(acc.count, expected_total if stopped else None),
+        }
+        return acc
+    
+    if not group_by:
+        for values, source in iter_located_chunks(fileobj, filename, progress, columns):
+            acc.update(values, source=source)
+            _progress()
+        return acc
+    
+    keys = [key for key in group_by if key != GROUP_BY_COLUMN]
+    columns = group_columns(fileobj, filename, columns, keys)
+    per_column = GROUP_BY_COLUMN in group_by
+    acc.groups = GroupedDigitCounts(keys + (["column"] if per_column else []))
+    coder = GroupCoder()
+    if columns:
+        for values, ids, n_groups, source in iter_group_chunks(fileobj, filename, columns,
+                                                               group_by, coder):
+            acc.update(values, ids, n_groups, source)
+            _progress()
+    
+    labels = coder.labels() if keys else [()]
+    if per_column:
+        labels = [label + (column,) for label in labels for column in columns]
+    acc.groups.labels = labels
+    return acc
+
+def parse_path(path: str, filename: str,
+               progress: Optional[ProgressCallback] = None,
+               keep_values: bool = False, columns: Optional[List[str]] = None,
+               group_by: Optional[List[str]] = None, sample_size: int = 0,
+               early_stop: bool = False, alpha: float = 0.05, duplicates: bool = False,
+               round_numbers: bool = False,
+               thresholds: Optional[List[float]] = None) -> DigitAccumulator:
+    """Parse a spooled upload with improved error handling"""
+    try:
+        with open(path, 'rb') as fileobj:
+            return parse_stream(fileobj, filename, progress, keep_values, columns, group_by,
+                                sample_size, early_stop, alpha, duplicates, round_numbers,
+                                thresholds)
+    except Exception as e:
+        raise InputError(f"Parsing error: {str(e)}")
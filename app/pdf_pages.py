@@ -0,0 +1,205 @@
+import hashlib
+import multiprocessing
+import multiprocessing.util
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .benford import extract_numbers
+
+# Exclude header (top 10% of page) and footer (bottom 10%)
+DEFAULT_CROP = (0.10, 0.90)
+
+PAGES_PER_TASK = 16      # pages handed to a worker at a time
+PARALLEL_MIN_PAGES = 32  # below this, extracting inline beats pool overhead
+
+def document_hash(path: str, block_size: int = 1024**2) -> str:
+    """SHA-256 of the document, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class PageCache:
+    """Extracted numbers per (document hash, page, crop).
+
+    A bounded in-memory LRU in front of an on-disk tier of .npy files. The disk
+    tier is shared by every worker process, so it is what lets a re-run with
+    different analysis parameters skip PDF parsing. trim() keeps it under
+    max_disk_bytes by deleting the least recently used pages.
+    """
+    def __init__(self, directory: Optional[str] = None, max_pages: int = 10_000,
+                 max_disk_bytes: int = 1024**3):
+        self.directory = directory
+        self.max_pages = max_pages
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(doc_hash: str, page: int, crop: Tuple[float, float]) -> str:
+        return f"{doc_hash}-{page}-{crop[0]:g}-{crop[1]:g}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        if self.directory and os.path.exists(self._path(key)):
+            try:
+                values = np.load(self._path(key))
+                os.utime(self._path(key))  # mtime is the recency trim() goes by
+            except FileNotFoundError:  # trimmed by another process meanwhile
+                return None
+            self._remember(key, values)
+            return values
+        return None
+
+    def put(self, key: str, values: np.ndarray) -> None:
+        self._remember(key, values)
+        if self.directory:
+            # Write then rename so a concurrent reader never sees half a file;
+            # mkstemp keeps threads of one process off each other's temp file
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, values)
+                os.replace(tmp, self._path(key))
+            except BaseException:
+                os.unlink(tmp)
+                raise
+
+    def trim(self) -> None:
+        """Delete the least recently used page files until the disk tier fits max_disk_bytes"""
+        if not self.directory:
+            return
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith('.npy'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def _remember(self, key: str, values: np.ndarray) -> None:
+        self._memory[key] = values
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_pages:
+            self._memory.popitem(last=False)
+
+_page_cache: Optional[PageCache] = None
+_pool: Optional[ProcessPoolExecutor] = None
+
+def get_page_cache() -> PageCache:
+    """Process-wide cache; BENFORD_PAGE_CACHE_DIR="" keeps it memory-only and
+    BENFORD_PAGE_CACHE_MAX_BYTES bounds the disk tier"""
+    global _page_cache
+    if _page_cache is None:
+        directory = os.environ.get("BENFORD_PAGE_CACHE_DIR",
+                                   os.path.join(tempfile.gettempdir(), "benford-page-cache"))
+        _page_cache = PageCache(directory or None, max_disk_bytes=int(
+            os.environ.get("BENFORD_PAGE_CACHE_MAX_BYTES", 1024**3)))
+    return _page_cache
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        workers = int(os.environ.get("BENFORD_PDF_WORKERS", os.cpu_count() or 1))
+        _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        # A pool worker exiting joins its child processes before atexit runs,
+        # so shut the page pool down from a multiprocessing finalizer instead,
+        # ahead of the call queue's own (priority 10) finalizer
+        multiprocessing.util.Finalize(None, _pool.shutdown, exitpriority=100)
+    return _pool
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    if _pool is pool:
+        _pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def extract_page_numbers(path: str, pages: List[int],
+                         crop: Tuple[float, float] = DEFAULT_CROP) -> List[np.ndarray]:
+    """Open the document from disk and extract numbers from the given pages"""
+    import pdfplumber
+    results = []
+    with pdfplumber.open(path) as pdf:
+        for number in pages:
+            page = pdf.pages[number]
+            cropped = page.crop((0, page.height * crop[0], page.width, page.height * crop[1]))
+            text = cropped.extract_text() or ''
+            results.append(extract_numbers(text))
+    return results
+
+def iter_pdf_numbers(path: str, crop: Tuple[float, float] = DEFAULT_CROP,
+                     cache: Optional[PageCache] = None,
+                     progress: Optional[Callable] = None) -> Iterator[np.ndarray]:
+    """Yield the numbers of every page in page order.
+
+    Cached pages are served without opening the document's content streams;
+    the rest are split into batches of PAGES_PER_TASK across worker processes.
+    """
+    import pdfplumber
+    cache = cache if cache is not None else get_page_cache()
+    doc_hash = document_hash(path)
+    with pdfplumber.open(path) as pdf:
+        page_count = len(pdf.pages)
+
+    found: Dict[int, np.ndarray] = {}
+    for number in range(page_count):
+        values = cache.get(PageCache.key(doc_hash, number, crop))
+        if values is not None:
+            found[number] = values
+    missing = [n for n in range(page_count) if n not in found]
+
+    def _store(task: List[int], results: List[np.ndarray]) -> None:
+        for number, values in zip(task, results):
+            cache.put(PageCache.key(doc_hash, number, crop), values)
+            found[number] = values
+        if progress:
+            progress("parsing", len(found), page_count, "pages")
+
+    if len(missing) < PARALLEL_MIN_PAGES:
+        for i in range(0, len(missing), PAGES_PER_TASK):
+            task = missing[i:i + PAGES_PER_TASK]
+            _store(task, extract_page_numbers(path, task, crop))
+    else:
+        tasks = [missing[i:i + PAGES_PER_TASK] for i in range(0, len(missing), PAGES_PER_TASK)]
+        pool = _get_pool()
+        try:
+            futures = {pool.submit(extract_page_numbers, path, task, crop): task for task in tasks}
+            for future in as_completed(futures):
+                _store(futures[future], future.result())
+        except BrokenProcessPool:
+            # A page worker died (e.g. OOM-killed): the next document gets a
+            # fresh pool, and this one's remaining pages are read serially
+            _discard_pool(pool)
+            for task in tasks:
+                rest = [number for number in task if number not in found]
+                if rest:
+                    _store(rest, extract_page_numbers(path, rest, crop))
+    if missing:
+        cache.trim()
+
+    for number in range(page_count):
+        yield found[number]
@@ -0,0 +1,41 @@
+import hashlib
+import json
+from typing import Dict, Optional
+
+from .benford import DigitAccumulator, benford_expected_distribution, render_benford_plot
+
+# plot= values for /analyze; "inline" embeds a base64 PNG as before
+PLOT_MODES = ("png", "svg", "none", "inline")
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+def plot_spec(acc: DigitAccumulator) -> Dict:
+    """Everything needed to draw the first-digit plot, small enough to keep around"""
+    _, bins = benford_expected_distribution(1)
+    return {"observed": [int(c) for c in acc.counts[bins]]}
+
+def plot_id(spec: Dict) -> str:
+    """Content address of a plot: equal digit counts give the same id"""
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:32]
+
+def plot_url(plot_id: str, fmt: str, spec: Dict) -> str:
+    """The URL carries the spec itself, so any server process can draw it, even
+    after the stored spec is evicted or the server restarts"""
+    counts = ",".join(str(c) for c in spec["observed"])
+    return f"/plots/{plot_id}?counts={counts}" + ("" if fmt == "png" else f"&format={fmt}")
+
+def spec_from_counts(digest: str, counts: str) -> Optional[Dict]:
+    """Rebuild a spec from plot_url's counts; None unless it hashes to digest"""
+    try:
+        spec = {"observed": [int(c) for c in counts.split(",")]}
+    except ValueError:
+        return None
+    _, bins = benford_expected_distribution(1)
+    if len(spec["observed"]) != len(bins) or min(spec["observed"]) < 0:
+        return None
+    return spec if plot_id(spec) == digest else None
+
+def render_plot(spec: Dict, fmt: str = "png") -> bytes:
+    """Render a stored spec; runs in a pool worker"""
+    probs, bins = benford_expected_distribution(1)
+    expected = [p * sum(spec["observed"]) for p in probs]
+    return render_benford_plot(spec["observed"], expected, bins, fmt)
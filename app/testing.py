@@ -1,5 +1,13 @@
+import os
+import subprocess
+import sys
+
 import numpy as np
-from benford import benford_test, benford_expected_distribution, get_first_digit
+from benford import (benford_test, benford_expected_distribution, get_first_digit, get_second_digit,
+                     extract_digits, benford_test_suite, expected_distribution, TESTS,
+                     AmountProfile, DigitAccumulator, DigitPrefixIndex, DuplicateCounter,
+                     GroupedDigitCounts, first_digits, second_digits,
+                     NullTables, SequentialTest, SourceMap, build_null_table)
 
 def generate_benford_compliant_data(n=5000):
     """Generate numbers that perfectly follow Benford's Law"""
@@ -25,6 +33,30 @@ def test_digit_extraction():
         status = "PASS" if result == expected else f"FAIL (got {result})"
         print(f"{num}: {status}")
 
+    # The vectorized engine must agree with the scalar function
+    codes = extract_digits(np.array(list(test_cases)))['first']
+    for (num, expected), code in zip(test_cases.items(), codes):
+        result = int(code) if code >= 0 else None
+        status = "PASS" if result == expected else f"FAIL (got {result})"
+        print(f"{num} (vectorized): {status}")
+
+    # The scalar fast path must snap exactly like the vectorized one, powers of ten included
+    rng = np.random.default_rng(1)
+    values = np.concatenate([10 ** rng.uniform(-320, 308, 20000),
+                             [d * 10.0 ** e for d in range(1, 10) for e in range(-300, 300)],
+                             [d + 0.9999999999995 for d in range(9)],  # np.round snaps up
+                             [0.1 * 3, 5e-324, np.nan, np.inf, -np.inf, -0.0]])
+    scalar = [get_first_digit(float(v)) for v in values]
+    agree = all((-1 if s is None else s) == c for s, c in zip(scalar, first_digits(values)))
+    print("Scalar path matches vectorized:", "PASS" if agree else "FAIL")
+    scalar = [get_second_digit(float(v)) for v in values]
+    agree = all((-1 if s is None else s) == c for s, c in zip(scalar, second_digits(values)))
+    print("Scalar second digit matches vectorized:", "PASS" if agree else "FAIL")
+
+    # Ints past float range must not raise OverflowError
+    huge = [(get_first_digit(n), get_second_digit(n)) for n in (37 * 10 ** 400, -(10 ** 5000))]
+    print("Ints past float range:", "PASS" if huge == [(3, 7), (None, None)] else f"FAIL ({huge})")
+
 def test_benford_analysis():
     # Generate test data
     data = generate_benford_compliant_data()
@@ -63,8 +95,442 @@ def debug_expected_distribution():
         0.0967, 0.0934, 0.0904, 0.0876, 0.0850
     ]
     print("Second digit match:", np.allclose(p2, theoretical_p2, atol=0.001))
+    
+    # Test suite distributions are proper and agree with the legacy function
+    print("Suite sums to 1:", all(np.isclose(expected_distribution(t)[1].sum(), 1) for t in TESTS))
+    print("Suite second digit match:", np.allclose(expected_distribution("second")[1], p2))
+
+def test_suite_single_pass():
+    """The one-pass suite must reproduce the per-test results"""
+    print("\n=== Test Suite ===")
+    data = 10 ** np.random.default_rng(7).uniform(0, 6, 20000)
+    suite = benford_test_suite(data)
+    for digit_pos, test in ((1, "first"), (2, "second")):
+        match = np.isclose(suite[test]["p_chi"], benford_test(data, digit_pos)["p_chi"])
+        print(f"{test} matches benford_test: {'PASS' if match else 'FAIL'}")
+    print("Tests reported:", "PASS" if list(suite) == list(TESTS) else f"FAIL (got {list(suite)})")
+
+def test_grouped_counts():
+    """Per-group counts must add up to the overall ones and rank the odd group first"""
+    print("\n=== Group-by ===")
+    rng = np.random.default_rng(11)
+    data = 10 ** rng.uniform(0, 6, 30000)
+    ids = rng.integers(0, 3, len(data))
+    data[ids == 2] = rng.uniform(500, 999, (ids == 2).sum())
+    acc = DigitAccumulator()
+    acc.groups = GroupedDigitCounts(["vendor"])
+    acc.groups.labels = [("a",), ("b",), ("c",)]
+    for chunk in range(3):
+        part = slice(chunk * 10000, (chunk + 1) * 10000)
+        acc.update(data[part], ids[part], 3)
+    totals = np.array_equal(acc.groups.counts[:3].sum(axis=0), acc.counts)
+    print(f"Group counts add up: {'PASS' if totals else 'FAIL'}")
+    top = acc.groups.test(0.05, top_k=1)["top"][0]
+    print("Odd group first:", "PASS" if top["group"] == {"vendor": "c"} and top["anomalous"] else f"FAIL ({top})")
+
+def test_small_sample_p_values():
+    """Null-table p-values must be a proper distribution and hold their size"""
+    print("\n=== Small-sample p-values ===")
+    _, tail = build_null_table("first", 8)
+    print(f"Exact table sums to 1: {'PASS' if np.isclose(tail[0], 1) else f'FAIL ({tail[0]})'}")
+    rng = np.random.default_rng(3)
+    n, draws = 30, 4000
+    probs = np.log10(1 + 1 / np.arange(1, 10))
+    observed = rng.multinomial(n, probs / probs.sum(), size=draws)
+    chi2 = ((observed - n * probs) ** 2 / (n * probs)).sum(axis=1)
+    rate = (NullTables().p_values("first", np.full(draws, n), chi2) < 0.05).mean()
+    print(f"Rejection rate under the null ({rate:.3f}):", "PASS" if abs(rate - 0.05) < 0.015 else "FAIL")
+
+def test_source_map():
+    """Regions must map back to the rows, columns and pages they came from"""
+    print("\n=== Source map ===")
+    block = np.array([[1.0, np.nan], [2.0, 3.0], [np.nan, 4.0]])
+    rows, cols = np.nonzero(~np.isnan(block))
+    acc = DigitAccumulator()
+    acc.update(block[rows, cols], source={"names": ["Amount", "Total"], "rows": rows + 10, "columns": cols})
+    where = acc.source.locate(1, 3)
+    print("Table cells:", "PASS" if where == {"rows": [11, 12], "columns": ["Amount", "Total"]} else f"FAIL ({where})")
+    source = SourceMap()
+    for page, n in [(1, 3), (2, 0), (3, 2)]:
+        source.add(n, {"pages": np.full(n, page)})
+    where = source.locate(2, 4)
+    print("PDF pages:", "PASS" if where == {"pages": [1, 3]} else f"FAIL ({where})")
+    restored = DigitAccumulator.from_state(acc.state())
+    print("State round trip:", "PASS" if restored.source.locate(0, 3) == acc.source.locate(0, 3) else "FAIL")
+
+def test_duplicates_and_thresholds():
+    """Repeated amounts must rank first, also in the sketch, and show as bunching under 5000"""
+    print("\n=== Duplicates and thresholds ===")
+    rng = np.random.default_rng(8)
+    data = (10 ** rng.uniform(1, 6, 200000)).round(2)
+    data[::40] = 4999.0
+    exact, sketch = DuplicateCounter(), DuplicateCounter(exact_max=1000, sketch_size=64)
+    for chunk in np.array_split(data, 20):
+        exact.add(chunk)
+        sketch.add(chunk)
+    top, approx = exact.test(1)["top"][0], sketch.test(1)["top"][0]
+    print("Exact top amount:", "PASS" if top == {"value": 4999.0, "count": 5000, "share": 0.025} else f"FAIL ({top})")
+    bound = sketch.test()["max_error"]
+    print("Sketch within its error bound:",
+          "PASS" if approx["value"] == 4999.0 and 5000 - bound <= approx["count"] <= 5000 else f"FAIL ({approx})")
+    profile = AmountProfile()
+    profile.add(data)
+    flagged = [t["threshold"] for t in profile.test()["thresholds"] if t["anomalous"]]
+    print("Bunching under 5000:", "PASS" if flagged == [5000.0] else f"FAIL ({flagged})")
+
+def test_prefix_index():
+    """Range counts must equal bincounts of the codes, whatever the checkpoint spacing"""
+    print("\n=== Prefix index ===")
+    rng = np.random.default_rng(5)
+    codes = first_digits(np.concatenate([10 ** rng.uniform(0, 6, 5000), [0.0, np.nan]]))
+    starts = rng.integers(0, len(codes), 300)
+    ends = np.minimum(starts + rng.integers(0, 700, 300), len(codes))
+    brute = np.array([np.bincount(codes[a:b][codes[a:b] > 0], minlength=10)[1:]
+                      for a, b in zip(starts, ends)])
+    for block in (1, 7, 64):
+        match = np.array_equal(DigitPrefixIndex(codes, block).range_counts(starts, ends), brute)
+        print(f"block={block} matches bincount: {'PASS' if match else 'FAIL'}")
+
+def _package_module(name):
+    """Modules using package-relative imports, such as app.parsing, load through the repo root"""
+    import importlib
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    return importlib.import_module(f"app.{name}")
+
+def test_amount_strings():
+    """Locale-formatted amount columns: separators, signs, empty cells and both CSV readers"""
+    import io
+    import pandas as pd
+    parsing = _package_module("parsing")
+    print("\n=== Amount strings ===")
+    data = "Date;Amount\n2021-01-01;€1.234,56\n2021-01-02;(12,50)\n2021-01-03;\n2021-01-04;7,00-\n".encode()
+    delimiter = parsing.sniff_csv_delimiter(io.BytesIO(data))
+    print("Delimiter ';':", "PASS" if delimiter == ";" else f"FAIL ({delimiter!r})")
+    formats = parsing.sniff_csv_formats(io.BytesIO(data), delimiter=";")
+    print("Decimal comma column:", "PASS" if formats == {"Amount": ","} else f"FAIL ({formats})")
+    cleaned = parsing.clean_amounts(pd.Series(["(1.234,56)", "12,50-", "€1.234,56", "", None, "n/a"]), ",")
+    expected = [-1234.56, -12.5, 1234.56, np.nan, np.nan, np.nan]
+    print("Signs, currency and empty cells:",
+          "PASS" if np.allclose(cleaned, expected, equal_nan=True) else f"FAIL ({cleaned})")
+    # A lone separator before three digits settles nothing, so the tie goes to '.'
+    ambiguous = parsing.detect_decimal(pd.Series(["1.234", "5.678", "9.101"]))
+    print("Ambiguous 1.234 reads as decimal point:", "PASS" if ambiguous == "." else f"FAIL ({ambiguous!r})")
+    decimal = parsing.detect_decimal(pd.Series(["1.234,56", "", None, "12,50-"]))
+    print("Empty cells don't vote:", "PASS" if decimal == "," else f"FAIL ({decimal!r})")
+    blank = parsing.detect_decimal(pd.Series(["", None]))
+    print("No amounts, no separator:", "PASS" if blank is None else f"FAIL ({blank!r})")
+    has_pyarrow = parsing.HAS_PYARROW
+    try:
+        for flag in sorted({False, has_pyarrow}):
+            parsing.HAS_PYARROW = flag
+            blocks = list(parsing.iter_csv_blocks(io.BytesIO(data)))
+            values = np.concatenate([block for _, _, block in blocks]).ravel()
+            match = np.allclose(values, [1234.56, -12.5, np.nan, -7.0], equal_nan=True)
+            print(f"{'pyarrow' if flag else 'pandas'} reader:", "PASS" if match else f"FAIL ({values})")
+    finally:
+        parsing.HAS_PYARROW = has_pyarrow
+
+def test_reservoir():
+    """Every position of a chunked stream is equally likely to be sampled, and comes back in order"""
+    parsing = _package_module("parsing")
+    print("\n=== Reservoir sampling ===")
+    stream, size, runs = 2000, 200, 300
+    included = np.zeros(stream)
+    ordered = True
+    for seed in range(runs):
+        reservoir = parsing.Reservoir(size, seed=seed)
+        for start in range(0, stream, 137):
+            reservoir.add(np.arange(start, min(start + 137, stream), dtype=np.float64))
+        values, positions, _ = reservoir.sample()
+        ordered &= bool(np.all(np.diff(positions) > 0) and np.array_equal(values, positions))
+        included[positions] += 1
+    # Each tenth of the stream should be sampled at size / stream, within ~4 standard errors
+    rates = included.reshape(10, -1).mean(axis=1) / runs
+    uniform = np.abs(rates - size / stream).max() < 0.005
+    print("Inclusion rate uniform over the stream:", "PASS" if uniform else f"FAIL ({np.round(rates, 4)})")
+    print("Positions in stream order:", "PASS" if ordered else "FAIL")
+
+def test_sequential_false_alarms():
+    """Early stopping under Benford data: reported anomalies stay at or below alpha"""
+    from scipy.special import chdtrc
+    print("\n=== Sequential test ===")
+    rng = np.random.default_rng(16)
+    _, probs = expected_distribution("first")
+    runs, total, chunk, alpha = 400, 80_000, 5_000, 0.05
+    stopped_anomalous = reported = 0
+    for _ in range(runs):
+        test, counts = SequentialTest(alpha), np.zeros(10, dtype=np.int64)
+        for read in range(chunk, total + 1, chunk):
+            counts[1:] += rng.multinomial(chunk, probs)
+            if read < total and test.update(counts, total):
+                break
+        stopped_anomalous += test.decision == "anomalous"
+        # What the response reports: the test of the numbers read, at the level looks left over
+        chi2 = ((counts[1:] - probs * counts.sum()) ** 2 / (probs * counts.sum())).sum()
+        reported += chdtrc(8, chi2) < test.final_level
+    rate = reported / runs
+    print(f"Stopped as anomalous ({stopped_anomalous / runs:.3f}) within alpha / 2:",
+          "PASS" if stopped_anomalous / runs <= alpha / 2 else "FAIL")
+    print(f"Reported anomalous ({rate:.3f}) within alpha:", "PASS" if rate <= alpha else "FAIL")
+
+def test_upload_limits():
+    """413 before and while reading any body, 503 before reading a busy upload, slots always freed"""
+    from fastapi import FastAPI, File, Request, UploadFile
+    from fastapi.testclient import TestClient
+    uploads = _package_module("uploads")
+    print("\n=== Upload limits ===")
+    api = FastAPI()
+
+    @api.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    @api.post("/echo")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    async def broken(scope, receive, send):
+        await receive()
+        raise RuntimeError("failed before the body was read")
+
+    boundary = "limits"
+    def multipart(size):
+        yield f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="a.txt"\r\n\r\n'.encode()
+        for _ in range(size // 1000):
+            yield b"1" * 1000
+        yield f"\r\n--{boundary}--\r\n".encode()
+    chunked = {"content-type": f"multipart/form-data; boundary={boundary}"}
+
+    limits = uploads.UploadLimits(api, max_bytes=10_000, max_uploads=1)
+    with TestClient(limits) as client:
+        status = client.post("/upload", files={"file": ("a.txt", b"1" * 20_000)}).status_code
+        print("413 on Content-Length:", "PASS" if status == 413 else f"FAIL ({status})")
+        status = client.post("/upload", content=multipart(20_000), headers=chunked).status_code
+        print("413 mid-stream on a chunked body:", "PASS" if status == 413 else f"FAIL ({status})")
+        print("Slot freed after 413:", "PASS" if not limits._slots.locked() else "FAIL")
+        response = client.post("/upload", content=multipart(5_000), headers=chunked)
+        ok = response.status_code == 200 and response.json() == {"size": 5_000}
+        print("Chunked body under the limit:", "PASS" if ok else f"FAIL ({response.status_code})")
+        status = client.post("/echo", data={"field": "1" * 20_000}).status_code
+        print("413 on a urlencoded form:", "PASS" if status == 413 else f"FAIL ({status})")
+        status = client.post("/echo", content=(b"1" * 1000 for _ in range(20))).status_code
+        print("413 mid-stream without a content type:", "PASS" if status == 413 else f"FAIL ({status})")
+        response = client.post("/echo", content=b"1" * 5_000)
+        ok = response.status_code == 200 and response.json() == {"size": 5_000}
+        print("Small body without a content type:", "PASS" if ok else f"FAIL ({response.status_code})")
+    reads = []
+    async def counting(scope, receive, send):
+        reads.append(await receive())
+    limits = uploads.UploadLimits(counting, busy=lambda scope: 7)
+    response = TestClient(limits).post("/upload", files={"file": ("a.txt", b"1" * 5_000)})
+    ok = response.status_code == 503 and response.headers.get("retry-after") == "7" and not reads
+    print("Busy upload turned away unread:", "PASS" if ok else f"FAIL ({response.status_code}, {len(reads)} reads)")
+    limits = uploads.UploadLimits(broken, max_bytes=10_000, max_uploads=1)
+    client = TestClient(limits, raise_server_exceptions=False)
+    status = client.post("/upload", content=multipart(5_000), headers=chunked).status_code
+    freed = status == 500 and not limits._slots.locked()
+    print("Slot freed after an app error:", "PASS" if freed else f"FAIL ({status})")
+
+def _service():
+    """app.main with one spawned worker and its state in a fresh temp directory"""
+    import tempfile
+    state = tempfile.mkdtemp(prefix="benford-testing-")
+    for name, value in (("BENFORD_WORKERS", "1"), ("BENFORD_CACHE_DIR", os.path.join(state, "cache")),
+                        ("BENFORD_JOBS_DIR", os.path.join(state, "jobs"))):
+        os.environ.setdefault(name, value)
+    return _package_module("main")
+
+def _benford_csv(n=2000, seed=0):
+    values = 10 ** np.random.default_rng(seed).uniform(0, 5, n)
+    return ("amount\n" + "\n".join(f"{v:.2f}" for v in values)).encode()
+
+def test_executor_recovery():
+    """Saturation is 503, timeouts 504, and a dead worker costs one 503 rather than the pool"""
+    from fastapi.testclient import TestClient
+    main = _service()
+    print("\n=== Analysis pool ===")
+    upload = {"file": ("a.csv", _benford_csv())}
+    with TestClient(main.app) as client:
+        executor = main.executor
+        status = client.post("/analyze", params={"use_cache": "false"}, files=upload).status_code
+        print("Analysis through the pool:", "PASS" if status == 200 else f"FAIL ({status})")
+
+        max_queue, executor.max_queue = executor.max_queue, -max(executor.workers, 1)
+        response = client.post("/analyze", params={"use_cache": "false"}, files=upload)
+        executor.max_queue = max_queue
+        ok = response.status_code == 503 and response.headers.get("retry-after") == str(executor.retry_after)
+        print("Saturated pool answers 503 with Retry-After:", "PASS" if ok else f"FAIL ({response.status_code})")
+
+        timeout, executor.timeout = executor.timeout, 1e-6
+        status = client.post("/analyze", params={"use_cache": "false"}, files=upload).status_code
+        executor.timeout = timeout
+        print("Timed-out job answers 504:", "PASS" if status == 504 else f"FAIL ({status})")
+
+        for process in list(executor._pool._processes.values()):
+            process.kill()
+            process.join()
+        response = client.post("/analyze", params={"use_cache": "false"}, files=upload)
+        ok = response.status_code == 503 and "retry-after" in response.headers
+        print("Killed worker answers 503 with Retry-After:", "PASS" if ok else f"FAIL ({response.status_code})")
+        status = client.post("/analyze", params={"use_cache": "false"}, files=upload).status_code
+        print("Next job runs on a respawned pool:", "PASS" if status == 200 else f"FAIL ({status})")
+
+def test_cache_tiers():
+    """Responses, parsed digits and the bounded disk tier answer repeat uploads"""
+    import re
+    from fastapi.testclient import TestClient
+    main = _service()
+    print("\n=== Result cache ===")
+    upload = {"file": ("tiers.csv", _benford_csv(seed=6))}
+
+    def answered_by(client, **params):
+        response = client.post("/analyze", params=params, files=upload)
+        return re.search(r'cache;desc="(\w+)"', response.headers.get("server-timing", "")).group(1)
+
+    cache = main.cache
+    with TestClient(main.app) as client:
+        first = answered_by(client)
+        print("First upload parsed:", "PASS" if first == "miss" else f"FAIL ({first})")
+        again = answered_by(client)
+        print("Same upload and parameters hit:", "PASS" if again == "hit" else f"FAIL ({again})")
+        other = answered_by(client, significance_level=0.01)
+        print("New parameters reuse parsed digits:", "PASS" if other == "parsed" else f"FAIL ({other})")
+        cache.responses = type(cache.responses)(cache.responses.max_size)
+        cache.parsed = type(cache.parsed)(cache.parsed.max_size, sizeof=cache.parsed.sizeof)
+        disk = answered_by(client, significance_level=0.02)
+        print("Disk tier answers after memory is cleared:", "PASS" if disk == "parsed" else f"FAIL ({disk})")
+
+    def disk_bytes():
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(cache.directory) for name in names)
+    max_disk_bytes, cache.max_disk_bytes = cache.max_disk_bytes, disk_bytes() // 2
+    cache.trim()
+    fits = 0 < disk_bytes() <= cache.max_disk_bytes
+    cache.max_disk_bytes = max_disk_bytes
+    print("Disk tier trimmed to its budget:", "PASS" if fits else f"FAIL ({disk_bytes()})")
+
+def test_jobs():
+    """Jobs survive a restart: orphans are requeued, live owners' jobs are left alone, old results expire"""
+    import json, time
+    from fastapi.testclient import TestClient
+    main = _service()
+    print("\n=== Jobs ===")
+    jobs = main.jobs
+
+    def wait(client, job_id, timeout=60):
+        deadline = time.time() + timeout
+        while True:
+            state = client.get(f"/jobs/{job_id}").json()
+            if state["status"] in main.FINISHED or time.time() > deadline:
+                return state
+            time.sleep(0.1)
+
+    with TestClient(main.app) as client:
+        job_id = client.post("/jobs", files={"file": ("a.csv", _benford_csv(seed=7))}).json()["job_id"]
+        state = wait(client, job_id)
+        done = state["status"] == "done" and not os.path.exists(jobs.upload_path(job_id, "a.csv"))
+        print("Job runs and its upload is removed:", "PASS" if done else f"FAIL ({state['status']})")
+
+    # Two unfinished jobs of another process: one crashed (lease ran out), one still alive
+    copies = {}
+    for name, lease in (("orphan", time.time() - 1), ("live", time.time() + 3600)):
+        copy = jobs.new_job_id()
+        os.makedirs(jobs.job_dir(copy), exist_ok=True)
+        with open(jobs.upload_path(copy, "a.csv"), "wb") as f:
+            f.write(_benford_csv(seed=7))
+        with open(os.path.join(jobs.job_dir(copy), "job.json"), "w") as f:
+            json.dump(dict(state, job_id=copy, status="running", owner="elsewhere", lease=lease), f)
+        copies[name] = copy
+    with TestClient(main.app) as client:
+        orphan = wait(client, copies["orphan"])["status"]
+        print("Orphaned job requeued on start:", "PASS" if orphan == "done" else f"FAIL ({orphan})")
+        live = client.get(f"/jobs/{copies['live']}").json()
+        ok = live["status"] == "running" and live["owner"] == "elsewhere"
+        print("Job with a live lease left to its owner:", "PASS" if ok else f"FAIL ({live['status']})")
+
+        ttl, jobs.ttl = jobs.ttl, 1e-6
+        jobs.sweep()
+        jobs.ttl = ttl
+        gone = [client.get(f"/jobs/{j}").status_code for j in (job_id, copies["orphan"], copies["live"])]
+        print("TTL sweep removes only finished jobs:", "PASS" if gone == [404, 404, 200] else f"FAIL ({gone})")
+
+def test_metrics():
+    """/metrics stays valid text exposition with a bounded file_type label, whatever the filename"""
+    import re
+    from fastapi.testclient import TestClient
+    main = _service()
+    print("\n=== Metrics ===")
+    sample = re.compile(r'[a-zA-Z_:][\w:]*(\{([a-zA-Z_]\w*="([^"\\\n]|\\[\\"n])*",?)*\})? \S+')
+    with TestClient(main.app) as client:
+        client.post("/analyze", params={"use_cache": "false"}, files={"file": ("a.csv", _benford_csv())})
+        client.post("/analyze", files={"file": ('odd.x"y\\z', b"1 2 3")})
+        text = client.get("/metrics").text
+    samples = [line for line in text.splitlines() if line and not line.startswith("#")]
+    invalid = [line for line in samples if not sample.fullmatch(line)]
+    print("Every sample line parses:", "PASS" if samples and not invalid else f"FAIL ({invalid[:2]})")
+    types = set(re.findall(r'file_type="([^"]*)"', text))
+    print("file_type limited to known types:", "PASS" if types == {"csv", "other"} else f"FAIL ({types})")
+    escaped = main.metrics._format_labels(["a"], ('x"y\\z\nw',))
+    print("Label values escaped:", "PASS" if escaped == '{a="x\\"y\\\\z\\nw"}' else f"FAIL ({escaped})")
+
+def test_cli_resume():
+    """--resume skips lines it cannot parse and cuts off a half-written last line"""
+    import json, tempfile
+    cli = _package_module("cli")
+    print("\n=== CLI resume ===")
+    records = [json.dumps({"path": f"{i}.csv", "sha256": f"{i:064x}", "status": 200}) for i in range(3)]
+    fd, path = tempfile.mkstemp(suffix=".jsonl")
+    with os.fdopen(fd, "wb") as f:
+        f.write(f"{records[0]}\n{{\"path\": \"x\", \"sha\n[1, 2]\n".encode() + b"\xff\xfe\n")
+        f.write(f"{records[1]}\n{records[2][:20]}".encode())
+    done = cli.resume_output(path)
+    with open(path, "rb") as f:
+        ends_clean = f.read().endswith(f"{records[1]}\n".encode())
+    os.remove(path)
+    ok = done == {f"{i:064x}" for i in range(2)} and ends_clean
+    print("Bad lines skipped, torn last line cut:", "PASS" if ok else f"FAIL ({len(done)}, {ends_clean})")
+
+def test_lazy_imports():
+    """Light paths must not load scipy.stats, matplotlib or openpyxl; p-values must match scipy.stats"""
+    print("\n=== Lazy imports ===")
+    code = ("import sys, numpy as np, benford; "
+            "benford.benford_test(np.arange(1, 5000) * 1.7); "
+            "print([m for m in ('scipy.stats', 'matplotlib', 'pandas') if m in sys.modules])")
+    loaded = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    print("Heavy modules left unloaded:", "PASS" if loaded == "[]" else f"FAIL ({loaded})")
+    code = ("import io, sys; from app import parsing; "
+            "data = b'amount,region\\n12.5,a\\n300,b\\n'; "
+            "columns = parsing.group_columns(io.BytesIO(data), 'a.csv', None, ['region']); "
+            "list(parsing._group_chunks(io.BytesIO(data), 'a.csv', columns, ['region'], 1000)); "
+            "print('openpyxl' in sys.modules)")
+    loaded = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    print("Grouped CSV parsing leaves openpyxl unloaded:", "PASS" if loaded == "False" else f"FAIL ({loaded})")
+    from scipy.stats import chisquare
+    result = benford_test(np.random.default_rng(9).lognormal(5, 2, 3000))
+    expected = chisquare(result["observed"], result["expected"]).pvalue
+    print("p-value matches scipy.stats:", "PASS" if result["p_chi"] == expected else f"FAIL ({result['p_chi']} vs {expected})")
 
 if __name__ == "__main__":
     test_digit_extraction()
     debug_expected_distribution()
+    test_suite_single_pass()
+    test_grouped_counts()
+    test_small_sample_p_values()
+    test_source_map()
+    test_duplicates_and_thresholds()
+    test_prefix_index()
+    test_amount_strings()
+    test_reservoir()
+    test_sequential_false_alarms()
+    test_upload_limits()
+    test_executor_recovery()
+    test_cache_tiers()
+    test_jobs()
+    test_metrics()
+    test_cli_resume()
+    test_lazy_imports()
     test_benford_analysis()
\ No newline at end of file
@@ -1,5 +1,5 @@
 import unittest
-from benford import extract_numbers
+from benford import extract_numbers, iter_numbers
 
 class TestParsing(unittest.TestCase):
     def test_filtering(self):
@@ -12,8 +12,21 @@ Small values: 0.0001, 0.99"""
         
         parsed = extract_numbers(text)
         # Only 1,234,567.89 should remain
-        self.assertEqual(parsed, [1234567.89])
+        self.assertEqual(parsed.tolist(), [1234567.89])
         print("Filtering Test ✓")
 
+    def test_bytes_input(self):
+        """Bytes buffers are tokenized without decoding, in any chunk size"""
+        text = """Revenue: $1,234,567.89
+Page 2 of 3
+Expenses: 789,000.50
+Net Profit: 445,567.39"""
+        
+        expected = extract_numbers(text).tolist()
+        self.assertEqual(extract_numbers(text.encode()).tolist(), expected)
+        chunks = iter_numbers(text.encode(), chunk_size=10)
+        self.assertEqual([n for chunk in chunks for n in chunk.tolist()], expected)
+        print("Bytes Test ✓")
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
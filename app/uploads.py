@@ -0,0 +1,116 @@
+import asyncio
+import os
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.formparsers import MultiPartParser
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+def _header(scope: Scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value
+    return None
+
+class UploadLimits:
+    """ASGI middleware bounding request bodies, and multipart uploads in particular.
+
+    Configured from the environment unless given explicitly:
+      BENFORD_MAX_UPLOAD_BYTES  largest request body accepted, else 413 (default: no limit)
+      BENFORD_MAX_UPLOADS       multipart bodies received at once; others wait, unread
+                                (default: no limit)
+      BENFORD_SPOOL_BYTES       bytes of an uploaded file held in memory before the rest
+                                goes to a temp file (default: Starlette's 1 MiB); set on
+                                Starlette's MultiPartParser class, so process-wide
+
+    The byte limit applies to every request body, whatever its content
+    type: a Content-Length over it is answered with 413 before any of the
+    body is read, and bodies without one are counted as they arrive and
+    cut off as soon as they pass it. A waiting upload's body stays in the
+    socket, so TCP flow control slows its client down. `busy(scope)`, if
+    given, is asked before a multipart body is read; a number it returns
+    is sent as the Retry-After of a 503 instead.
+    """
+    def __init__(self, app: ASGIApp, max_bytes: Optional[int] = None,
+                 max_uploads: Optional[int] = None, spool_bytes: Optional[int] = None,
+                 busy: Optional[Callable[[Scope], Optional[int]]] = None):
+        env = os.environ.get
+        self.app = app
+        self.max_bytes = max_bytes if max_bytes is not None else int(env("BENFORD_MAX_UPLOAD_BYTES", 0))
+        self.max_uploads = max_uploads if max_uploads is not None else int(env("BENFORD_MAX_UPLOADS", 0))
+        self.busy = busy
+        spool_bytes = spool_bytes if spool_bytes is not None else int(
+            env("BENFORD_SPOOL_BYTES", MultiPartParser.spool_max_size))
+        # Size of the SpooledTemporaryFile Starlette's form parser writes each file part to
+        MultiPartParser.spool_max_size = spool_bytes
+        self._slots = asyncio.Semaphore(self.max_uploads) if self.max_uploads else None
+
+    def _too_large(self) -> HTTPException:
+        return HTTPException(413, f"Upload exceeds the {self.max_bytes:,}-byte limit")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        content_type = _header(scope, b"content-type") or b""
+        multipart = content_type.startswith(b"multipart/form-data")
+        length = _header(scope, b"content-length")
+        if self.max_bytes and length and length.isdigit() and int(length) > self.max_bytes:
+            error = self._too_large()
+            await JSONResponse({"detail": error.detail}, status_code=413)(scope, receive, send)
+            return
+        if multipart and self.busy is not None:
+            retry_after = self.busy(scope)
+            if retry_after is not None:
+                response = JSONResponse({"detail": "Server busy, retry later"}, status_code=503,
+                                        headers={"Retry-After": str(retry_after)})
+                await response(scope, receive, send)
+                return
+        slots = self._slots if multipart else None
+        if not self.max_bytes and slots is None:
+            await self.app(scope, receive, send)
+            return
+
+        received, holding, done, started = 0, False, False, False
+
+        def _release() -> None:
+            nonlocal holding
+            if holding:
+                holding = False
+                slots.release()
+
+        async def _receive() -> Message:
+            nonlocal received, holding, done
+            if slots is not None and not (holding or done):
+                await slots.acquire()
+                holding = True
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if self.max_bytes and received > self.max_bytes:
+                    done = True
+                    _release()
+                    # FastAPI passes HTTPExceptions raised while reading a body through
+                    raise self._too_large()
+                done = not message.get("more_body", False)
+            else:
+                done = True
+            if done:
+                _release()
+            return message
+
+        async def _send(message: Message) -> None:
+            nonlocal started
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, _receive, _send)
+        except HTTPException as e:
+            # Raised by _receive where no exception handler runs, e.g. a plain Starlette route
+            if e.status_code != 413 or started:
+                raise
+            await JSONResponse({"detail": e.detail}, status_code=413)(scope, receive, send)
+        finally:
+            _release()
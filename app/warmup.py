@@ -0,0 +1,110 @@
+"""Startup warm-up of dependencies that are otherwise imported on first use.
+
+Heavy libraries are imported by the code path that needs them, so a process
+only pays for the file types and features it serves. BENFORD_WARMUP names
+features to load up front instead (comma-separated, or "all"):
+  stats    scipy.stats and scipy.optimize (datasets, sampling, early stop, amount tests)
+  plot     matplotlib, with the plot template built and rendered once
+  tabular  pandas, openpyxl and pyarrow (CSV and Excel uploads)
+  pdf      pdfplumber
+
+    python -m app.warmup    # import time and RSS of a cold process, per feature
+"""
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, Iterable, List, Optional
+
+FEATURES = {
+    "stats": ("scipy.stats", "scipy.optimize"),
+    "plot": ("matplotlib.figure", "matplotlib.backends.backend_agg"),
+    "tabular": ("pandas", "openpyxl", "pyarrow.csv", "pyarrow.compute"),
+    "pdf": ("pdfplumber",),
+}
+# What a cold process imports before any warm-up: the server, and a pool worker
+ENTRY_POINTS = ("app.main", "app.analysis")
+
+def parse_features(names: Optional[str]) -> List[str]:
+    """Feature names from a comma-separated list; raises ValueError on unknown ones"""
+    features = [name.strip() for name in (names or "").split(",") if name.strip()]
+    if "all" in features:
+        return list(FEATURES)
+    unknown = [name for name in features if name not in FEATURES]
+    if unknown:
+        raise ValueError(f"Unknown warm-up features: {', '.join(unknown)} "
+                         f"(choose from {', '.join(FEATURES)} or all)")
+    return features
+
+def features_from_env() -> List[str]:
+    return parse_features(os.environ.get("BENFORD_WARMUP"))
+
+def warm_up(features: Iterable[str]) -> Dict[str, float]:
+    """Import each feature's modules; returns seconds spent per feature"""
+    seconds = {}
+    for feature in features:
+        start = time.perf_counter()
+        for module in FEATURES[feature]:
+            try:
+                importlib.import_module(module)
+            except ImportError:  # optional dependency (pyarrow)
+                pass
+        if feature == "plot":
+            from .benford import benford_expected_distribution, render_benford_plot
+            _, bins = benford_expected_distribution(1)
+            render_benford_plot([0] * len(bins), [0.0] * len(bins), bins)
+        seconds[feature] = time.perf_counter() - start
+    return seconds
+
+_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {entry}
+imported = time.perf_counter() - start
+from app.warmup import warm_up
+warmed = sum(warm_up({features!r}).values())
+print(json.dumps({{"import": imported, "warm_up": warmed,
+                  "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}}))
+"""
+
+def cold_start(entry: str, features: Iterable[str] = ()) -> Dict:
+    """Import `entry` and warm up `features` in a fresh interpreter.
+
+    Returns seconds for each step and the process's peak RSS in bytes.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = _PROBE.format(entry=entry, features=list(features))
+    output = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def import_report() -> List[Dict]:
+    """Cold start of each entry point alone, then with each feature warmed up"""
+    rows = []
+    for entry in ENTRY_POINTS:
+        for feature in (None, *FEATURES):
+            result = cold_start(entry, [feature] if feature else [])
+            rows.append({"entry": entry, "feature": feature, **result})
+    return rows
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.warmup",
+        description="Report cold-start import time and RSS, per entry point and warm-up feature.")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    rows = import_report()
+    if args.json:
+        print(json.dumps(rows, indent=1))
+        return 0
+    print(f"{'entry':<14} {'feature':<8} {'import s':>9} {'warm-up s':>10} {'RSS MiB':>8}")
+    for row in rows:
+        print(f"{row['entry']:<14} {row['feature'] or '-':<8} {row['import']:>9.2f} "
+              f"{row['warm_up']:>10.2f} {row['rss'] / 2**20:>8.0f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""Micro-benchmarks of the analysis core across data kinds and scales.
+
+    python -m benchmarks.core run -o results.json
+    python -m benchmarks.core run --sizes 1e3,1e6,1e8 --compare baseline.json
+    python -m benchmarks.core compare baseline.json results.json
+
+Every case is run once to warm up, timed `repeat` times (fewer when that
+would exceed the per-case time budget) and then run once more under
+tracemalloc for its
+peak Python/NumPy allocation. pyarrow's own allocator is not traced, so
+CSV parsing peaks undercount what pyarrow holds.
+"""
+import argparse
+import gc
+import json
+import mmap
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.benford import (benford_test, bisection_analysis, extract_numbers, first_digits,
+                         get_first_digit, plot_benford)
+from app.parsing import parse_path
+from app.pdf_pages import extract_page_numbers
+from app.warmup import ENTRY_POINTS, cold_start
+
+from . import fixtures
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_DEPTHS = (1, 3, 5)
+GET_FIRST_DIGIT_CALLS = 100_000  # scalar calls timed per case, at most
+# Regressions must be this large in absolute terms too, so timer noise on tiny cases is ignored
+MIN_SECONDS = 0.001
+MIN_BYTES = 1024**2
+
+Case = Tuple[str, Dict, Callable[[], object]]
+
+def measure(fn: Callable[[], object], repeat: int, budget: float) -> Dict:
+    """Median and min wall time over up to `repeat` runs, and peak traced memory"""
+    with warnings.catch_warnings():
+        # Small bisection segments warn about chi-square assumptions on every run
+        warnings.simplefilter("ignore")
+        return _measure(fn, repeat, budget)
+
+def _measure(fn: Callable[[], object], repeat: int, budget: float) -> Dict:
+    runs = []
+    # One extra run warms caches and lazy imports; it is dropped unless the budget allowed no other
+    while len(runs) < repeat + 1:
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+        if sum(runs) + runs[-1] > budget:
+            break
+    runs = runs[1:] or runs
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": {"median": statistics.median(runs), "min": min(runs), "runs": len(runs)},
+            "peak_bytes": peak}
+
+def _mapped(path: str) -> Callable[[], object]:
+    def _extract():
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as text:
+            return extract_numbers(text)
+    return _extract
+
+def _pdf(path: str) -> Callable[[], object]:
+    # Straight to the page extractor: parse_path would answer repeats from the page cache
+    def _extract():
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            pages = list(range(len(pdf.pages)))
+        return extract_page_numbers(path, pages)
+    return _extract
+
+def iter_cases(kind: str, n: int, seed: int, depths: List[int],
+               formats: List[str]) -> Iterator[Case]:
+    data = fixtures.numbers(kind, n, seed)
+    calls = min(n, GET_FIRST_DIGIT_CALLS)
+    yield "get_first_digit", {"calls": calls}, lambda: [get_first_digit(x) for x in data[:calls]]
+    yield "first_digits", {}, lambda: first_digits(data)
+    yield "benford_test", {}, lambda: benford_test(data)
+    for depth in depths:
+        yield "bisection_analysis", {"max_depth": depth}, (
+            lambda depth=depth: bisection_analysis(data, max_depth=depth))
+    if "txt" in formats:
+        yield "extract_numbers", {"format": "txt"}, _mapped(fixtures.fixture_file("txt", kind, n, seed))
+    for fmt in formats:
+        if not fixtures.supports(fmt, n):
+            continue
+        path = fixtures.fixture_file(fmt, kind, n, seed)
+        if fmt == "pdf":
+            yield "parse", {"format": fmt}, _pdf(path)
+        else:
+            yield "parse", {"format": fmt}, lambda path=path, fmt=fmt: parse_path(path, f"bench.{fmt}")
+
+def measure_cold_start(entry: str, repeat: int, budget: float) -> Dict:
+    """Import time of `entry` in fresh interpreters; peak_bytes is their peak RSS"""
+    runs = []
+    while len(runs) < repeat:
+        runs.append(cold_start(entry))
+        if sum(r["import"] for r in runs) + runs[-1]["import"] > budget:
+            break
+    seconds = [r["import"] for r in runs]
+    return {"seconds": {"median": statistics.median(seconds), "min": min(seconds), "runs": len(runs)},
+            "peak_bytes": max(r["rss"] for r in runs)}
+
+def _plot_case(seed: int) -> Case:
+    result = benford_test(fixtures.numbers("benford", 10_000, seed))
+    return "plot_benford", {}, lambda: plot_benford(result["observed"], result["expected"], result["bins"])
+
+def environment() -> Dict:
+    """Where and on what a result file was measured"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "commit": commit,
+            "python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "cpus": os.cpu_count()}
+
+def _meta(args: argparse.Namespace) -> Dict:
+    return {**environment(), "seed": args.seed, "repeat": args.repeat, "budget": args.budget}
+
+def _report(result: Dict) -> None:
+    params = ",".join(f"{k}={v}" for k, v in result["params"].items())
+    n = f"{result['n']:,}" if result["n"] is not None else "-"
+    print(f"{result['name']:<20} {params:<16} {result['kind'] or '-':<13} {n:>12} "
+          f"{result['seconds']['median'] * 1e3:>11.2f} ms {result['peak_bytes'] / 2**20:>9.1f} MiB",
+          file=sys.stderr)
+
+def run(args: argparse.Namespace) -> Dict:
+    results = []
+    def _add(name: str, kind: Optional[str], n: Optional[int], params: Dict, fn: Callable) -> None:
+        if args.only and not any(name.startswith(prefix) for prefix in args.only):
+            return
+        results.append({"name": name, "kind": kind, "n": n, "params": params,
+                        **measure(fn, args.repeat, args.budget)})
+        _report(results[-1])
+
+    for entry in ENTRY_POINTS:
+        if not args.only or any("cold_start".startswith(prefix) for prefix in args.only):
+            results.append({"name": "cold_start", "kind": None, "n": None, "params": {"entry": entry},
+                            **measure_cold_start(entry, args.repeat, args.budget)})
+            _report(results[-1])
+    name, params, fn = _plot_case(args.seed)
+    _add(name, None, None, params, fn)
+    for n in args.sizes:
+        for kind in args.kinds:
+            for name, params, fn in iter_cases(kind, n, args.seed, args.depths, args.formats):
+                _add(name, kind, n, params, fn)
+    return {"meta": _meta(args), "results": results}
+
+def _key(result: Dict) -> str:
+    return json.dumps([result["name"], result["kind"], result["n"], result["params"]], sort_keys=True)
+
+def compare(baseline: Dict, current: Dict, tolerance: float) -> List[Dict]:
+    """Cases slower, or with a higher peak, than the baseline by more than `tolerance`"""
+    base = {_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        old = base.get(_key(result))
+        if old is None:
+            continue
+        checks = [("seconds", old["seconds"]["median"], result["seconds"]["median"], MIN_SECONDS),
+                  ("peak_bytes", old["peak_bytes"], result["peak_bytes"], MIN_BYTES)]
+        for metric, before, after, floor in checks:
+            if after > before * (1 + tolerance) and after - before > floor:
+                regressions.append({"name": result["name"], "kind": result["kind"], "n": result["n"],
+                                    "params": result["params"], "metric": metric,
+                                    "baseline": before, "current": after,
+                                    "ratio": after / before if before else float("inf")})
+    return regressions
+
+def _print_regressions(regressions: List[Dict], tolerance: float) -> None:
+    if not regressions:
+        print(f"No regressions beyond {tolerance:.0%}", file=sys.stderr)
+        return
+    print(f"{len(regressions)} regression(s) beyond {tolerance:.0%}:", file=sys.stderr)
+    for r in regressions:
+        print(f"  {r['name']} {r['params'] or ''} {r['kind'] or ''} n={r['n']}: {r['metric']} "
+              f"{r['baseline']:.4g} -> {r['current']:.4g} (x{r['ratio']:.2f})", file=sys.stderr)
+
+def _sizes(value: str) -> List[int]:
+    return [int(float(size)) for size in value.split(",") if size.strip()]
+
+def _names(value: str) -> List[str]:
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.core", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the suite")
+    run_parser.add_argument("--sizes", type=_sizes, default=list(DEFAULT_SIZES),
+                            help="comma-separated numbers per dataset, e.g. 1e3,1e6,1e8")
+    run_parser.add_argument("--kinds", type=_names, default=list(fixtures.KINDS))
+    run_parser.add_argument("--formats", type=_names, default=list(fixtures.FORMATS))
+    run_parser.add_argument("--depths", type=lambda v: [int(d) for d in _names(v)],
+                            default=list(DEFAULT_DEPTHS), help="bisection max_depth values")
+    run_parser.add_argument("--only", type=_names, help="benchmark name prefixes to run")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--budget", type=float, default=10.0,
+                            help="seconds of timed runs per case before repeats are cut short")
+    run_parser.add_argument("-o", "--output", help="results JSON (default: stdout)")
+    run_parser.add_argument("--compare", help="baseline results JSON to check for regressions")
+    run_parser.add_argument("--tolerance", type=float, default=0.25)
+    compare_parser = commands.add_parser("compare", help="compare two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        with open(args.baseline) as f, open(args.current) as g:
+            regressions = compare(json.load(f), json.load(g), args.tolerance)
+    else:
+        unknown = (set(args.kinds) - set(fixtures.KINDS)) | (set(args.formats) - set(fixtures.FORMATS))
+        if unknown:
+            parser.error(f"unknown kinds or formats: {', '.join(sorted(unknown))}")
+        results = run(args)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=1)
+        else:
+            json.dump(results, sys.stdout, indent=1)
+            print()
+        if not args.compare:
+            return 0
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+    _print_regressions(regressions, args.tolerance)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
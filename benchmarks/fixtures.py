@@ -0,0 +1,118 @@
+"""Deterministic benchmark data: number arrays and the files they are written to.
+
+Every fixture is a function of (kind, n, seed), so two machines benchmark
+the same numbers. Files are written once to BENFORD_BENCH_DIR (default:
+$TMPDIR/benford-bench) and reused.
+"""
+import os
+import tempfile
+from typing import Iterator
+
+import numpy as np
+
+KINDS = ("benford", "uniform", "contaminated")
+FORMATS = ("txt", "csv", "xlsx", "pdf", "parquet", "arrow")
+CHUNK = 1_000_000          # numbers generated and written at a time
+PDF_MAX_NUMBERS = 20_000   # PDFs are drawn page by page; larger ones take minutes to write
+XLSX_MAX_NUMBERS = 200_000
+PDF_PER_PAGE = 80
+
+def bench_dir() -> str:
+    directory = os.environ.get("BENFORD_BENCH_DIR",
+                               os.path.join(tempfile.gettempdir(), "benford-bench"))
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def iter_numbers(kind: str, n: int, seed: int = 0) -> Iterator[np.ndarray]:
+    """The fixture's numbers in chunks of up to CHUNK, rounded to cents.
+
+    benford       log-uniform over six decades, so first digits follow Benford's law
+    uniform       uniform on [1, 1e6), which over-represents high first digits
+    contaminated  benford, with the 10% of numbers from 40% on drawn from [500, 1000)
+    """
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+    rng = np.random.default_rng([seed, KINDS.index(kind)])
+    lo, hi = int(n * 0.4), int(n * 0.5)
+    for start in range(0, n, CHUNK):
+        size = min(CHUNK, n - start)
+        if kind == "uniform":
+            values = rng.uniform(1, 1e6, size)
+        else:
+            values = 10 ** rng.uniform(0, 6, size)
+        if kind == "contaminated":
+            index = np.arange(start, start + size)
+            hit = (index >= lo) & (index < hi)
+            values[hit] = rng.uniform(500, 1000, hit.sum())
+        yield values.round(2)
+
+def numbers(kind: str, n: int, seed: int = 0) -> np.ndarray:
+    return np.concatenate(list(iter_numbers(kind, n, seed))) if n else np.empty(0)
+
+def _write_text(path: str, kind: str, n: int, seed: int) -> None:
+    # Statement-like lines; "Payment" contains none of the keywords that skip a line
+    with open(path, 'w') as f:
+        for chunk in iter_numbers(kind, n, seed):
+            f.write("".join(f"Payment {v:,.2f}\n" for v in chunk))
+
+def _write_csv(path: str, kind: str, n: int, seed: int) -> None:
+    import pandas as pd
+    rng = np.random.default_rng([seed, 99])
+    with open(path, 'w') as f:
+        for i, chunk in enumerate(iter_numbers(kind, n, seed)):
+            pd.DataFrame({"Vendor": rng.integers(0, 500, len(chunk)).astype(str),
+                          "Amount": chunk}).to_csv(f, index=False, header=(i == 0))
+
+def _write_xlsx(path: str, kind: str, n: int, seed: int) -> None:
+    import pandas as pd
+    pd.DataFrame({"Amount": numbers(kind, n, seed)}).to_excel(path, index=False)
+
+def _write_pdf(path: str, kind: str, n: int, seed: int) -> None:
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+    values = numbers(kind, n, seed)
+    rows = PDF_PER_PAGE // 2
+    with PdfPages(path) as pdf:
+        for start in range(0, n, PDF_PER_PAGE):
+            fig = Figure(figsize=(8.5, 11))
+            # Inside the 10%-90% band the extractor crops to
+            for i, v in enumerate(values[start:start + PDF_PER_PAGE]):
+                fig.text(0.1 + 0.45 * (i // rows), 0.85 - 0.017 * (i % rows), f"{v:,.2f}", fontsize=8)
+            pdf.savefig(fig)
+
+def _write_parquet(path: str, kind: str, n: int, seed: int) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([("Amount", pa.float64())])
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in iter_numbers(kind, n, seed):
+            writer.write_table(pa.table({"Amount": chunk}, schema=schema))
+
+def _write_arrow(path: str, kind: str, n: int, seed: int) -> None:
+    # Uncompressed IPC file, the zero-copy case
+    import pyarrow as pa
+    schema = pa.schema([("Amount", pa.float64())])
+    with pa.ipc.new_file(path, schema) as writer:
+        for chunk in iter_numbers(kind, n, seed):
+            writer.write_batch(pa.record_batch([chunk], schema=schema))
+
+_WRITERS = {"txt": _write_text, "csv": _write_csv, "xlsx": _write_xlsx, "pdf": _write_pdf,
+            "parquet": _write_parquet, "arrow": _write_arrow}
+_LIMITS = {"pdf": PDF_MAX_NUMBERS, "xlsx": XLSX_MAX_NUMBERS}
+
+def supports(fmt: str, n: int) -> bool:
+    return n <= _LIMITS.get(fmt, n)
+
+def fixture_file(fmt: str, kind: str, n: int, seed: int = 0) -> str:
+    """Path of the fixture file, written on first use"""
+    if fmt not in _WRITERS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    if not supports(fmt, n):
+        raise ValueError(f"{fmt} fixtures are limited to {_LIMITS[fmt]:,} numbers")
+    path = os.path.join(bench_dir(), f"{kind}-{n}-{seed}.{fmt}")
+    if not os.path.exists(path):
+        # Temp name keeps the extension, which picks the writer's engine
+        tmp = os.path.join(bench_dir(), f".{os.getpid()}-{os.path.basename(path)}")
+        _WRITERS[fmt](tmp, kind, n, seed)
+        os.replace(tmp, path)
+    return path
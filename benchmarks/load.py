@@ -0,0 +1,383 @@
+"""Load test of POST /analyze against a locally started server.
+
+    python -m benchmarks.load --concurrency 8 --duration 60
+    python -m benchmarks.load --rate 4 --mix csv=4,txt=3,xlsx=2,pdf=1 --sizes 1e3,1e5
+    python -m benchmarks.load --workers 1,2,4 --server-workers 1,2 -o load.json
+
+Every combination of --workers (the analysis pool, BENFORD_WORKERS) and
+--server-workers (uvicorn processes) gets a fresh server. It is driven either
+by a fixed number of clients that send back to back (closed loop) or by
+Poisson arrivals at a fixed rate (open loop), where latency runs from the
+scheduled send time, so a backed-up client does not hide server slowness.
+
+Reported per run: throughput, latency percentiles overall and per format,
+status counts, the latency of a GET /cache/stats probe (it rises when the
+event loop is blocked) and the RSS of the server's process tree over time.
+
+Uploads are fixture files with a short tag appended, so every request
+misses the server's caches; --same-uploads sends them unchanged.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from . import fixtures
+from .core import environment
+
+DEFAULT_MIX = "csv=4,txt=3,xlsx=2,pdf=1"
+DEFAULT_SIZES = (1_000, 10_000)
+STARTUP_TIMEOUT = 60.0
+MEDIA_TYPES = {"txt": "text/plain", "csv": "text/csv", "pdf": "application/pdf",
+               "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"}
+# Appended to make an upload's hash unique; every parser ignores it (no digits, empty amount).
+# Parquet and Arrow files end in a footer, so they cannot be tagged and are not offered.
+_TAGS = {"txt": b"Ref %s\n", "csv": b"%s,\n", "xlsx": b"%s", "pdf": b"\n%%%s\n"}
+# The server's own environment unless --env says otherwise: no page cache left on disk
+SERVER_ENV = {"BENFORD_PAGE_CACHE_DIR": ""}
+
+Upload = Tuple[str, int, bytes]  # format, numbers, content
+
+def load_uploads(mix: Dict[str, float], sizes: List[int], kinds: List[str],
+                 seed: int) -> Tuple[List[Upload], np.ndarray]:
+    """Every supported (format, size, kind) fixture, and each one's pick probability.
+
+    A format's weight is split evenly over its sizes and kinds.
+    """
+    uploads, weights = [], []
+    for fmt, weight in mix.items():
+        combos = [(n, kind) for n in sizes for kind in kinds if fixtures.supports(fmt, n)]
+        for n, kind in combos:
+            with open(fixtures.fixture_file(fmt, kind, n, seed), 'rb') as f:
+                uploads.append((fmt, n, f.read()))
+            weights.append(weight / len(combos))
+    if not uploads:
+        raise ValueError("No fixture supports the requested mix and sizes")
+    weights = np.array(weights)
+    return uploads, weights / weights.sum()
+
+def _tag(i: int) -> bytes:
+    letters = ""
+    while True:
+        i, r = divmod(i, 26)
+        letters += chr(ord("a") + r)
+        if not i:
+            return letters.encode()
+
+def tree_rss(root: int) -> Optional[int]:
+    """Resident bytes of a process and all its descendants (None off Linux)"""
+    if not os.path.isdir("/proc"):
+        return None
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; fields after it don't
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    total, stack = 0, [root]
+    while stack:
+        pid = stack.pop()
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            continue
+        stack.extend(children.get(pid, []))
+    return total
+
+class Server:
+    """uvicorn serving app.main:app on a free local port, in its own process group"""
+    def __init__(self, workers: int, server_workers: int, env: Dict[str, str]):
+        self.workers = workers
+        self.server_workers = server_workers
+        self.env = {**os.environ, **SERVER_ENV, **env, "BENFORD_WORKERS": str(workers)}
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.log_path = os.path.join(fixtures.bench_dir(), f"server-{self.port}.log")
+        self.process: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> "Server":
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with open(self.log_path, 'w') as log:
+            self.process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+                 "--port", str(self.port), "--workers", str(self.server_workers),
+                 "--log-level", "warning"],
+                cwd=root, env=self.env, stdout=log, stderr=subprocess.STDOUT,
+                start_new_session=True)
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                if httpx.get(f"{self.url}/cache/stats", timeout=1).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"Server did not start; see {self.log_path}")
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def stop(self) -> None:
+        if self.process is None or self.process.poll() is not None:
+            return
+        # The whole group: uvicorn's workers and the analysis pool under them
+        os.killpg(self.process.pid, signal.SIGTERM)
+        try:
+            self.process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(self.process.pid, signal.SIGKILL)
+            self.process.wait()
+
+    def rss(self) -> Optional[int]:
+        return tree_rss(self.process.pid)
+
+class RssSampler(threading.Thread):
+    """Samples the server's RSS every `interval` seconds into `samples`"""
+    def __init__(self, server: Server, interval: float):
+        super().__init__(daemon=True)
+        self.server = server
+        self.interval = interval
+        self.samples: List[Tuple[float, int]] = []
+        self._stop_event = threading.Event()
+        self._start = time.perf_counter()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            rss = self.server.rss()
+            if rss is None:
+                return
+            self.samples.append((time.perf_counter() - self._start, rss))
+            self._stop_event.wait(self.interval)
+
+    def stop(self) -> List[Tuple[float, int]]:
+        self._stop_event.set()
+        self.join()
+        return self.samples
+
+async def drive(url: str, uploads: List[Upload], weights: np.ndarray,
+                args: argparse.Namespace) -> Tuple[List[Dict], List[float]]:
+    """Send the load; returns one record per request and the probe latencies"""
+    rng = np.random.default_rng(args.seed)
+    records: List[Dict] = []
+    probes: List[float] = []
+    count = 0
+    start = time.perf_counter()
+    measure_from = start + args.warmup
+    end = measure_from + args.duration
+
+    async def send(client: httpx.AsyncClient, scheduled: float) -> None:
+        nonlocal count
+        fmt, n, content = uploads[rng.choice(len(uploads), p=weights)]
+        if not args.same_uploads:
+            content += _TAGS[fmt] % _tag(count)
+        count += 1
+        try:
+            response = await client.post("/analyze", params=args.params, files={
+                "file": (f"load.{fmt}", content, MEDIA_TYPES[fmt])})
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        if scheduled >= measure_from:
+            records.append({"t": scheduled - start, "format": fmt, "n": n, "status": status,
+                            "seconds": time.perf_counter() - scheduled})
+
+    async def probe(client: httpx.AsyncClient) -> None:
+        while time.perf_counter() < end:
+            sent = time.perf_counter()
+            try:
+                await client.get("/cache/stats")
+                if sent >= measure_from:
+                    probes.append(time.perf_counter() - sent)
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(args.probe_interval)
+
+    async def closed_loop(client: httpx.AsyncClient) -> None:
+        while time.perf_counter() < end:
+            await send(client, time.perf_counter())
+
+    async def open_loop(client: httpx.AsyncClient) -> None:
+        tasks, scheduled = [], start
+        while True:
+            scheduled += rng.exponential(1 / args.rate)
+            if scheduled >= end:
+                break
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            tasks.append(asyncio.create_task(send(client, scheduled)))
+        await asyncio.gather(*tasks)
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=64)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client, \
+            httpx.AsyncClient(base_url=url, timeout=args.timeout) as probe_client:
+        probing = asyncio.create_task(probe(probe_client))
+        if args.rate:
+            await open_loop(client)
+        else:
+            await asyncio.gather(*(closed_loop(client) for _ in range(args.concurrency)))
+        await probing
+    return records, probes
+
+def percentiles(seconds: List[float]) -> Dict:
+    if not seconds:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    p50, p95, p99 = np.percentile(seconds, [50, 95, 99])
+    return {"p50": p50, "p95": p95, "p99": p99, "max": max(seconds)}
+
+def summarize(records: List[Dict], probes: List[float], rss: List[Tuple[float, int]],
+              duration: float) -> Dict:
+    statuses = Counter(str(r["status"]) for r in records)
+    by_format = {}
+    for fmt in sorted({r["format"] for r in records}):
+        mine = [r for r in records if r["format"] == fmt]
+        by_format[fmt] = {"requests": len(mine),
+                          "statuses": dict(Counter(str(r["status"]) for r in mine)),
+                          "latency": percentiles([r["seconds"] for r in mine])}
+    ok = statuses.get("200", 0)
+    return {
+        "requests": len(records),
+        "duration": duration,
+        "requests_per_second": len(records) / duration,
+        "throughput": ok / duration,
+        "latency": percentiles([r["seconds"] for r in records]),
+        "ok_latency": percentiles([r["seconds"] for r in records if r["status"] == 200]),
+        "statuses": dict(statuses),
+        "error_rate": (len(records) - ok) / len(records) if records else None,
+        "by_format": by_format,
+        "probe_latency": percentiles(probes),
+        "rss": {"start": rss[0][1] if rss else None,
+                "peak": max(b for _, b in rss) if rss else None,
+                "end": rss[-1][1] if rss else None,
+                "samples": [[round(t, 2), b] for t, b in rss]},
+    }
+
+def run_once(workers: int, server_workers: int, uploads: List[Upload], weights: np.ndarray,
+             args: argparse.Namespace) -> Dict:
+    with Server(workers, server_workers, args.env) as server:
+        sampler = RssSampler(server, args.rss_interval)
+        sampler.start()
+        try:
+            records, probes = asyncio.run(drive(server.url, uploads, weights, args))
+        finally:
+            rss = sampler.stop()
+    # Requests sent in the window may finish after it; count until the last one did
+    finished = max((r["t"] + r["seconds"] for r in records), default=args.warmup + args.duration)
+    duration = max(finished - args.warmup, args.duration)
+    return {"workers": workers, "server_workers": server_workers,
+            **summarize(records, probes, rss, duration)}
+
+def _ms(seconds: Optional[float]) -> str:
+    return f"{seconds * 1e3:.0f}" if seconds is not None else "-"
+
+def _report(run: Dict) -> None:
+    errors = ",".join(f"{k}:{v}" for k, v in sorted(run["statuses"].items()) if k != "200") or "-"
+    peak = f"{run['rss']['peak'] / 2**20:.0f}" if run["rss"]["peak"] else "-"
+    print(f"{run['workers']:>7} {run['server_workers']:>7} {run['requests_per_second']:>7.2f} "
+          f"{run['throughput']:>7.2f} {_ms(run['latency']['p50']):>7} {_ms(run['latency']['p95']):>7} "
+          f"{_ms(run['latency']['p99']):>7} {_ms(run['probe_latency']['p99']):>9} "
+          f"{peak:>9}  {errors}", file=sys.stderr)
+
+def _ints(value: str) -> List[int]:
+    return [int(float(v)) for v in value.split(",") if v.strip()]
+
+def _mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        fmt, _, weight = part.strip().partition("=")
+        if fmt not in MEDIA_TYPES:
+            raise argparse.ArgumentTypeError(f"format must be one of {', '.join(MEDIA_TYPES)}")
+        mix[fmt] = float(weight or 1)
+    return mix
+
+def _pair(value: str) -> Tuple[str, str]:
+    key, sep, val = value.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got {value!r}")
+    return key, val
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=_ints, default=[os.cpu_count() or 1],
+                        help="analysis pool sizes (BENFORD_WORKERS) to sweep")
+    parser.add_argument("--server-workers", type=_ints, default=[1],
+                        help="uvicorn worker process counts to sweep")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=4, help="clients sending back to back")
+    load.add_argument("--rate", type=float, help="Poisson arrivals per second instead")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds per run")
+    parser.add_argument("--warmup", type=float, default=5.0,
+                        help="seconds of load before measuring, while the pool spawns")
+    parser.add_argument("--mix", type=_mix, default=_mix(DEFAULT_MIX),
+                        help=f"format weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--sizes", type=_ints, default=list(DEFAULT_SIZES),
+                        help="numbers per upload, e.g. 1e3,1e5")
+    parser.add_argument("--kinds", type=lambda v: [k.strip() for k in v.split(",") if k.strip()],
+                        default=list(fixtures.KINDS))
+    parser.add_argument("--param", dest="params", type=_pair, action="append", default=[],
+                        help="/analyze query parameter, e.g. --param max_depth=5 (repeatable)")
+    parser.add_argument("--env", type=_pair, action="append", default=[],
+                        help="server environment variable, e.g. --env BENFORD_MAX_QUEUE=64")
+    parser.add_argument("--same-uploads", action="store_true",
+                        help="send fixtures unchanged, so repeats hit the server's caches")
+    parser.add_argument("--timeout", type=float, default=300.0, help="client timeout per request")
+    parser.add_argument("--probe-interval", type=float, default=0.25)
+    parser.add_argument("--rss-interval", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="results JSON (default: stdout)")
+    args = parser.parse_args(argv)
+    args.env = dict(args.env)
+    if args.rate is not None and args.rate <= 0:
+        parser.error("--rate must be positive")
+    if args.concurrency < 1 or min(args.workers) < 0 or min(args.server_workers) < 1:
+        parser.error("--concurrency and --server-workers must be 1 or more, --workers 0 or more")
+    unknown = set(args.kinds) - set(fixtures.KINDS)
+    if unknown:
+        parser.error(f"unknown kinds: {', '.join(sorted(unknown))}")
+
+    uploads, weights = load_uploads(args.mix, args.sizes, args.kinds, args.seed)
+    print(f"{'workers':>7} {'uvicorn':>7} {'req/s':>7} {'ok/s':>7} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'p99 ms':>7} {'probe p99':>9} {'peak MiB':>9}  errors", file=sys.stderr)
+    runs = []
+    for workers in args.workers:
+        for server_workers in args.server_workers:
+            runs.append(run_once(workers, server_workers, uploads, weights, args))
+            _report(runs[-1])
+
+    load_desc = {"rate": args.rate} if args.rate else {"concurrency": args.concurrency}
+    results = {"meta": {**environment(), **load_desc, "duration": args.duration,
+                        "warmup": args.warmup, "mix": args.mix, "sizes": args.sizes,
+                        "kinds": args.kinds, "params": dict(args.params), "env": args.env,
+                        "unique_uploads": not args.same_uploads, "seed": args.seed},
+               "runs": runs}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+    else:
+        json.dump(results, sys.stdout, indent=1)
+        print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,21 @@
 import requests
 import pandas as pd
-import base64
 
 # 1. Run analysis
 response = requests.post(
     "http://localhost:8000/analyze",
-    files={"file": open("financial_data.pdf", "rb")}
+    files={"file": open("financial_data.csv", "rb")}
 ).json()
 
-# 2. Save visualization
+# 2. Save visualization (rendered on demand from the plot URL)
 with open("benford_plot.png", "wb") as f:
-    f.write(base64.b64decode(response["plot"]))
+    f.write(requests.get("http://localhost:8000" + response["plot_url"]).content)
 
 # 3. Load original data
-numbers = pd.read_csv("financial_data.csv")["Amount"]
+data = pd.read_csv("financial_data.csv")
 
-# 4. Investigate most anomalous region
+# 4. Investigate most anomalous region, located by its source rows and columns
 most_suspicious = response["anomalous_regions"][0]
-print(f"Investigate indices {most_suspicious['start_index']}-{most_suspicious['end_index']}")
-print(numbers.iloc[most_suspicious['start_index']:most_suspicious['end_index']])
\ No newline at end of file
+first, last = most_suspicious["source"]["rows"]
+print(f"Investigate rows {first}-{last}")
+print(data.iloc[first:last + 1][most_suspicious["source"]["columns"]])